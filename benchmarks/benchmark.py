@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+This script is Kleborate's benchmark suite. It times:
+* the hot functions (microbenchmarks): load_fasta, reverse_complement, align_query_to_ref,
+  get_best_matching_profile, check_for_exact_aa_match and get_contig_stats, on one of the bundled
+  test genomes
+* the kpsc, kosc and escherichia presets end-to-end, on all of the bundled test genomes
+
+It only uses files in the repo (and minimap2/mash for the end-to-end runs), so it runs offline.
+Results are written as JSON. When given the JSON of an earlier run with --baseline, each benchmark
+is compared to it and the script exits with an error if any got slower by more than the threshold.
+Timings on a busy or shared machine can easily vary by 10-20%, so baselines should come from the
+same machine, and the threshold may need raising on noisy ones. To run it, go to the repo's root
+directory and run:
+  python3 benchmarks/benchmark.py -o benchmark.json
+  python3 benchmarks/benchmark.py --baseline benchmark.json
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+REPO_DIR = pathlib.Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_DIR))
+from kleborate.__main__ import get_version  # noqa: E402
+from kleborate.modules.general__contig_stats.general__contig_stats import (  # noqa: E402
+    get_contig_stats)
+from kleborate.shared.alignment import (  # noqa: E402
+    align_query_to_ref, check_for_exact_aa_match, get_alignment_backend)
+from kleborate.shared.misc import decompress_file, load_fasta, reverse_complement  # noqa: E402
+from kleborate.shared.mlst import (  # noqa: E402
+    get_best_hits, get_best_matching_profile, load_st_profiles)
+
+TEST_GENOMES_DIR = REPO_DIR / 'test' / 'test_genomes'
+MICRO_GENOME = TEST_GENOMES_DIR / 'GCF_000009885.1.fna.gz'  # K. pneumoniae NTUH-K2044
+MODULES_DIR = REPO_DIR / 'kleborate' / 'modules'
+MLST_DIR = MODULES_DIR / 'klebsiella_pneumo_complex__mlst' / 'data'
+MLST_GENES = ['gapA', 'infB', 'mdh', 'pgi', 'phoE', 'rpoB', 'tonB']
+AMR_REFS = MODULES_DIR / 'klebsiella_pneumo_complex__amr' / 'data' / 'CARD_v3.2.9.fasta'
+PRESETS = ['kpsc', 'kosc', 'escherichia']
+
+
+def get_arguments():
+    parser = argparse.ArgumentParser(description='Kleborate benchmark suite')
+    parser.add_argument('-o', '--output', type=str,
+                        help='Write the results (JSON) to this file (default: stdout)')
+    parser.add_argument('--baseline', type=str,
+                        help='Results (JSON) of an earlier run to compare to')
+    parser.add_argument('--threshold', type=float, default=20.0,
+                        help='With --baseline, flag benchmarks which are more than this percent '
+                             'slower than the baseline (default: 20)')
+    parser.add_argument('--repeats', type=int, default=7,
+                        help='Timings per microbenchmark, the best is compared (default: 7)')
+    parser.add_argument('--preset_repeats', type=int, default=1,
+                        help='Timings per end-to-end preset run (default: 1)')
+    parser.add_argument('--presets', type=str, default=','.join(PRESETS),
+                        help='Comma-delimited presets to run end-to-end, or "none" (default: '
+                             + ','.join(PRESETS) + ')')
+    parser.add_argument('--genomes', nargs='+', type=str,
+                        default=sorted(str(p) for p in TEST_GENOMES_DIR.glob('*.fna.gz')),
+                        help='Assemblies for the end-to-end runs (default: test/test_genomes)')
+    parser.add_argument('--no_micro', action='store_true',
+                        help='Skip the microbenchmarks')
+    return parser.parse_args()
+
+
+def main():
+    args = get_arguments()
+    benchmarks = {}
+    if not args.no_micro:
+        benchmarks.update(run_microbenchmarks(args.repeats))
+    presets = [] if args.presets == 'none' else args.presets.split(',')
+    for preset in presets:
+        benchmarks[f'preset_{preset}'] = time_preset(preset, args.genomes, args.preset_repeats)
+
+    results = {'kleborate_version': get_version(),
+               'python_version': platform.python_version(),
+               'platform': platform.platform(),
+               'cpu_count': os.cpu_count(),
+               'date': datetime.datetime.now().isoformat(timespec='seconds'),
+               'benchmarks': benchmarks}
+    results_json = json.dumps(results, indent=2) + '\n'
+    if args.output is None:
+        sys.stdout.write(results_json)
+    else:
+        pathlib.Path(args.output).write_text(results_json)
+
+    if args.baseline is not None:
+        baseline = json.loads(pathlib.Path(args.baseline).read_text())
+        slower = compare_to_baseline(benchmarks, baseline['benchmarks'], args.threshold)
+        if slower:
+            sys.exit(f'Error: {len(slower)} benchmark(s) more than {args.threshold}% slower than '
+                     f'the baseline: ' + ', '.join(slower))
+    if any('error' in b for b in benchmarks.values()):
+        sys.exit('Error: some benchmarks failed')
+
+
+def run_microbenchmarks(repeats):
+    """
+    Times each hot function on the same genome. The inputs are all prepared first, so only the
+    function itself is timed. Returns a dictionary of results (key = benchmark name).
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        assembly = pathlib.Path(temp_dir) / 'assembly.fasta'
+        decompress_file(MICRO_GENOME, assembly)
+        index = get_alignment_backend().build_index(MICRO_GENOME, assembly, temp_dir)
+        fasta = load_fasta(assembly)
+        longest_contig = max((seq for _, seq in fasta), key=len)
+
+        results['load_fasta'] = time_function(lambda: load_fasta(assembly), 3, repeats)
+        results['reverse_complement'] = \
+            time_function(lambda: reverse_complement(longest_contig), 10, repeats)
+        gapa = MLST_DIR / 'gapA.fasta'
+        results['align_query_to_ref'] = \
+            time_function(lambda: align_query_to_ref(gapa, assembly, ref_index=index,
+                                                     min_identity=90.0, min_query_coverage=80.0),
+                          1, repeats)
+
+        profiles = load_st_profiles(MLST_DIR / 'profiles.tsv', MLST_GENES, None)
+        best_hits_per_gene = {g: get_best_hits(align_query_to_ref(MLST_DIR / f'{g}.fasta',
+                                                                  assembly, ref_index=index,
+                                                                  min_identity=90.0,
+                                                                  min_query_coverage=80.0))
+                              for g in MLST_GENES}
+        results['get_best_matching_profile'] = \
+            time_function(lambda: get_best_matching_profile(profiles, MLST_GENES,
+                                                            best_hits_per_gene), 1000, repeats)
+
+        # Like the AMR module, check every inexact hit to the CARD references.
+        inexact_hits = [h for h in align_query_to_ref(AMR_REFS, assembly, ref_index=index,
+                                                      min_identity=80.0, min_query_coverage=40.0)
+                        if h.percent_identity < 100.0]
+        results['check_for_exact_aa_match'] = \
+            time_function(lambda: [check_for_exact_aa_match(AMR_REFS, h, assembly)
+                                   for h in inexact_hits], 1, repeats)
+        results['check_for_exact_aa_match']['hits'] = len(inexact_hits)
+
+        results['get_contig_stats'] = \
+            time_function(lambda: get_contig_stats(assembly), 20, repeats)
+    return results
+
+
+def time_function(function, number, repeats):
+    """
+    Returns the per-call time (best and median over the repeats) of calling the function number
+    times.
+    """
+    function()  # warm-up (e.g. to fill caches and compile regexes)
+    times = [t / number for t in timeit.repeat(function, number=number, repeat=repeats)]
+    return {'best': min(times), 'median': statistics.median(times), 'times': times}
+
+
+def time_preset(preset, genomes, repeats):
+    """
+    Runs Kleborate with the preset on the genomes (as a separate process, like a user would) and
+    returns the wall times.
+    """
+    times = []
+    for _ in range(repeats):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            command = [sys.executable, str(REPO_DIR / 'kleborate-runner.py'), '-a'] + genomes + \
+                ['-o', str(pathlib.Path(temp_dir) / 'out'), '-p', preset]
+            start = time.perf_counter()
+            p = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                               text=True)
+            if p.returncode != 0:
+                error = p.stderr.strip().splitlines()[-1] if p.stderr.strip() else ''
+                print(f'Warning: preset {preset} failed: {error}', file=sys.stderr)
+                return {'error': f'exit status {p.returncode}: {error}'}
+            times.append(time.perf_counter() - start)
+    return {'best': min(times), 'median': statistics.median(times), 'times': times,
+            'genomes': len(genomes)}
+
+
+def compare_to_baseline(benchmarks, baseline, threshold):
+    """
+    Prints each benchmark's best time next to the baseline's and returns the names of the
+    benchmarks which are more than threshold percent slower. Benchmarks which failed or aren't in
+    both runs are only printed.
+    """
+    slower = []
+    print(f'{"benchmark":<28}{"baseline (s)":>14}{"current (s)":>14}{"change":>10}',
+          file=sys.stderr)
+    for name in sorted(set(benchmarks) | set(baseline)):
+        current, base = benchmarks.get(name, {}), baseline.get(name, {})
+        if 'best' not in current or 'best' not in base:
+            print(f'{name:<28}{"-":>14}{"-":>14}{"n/a":>10}', file=sys.stderr)
+            continue
+        change = 100.0 * (current['best'] - base['best']) / base['best']
+        flag = ''
+        if change > threshold:
+            slower.append(name)
+            flag = '  SLOWER'
+        print(f'{name:<28}{base["best"]:>14.6f}{current["best"]:>14.6f}{change:>+9.1f}%{flag}',
+              file=sys.stderr)
+    return slower
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+This script benchmarks Kleborate's reverse_complement function against the per-base version it
+replaced, on a random sequence (5 Mbp by default, about the size of a Klebsiella genome). It exits
+with an error if the speed-up is below the required minimum. To run it, go to the repo's root
+directory and run:
+  python3 benchmarks/reverse_complement.py
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import pathlib
+import random
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
+from kleborate.shared.misc import complement_base, reverse_complement  # noqa: E402
+
+
+def per_base_reverse_complement(seq):
+    # The previous implementation, kept here for comparison.
+    return ''.join([complement_base(x) for x in seq][::-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark reverse_complement')
+    parser.add_argument('--length', type=int, default=5_000_000,
+                        help='Length of the random test sequence (default: 5000000)')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='Number of timings per implementation, the best is used (default: 3)')
+    parser.add_argument('--min_speedup', type=float, default=10.0,
+                        help='Minimum required speed-up (default: 10)')
+    args = parser.parse_args()
+
+    # Mostly ACGT, with some lowercase, ambiguous and unknown characters to cover all code paths.
+    rng = random.Random(0)
+    seq = ''.join(rng.choices('ACGTacgtNRY*', weights=[24, 24, 24, 24, 1, 1, 1, 1, 0.5, 0.2, 0.2,
+                                                        0.1], k=args.length))
+    if reverse_complement(seq) != per_base_reverse_complement(seq):
+        sys.exit('Error: reverse_complement results differ from the per-base implementation')
+
+    old_time = min(timeit.repeat(lambda: per_base_reverse_complement(seq), number=1,
+                                 repeat=args.repeats))
+    new_time = min(timeit.repeat(lambda: reverse_complement(seq), number=1, repeat=args.repeats))
+    speedup = old_time / new_time
+    print(f'sequence length:  {args.length} bp')
+    print(f'per-base:         {old_time:.4f} s')
+    print(f'translate table:  {new_time:.4f} s')
+    print(f'speed-up:         {speedup:.1f}x')
+    if speedup < args.min_speedup:
+        sys.exit(f'Error: speed-up is below {args.min_speedup}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -12,23 +12,33 @@ not, see <https://www.gnu.org/licenses/>.
 """
 
 import argparse
+import collections
+import concurrent.futures
+import contextlib
 import graphlib
-import gzip
 import importlib
 import importlib.metadata
+import io
 import os
 import pathlib
 import re
 import shutil
-import subprocess
 import sys
 import tempfile
 import textwrap
 import uuid
 from glob import glob
 
+from .shared.alignment import AlignmentBroker, get_alignment_backend, set_alignment_backend, \
+    ALIGNMENT_BACKENDS
+from .shared.assembly_store import AssemblyFile
+from .shared.database import build_bundle, BUNDLE_FILENAME
 from .shared.help_formatter import MyParser, MyHelpFormatter
-from .shared.misc import get_compression_type, load_fasta,reverse_complement
+from .shared.misc import decompress_file, get_compression_type, iterate_fasta, reverse_complement
+from .shared.output import OutputJournal, OutputSink, OUTPUT_FORMATS, check_output_format, \
+    resume_output_files
+from .shared.profiling import PROFILER, PROFILE_DUMP_DIRNAME, PROFILE_FORMATS, ProfileReport
+from .shared.result_cache import ResultCache, get_module_signatures
 from .shared.species_defs import is_kp_complex, is_ko_complex, is_escherichia
 
 
@@ -52,16 +62,53 @@ def parse_arguments(args, all_module_names, modules):
                          help='Directory for storing output files')
 
     io_args.add_argument('-r', '--resume', action='store_true',
-                         help='append the output files')
+                         help='Resume an interrupted run: keep the existing output files and skip '
+                              'assemblies which are already in them')
 
     io_args.add_argument('--trim_headers', action='store_true',
                          help='Trim headers in the output files')
 
+    io_args.add_argument('--output_format', type=str, default='tsv', choices=list(OUTPUT_FORMATS),
+                         help='Format of the output files: tab-delimited text, JSON Lines or '
+                              'Parquet (requires pyarrow) (default: tsv)')
+
+    setting_args = parser.add_argument_group('Settings')
+    setting_args.add_argument('-j', '--jobs', type=int, default=1,
+                              help='Number of assemblies to process in parallel (default: 1)')
+    setting_args.add_argument('--module_threads', type=int, default=1,
+                              help='Number of independent modules to run at the same time on '
+                                   'each assembly (default: 1)')
+    setting_args.add_argument('--aligner', type=str, default='minimap2',
+                              choices=list(ALIGNMENT_BACKENDS),
+                              help='Alignment backend: minimap2 runs minimap2 as a subprocess, '
+                                   'mappy aligns in-process with the mappy Python package '
+                                   '(default: minimap2)')
+    setting_args.add_argument('--cache_dir', type=str,
+                              help='Directory for a persistent cache of module results, so '
+                                   'assemblies which have already been analysed with the same '
+                                   'settings are not analysed again (default: no cache)')
+    setting_args.add_argument('--cache_size', type=float, default=1000.0,
+                              help='Maximum size of the result cache in MB, least recently used '
+                                   'results are deleted beyond this (default: 1000)')
+    setting_args.add_argument('--profile', type=str, nargs='?', const='tsv',
+                              choices=PROFILE_FORMATS,
+                              help='Time each module on each assembly (wall time, CPU time and '
+                                   'time in minimap2/mash) and write a timing report to the '
+                                   'output directory, as tsv (default) or jsonl (JSON Lines)')
+    setting_args.add_argument('--profile_dumps', action='store_true',
+                              help='With --profile, also save a cProfile dump for each module on '
+                                   'each assembly')
+
     module_args = parser.add_argument_group('Modules')
     module_args.add_argument('--list_modules', action='store_true',
                              help='Print a list of all available modules and then quit')
+    module_args.add_argument('--build_db', '--build-db', action='store_true',
+                             help='Compile the data files of all modules into binary bundles '
+                                  'for faster loading and then quit')
     module_args.add_argument('-p', '--preset', type=str,
-                             help=f'Module presets, choose from: ' + ', '.join(get_presets()))
+                             help=f'Module presets, choose from: ' +
+                                  ', '.join(list(get_presets()) + ['auto']) +
+                                  ' (auto runs each assembly with the preset for its species)')
     module_args.add_argument('-m', '--modules', type=str,
                              help='Comma-delimited list of Kleborate modules to use')
 
@@ -85,7 +132,10 @@ def parse_arguments(args, all_module_names, modules):
 def main():
     all_module_names, modules = import_modules()
     args = parse_arguments(sys.argv[1:], all_module_names, modules)
+    build_databases(args, all_module_names, modules)
     print_modules(args, all_module_names, modules)
+    check_settings(args)
+    set_alignment_backend(args.aligner)
 
     module_names, check_module_list, pass_modules = get_used_module_names(args, all_module_names, get_presets())
 
@@ -93,13 +143,24 @@ def main():
     preset_check_modules = []
     if args.preset:
         presets = get_presets()
-        preset_check_modules = [module for module, _ in presets[args.preset]['check']]
+        preset_check_modules = check_module_list if args.preset == 'auto' else \
+            [module for module, _ in presets[args.preset]['check']]
 
     module_names, module_run_order, external_programs = check_modules(args, modules, module_names, check_module_list, pass_modules)
 
     full_headers, stdout_headers = get_headers(module_names, modules)
     print('\t'.join([h.split('__')[-1] for h in stdout_headers]))
 
+    # With --preset auto, each species' output file only has the columns of its own preset.
+    preset_run_orders, preset_headers = None, {}
+    if args.preset == 'auto':
+        preset_module_names = get_preset_module_names(get_presets(), modules)
+        preset_run_orders = {p: [m for m in module_run_order if m in names]
+                             for p, names in preset_module_names.items()}
+        output_suffixes = get_preset_output_suffixes()
+        preset_headers = {output_suffixes[p]: get_headers(names, modules)[0]
+                          for p, names in preset_module_names.items()}
+
     # Ensure the output directory exists
     if not os.path.exists(args.outdir):
         os.makedirs(args.outdir)
@@ -109,78 +170,390 @@ def main():
         module_name = args.modules.split(',')[0]  
         out_files_suffixes = [f'{module_name}_output.txt']
     else:
-        out_files_suffixes = ['klebsiella_pneumo_complex_output.txt',
-                              'klebsiella_oxytoca_complex_output.txt',
-                              'escherichia_output.txt']
-    if not args.resume:
-        for suffix in out_files_suffixes:
-            for file in glob(f'{args.outdir}/*{suffix}'):
-                os.remove(file)
-
-
-    for assembly in args.assemblies:
-        check_assembly(assembly)  # Check assembly before processing
-
-        with tempfile.TemporaryDirectory() as temp_dir:
-            unzipped_assembly = gunzip_assembly_if_necessary(assembly, temp_dir)
-            minimap2_index = build_minimap2_index(assembly, unzipped_assembly, external_programs, temp_dir)
-            results = {'strain': get_strain_name(assembly)}
-
-            pass_check = True  # default, assume no check and run all modules
-
-            # if we have 'check' modules in the preset, run these
-            if args.preset and len(check_module_list) > 0:
-                for module, check in presets[args.preset]['check']:
-                    try:
-                        module_results = modules[module].get_results(unzipped_assembly, minimap2_index, args, results)
-
-                        results.update({f'{module}__{header}': result for header, result in module_results.items()})
-                        check_function = globals()[check]
-
-                        if not check_function(module_results):
-                            pass_check = False
-                            print(f"Assembly {assembly} failed in check {check}.")
-                            break  # Exit the for loop since this assembly failed the check
-
-                    except Exception as e:
-                        print(f"Error encountered while processing {assembly} with {module}: {e}.")
-                        pass_check = False
-                        break  # Exit the for loop since an error occurred
-
-            # proceed through all other modules
-            if pass_check:
-                for module in module_run_order:
-                    if module not in preset_check_modules:
-                        module_results = modules[module].get_results(unzipped_assembly, minimap2_index, args, results)
-                        results.update({f'{module}__{header}': result for header, result in module_results.items()})
-            else:
-                # Populate results with "Not Tested" for modules that did not run
-                for module in module_run_order:
-                    if module not in preset_check_modules:
-                        module_headers = [header for header in full_headers if header.startswith(module)]
-                        for header in module_headers:
-                            results[header] = 'Not Tested'
-
-            # Split the results based on species
-            if args.modules:
-                module_name = args.modules.split(',')[0] 
-                outfile_suffix = f'{module_name}_output.txt'
-            else:
-                # Determine the appropriate output file suffix based on species
-                species = results.get('enterobacterales__species__species', None)
-                if species and is_kp_complex({'species': species}):
-                    outfile_suffix = 'klebsiella_pneumo_complex_output.txt'
-                elif species and is_ko_complex({'species': species}):
-                    outfile_suffix = 'klebsiella_oxytoca_complex_output.txt'
-                elif species and is_escherichia({'species': species}):
-                    outfile_suffix = 'escherichia_output.txt'
-                else:
-                    print(f"Assembly {assembly} does not match any specified species. Skipping to next assembly.")
-                    continue
+        out_files_suffixes = list(get_preset_output_suffixes().values())
+    extension = OUTPUT_FORMATS[args.output_format].extension
+    out_files_suffixes = [str(pathlib.Path(s).with_suffix(extension)) for s in out_files_suffixes]
+    output_files = [f for suffix in out_files_suffixes for f in glob(f'{args.outdir}/*{suffix}')]
+    journal = OutputJournal(args.outdir)
+    if args.resume:
+        done_strains = resume_output_files(args.outdir, output_files, args.output_format)
+        assemblies = get_remaining_assemblies(args.assemblies, done_strains)
+    else:
+        for file in output_files:
+            os.remove(file)
+        journal.remove()
+        assemblies = args.assemblies
+
+    if args.profile is not None:
+        PROFILER.enable(os.path.join(args.outdir, PROFILE_DUMP_DIRNAME)
+                        if args.profile_dumps else None)
+
+    result_cache = get_result_cache(args, module_run_order, modules)
+    batch_results = run_batch_stages(assemblies, args, module_run_order, modules, result_cache)
+
+    run_settings = (args, module_run_order, check_module_list, preset_check_modules, full_headers,
+                    external_programs, result_cache, preset_run_orders)
+    header_types = get_header_types(module_names, modules)
+    with contextlib.ExitStack() as stack:
+        sink = stack.enter_context(OutputSink(full_headers, stdout_headers, args.trim_headers,
+                                              journal, output_format=args.output_format,
+                                              header_types=header_types))
+        profile_report = None
+        if args.profile is not None:
+            profile_report = stack.enter_context(ProfileReport(args.outdir, args.profile,
+                                                               append=args.resume))
+            profile_report.write(PROFILER.take_records())  # batch stages
+        for assembly, results, outfile_suffix in run_assemblies(assemblies, args.jobs, modules,
+                                                                run_settings, batch_results):
+            if profile_report is not None:
+                profile_report.write(PROFILER.take_records())
+            if outfile_suffix is None:
+                sink.skip(results['strain'])
+                continue
 
             # write results
-            output_file = os.path.join(args.outdir, outfile_suffix)
-            output_results(full_headers, stdout_headers, output_file, results, args.trim_headers)
+            sink.write(os.path.join(args.outdir, outfile_suffix), results,
+                       preset_headers.get(outfile_suffix))
+        if profile_report is not None:
+            profile_report.print_summary()
+
+
+def get_remaining_assemblies(assemblies, done_strains):
+    """
+    Returns the assemblies which still need to be processed in a resumed run, given the strain
+    names already in the output files (a Counter).
+    """
+    done_strains = collections.Counter(done_strains)
+    remaining = []
+    for assembly in assemblies:
+        strain = get_strain_name(assembly)
+        if done_strains[strain] > 0:
+            done_strains[strain] -= 1
+        else:
+            remaining.append(assembly)
+    skipped = len(assemblies) - len(remaining)
+    if skipped:
+        print(f'Resuming: skipping {skipped} assemblies which are already in the output files',
+              file=sys.stderr)
+    return remaining
+
+
+def get_result_cache(args, module_names, modules):
+    """
+    Returns the persistent result cache if one was requested with --cache_dir, otherwise None.
+    """
+    if args.cache_dir is None:
+        return None
+    signatures = get_module_signatures(module_names, modules, args, get_version())
+    return ResultCache(args.cache_dir, int(args.cache_size * 1000000), signatures)
+
+
+def run_batch_stages(assemblies, args, module_names, modules, result_cache=None):
+    """
+    Some modules can process all assemblies at once, which is much faster than one at a time (e.g.
+    species detection with a single mash run). Such a module has a run_batch function, which is
+    given all assemblies (keyed by strain name) before any per-assembly processing, and a
+    set_batch_results function to hand the batch results back to the module. This function runs
+    those batch stages and returns the results as a {module name: batch results} dictionary.
+
+    Assemblies with a non-unique strain name are left out, and the modules process those one at a
+    time as usual. So are assemblies whose results for the module are already in the result cache.
+    """
+    strain_name_counts = collections.Counter(get_strain_name(a) for a in assemblies)
+    unique_assemblies = {get_strain_name(a): a for a in assemblies
+                         if strain_name_counts[get_strain_name(a)] == 1}
+    batch_results = {}
+    for m in module_names:
+        if hasattr(modules[m], 'run_batch'):
+            batch_assemblies = unique_assemblies
+            if result_cache is not None:
+                batch_assemblies = {strain: a for strain, a in unique_assemblies.items()
+                                    if not result_cache.contains(result_cache.get_keys(a)[m])}
+            with PROFILER.time_stage('-', m, 'run_batch'):
+                batch_results[m] = modules[m].run_batch(batch_assemblies, args)
+            modules[m].set_batch_results(batch_results[m])
+    return batch_results
+
+
+def run_assemblies(assemblies, jobs, modules, run_settings, batch_results):
+    """
+    This function runs all assemblies through process_assembly and yields a tuple for each:
+    (assembly, results, output file suffix). When jobs is greater than one, the assemblies are
+    processed in a pool of worker processes, but results are still yielded in the same order as
+    the input assemblies, so the output files are identical to a serial run.
+    """
+    if jobs == 1 or len(assemblies) < 2:
+        for assembly in assemblies:
+            results, outfile_suffix = process_assembly(assembly, modules, *run_settings)
+            yield assembly, results, outfile_suffix
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(assemblies)),
+                                                initializer=init_worker,
+                                                initargs=(run_settings,
+                                                          batch_results)) as executor:
+        for assembly, (results, outfile_suffix, stdout_text, profile_records) in \
+                zip(assemblies, executor.map(process_assembly_in_worker, assemblies)):
+            # Anything the worker printed is replayed here, so stdout stays in input order.
+            sys.stdout.write(stdout_text)
+            PROFILER.add_records(profile_records)
+            yield assembly, results, outfile_suffix
+
+
+# Each worker process imports the modules itself (module objects can't be sent between processes)
+# and keeps the per-run settings here so only the assembly path needs to be sent for each task.
+_worker_modules, _worker_settings = None, None
+
+
+def init_worker(run_settings, batch_results):
+    global _worker_modules, _worker_settings
+    _, _worker_modules = import_modules()
+    _worker_settings = run_settings
+    set_alignment_backend(run_settings[0].aligner)
+    if run_settings[0].profile is not None:
+        PROFILER.enable(os.path.join(run_settings[0].outdir, PROFILE_DUMP_DIRNAME)
+                        if run_settings[0].profile_dumps else None)
+    for m, module_batch_results in batch_results.items():
+        _worker_modules[m].set_batch_results(module_batch_results)
+
+
+def process_assembly_in_worker(assembly):
+    stdout_text = io.StringIO()
+    with contextlib.redirect_stdout(stdout_text):
+        results, outfile_suffix = process_assembly(assembly, _worker_modules, *_worker_settings)
+    return results, outfile_suffix, stdout_text.getvalue(), PROFILER.take_records()
+
+
+def process_assembly(assembly, modules, args, module_run_order, check_module_list,
+                     preset_check_modules, full_headers, external_programs, result_cache=None,
+                     preset_run_orders=None):
+    """
+    This function runs all used modules on a single assembly. It returns the results dictionary
+    and the suffix of the output file the results belong in (or None if the assembly doesn't match
+    any of the output species).
+
+    The assembly is only decompressed and indexed once a module actually needs to run, so if all
+    results come from the result cache, there is no alignment at all.
+
+    With --preset auto, preset_run_orders has the run order of each preset's modules, and only the
+    modules of the preset which matches the assembly's species are run.
+    """
+    check_assembly(assembly)  # Check assembly before processing
+    results = {'strain': get_strain_name(assembly)}
+    cache_keys = None if result_cache is None else result_cache.get_keys(assembly)
+
+    with contextlib.ExitStack() as stack:
+        prepared = []
+
+        # The modules whose query files the AlignmentBroker aligns. With --preset auto, these
+        # aren't known until the species is, so the broker is only created after that.
+        broker_modules = [] if preset_run_orders is not None else list(module_run_order)
+        brokered = []
+
+        def prepare_assembly():
+            if not prepared:
+                with PROFILER.time_stage(results['strain'], '-', 'prepare'):
+                    temp_dir = stack.enter_context(tempfile.TemporaryDirectory())
+                    # Modules are given the assembly as an AssemblyFile, which packs it into an
+                    # AssemblyStore if a module reads its sequences.
+                    unzipped_assembly = stack.enter_context(
+                        AssemblyFile(gunzip_assembly_if_necessary(assembly, temp_dir), temp_dir))
+                    minimap2_index = build_minimap2_index(assembly, unzipped_assembly,
+                                                          external_programs, temp_dir)
+                prepared.extend([unzipped_assembly, minimap2_index])
+            if broker_modules and not brokered:
+                # Only the modules without cached results will need alignments.
+                uncached_modules = [m for m in broker_modules if result_cache is None or
+                                    not result_cache.contains(cache_keys[m])]
+                query_files = get_alignment_query_files(uncached_modules, modules,
+                                                        external_programs)
+                stack.enter_context(AlignmentBroker(prepared[0], prepared[1], query_files))
+                brokered.append(True)
+            return prepared
+
+        if preset_run_orders is None:
+            run_modules(assembly, prepare_assembly, modules, args, results, module_run_order,
+                        check_module_list, preset_check_modules, full_headers, result_cache,
+                        cache_keys)
+        else:
+            preset = run_auto_preset(assembly, prepare_assembly, broker_modules.extend, modules,
+                                     args, results, preset_run_orders, result_cache, cache_keys)
+
+    if result_cache is not None:
+        result_cache.flush()
+
+    # Split the results based on species
+    if args.modules:
+        module_name = args.modules.split(',')[0] 
+        outfile_suffix = f'{module_name}_output.txt'
+    elif preset_run_orders is not None:
+        outfile_suffix = get_preset_output_suffixes().get(preset)
+        if outfile_suffix is None:
+            print(f"Assembly {assembly} does not match any specified species. Skipping to next assembly.")
+    else:
+        # Determine the appropriate output file suffix based on species
+        species = results.get('enterobacterales__species__species', None)
+        if species and is_kp_complex({'species': species}):
+            outfile_suffix = 'klebsiella_pneumo_complex_output.txt'
+        elif species and is_ko_complex({'species': species}):
+            outfile_suffix = 'klebsiella_oxytoca_complex_output.txt'
+        elif species and is_escherichia({'species': species}):
+            outfile_suffix = 'escherichia_output.txt'
+        else:
+            print(f"Assembly {assembly} does not match any specified species. Skipping to next assembly.")
+            outfile_suffix = None
+
+    return results, outfile_suffix
+
+
+def run_modules(assembly, prepare_assembly, modules, args, results, module_run_order,
+                check_module_list, preset_check_modules, full_headers, result_cache=None,
+                cache_keys=None):
+    """
+    This function runs the preset's check modules (if any) and then the rest of the modules on
+    one assembly, adding their results to the results dictionary. prepare_assembly is called when
+    a module needs to run, and returns the unzipped assembly and its minimap2 index.
+    """
+    pass_check = True  # default, assume no check and run all modules
+
+    # if we have 'check' modules in the preset, run these
+    if args.preset and len(check_module_list) > 0:
+        for module, check in get_presets()[args.preset]['check']:
+            try:
+                module_results = get_module_results(module, modules, prepare_assembly, args,
+                                                    results, result_cache, cache_keys)
+
+                results.update({f'{module}__{header}': result for header, result in module_results.items()})
+                check_function = globals()[check]
+
+                if not check_function(module_results):
+                    pass_check = False
+                    print(f"Assembly {assembly} failed in check {check}.")
+                    break  # Exit the for loop since this assembly failed the check
+
+            except Exception as e:
+                print(f"Error encountered while processing {assembly} with {module}: {e}.")
+                pass_check = False
+                break  # Exit the for loop since an error occurred
+
+    # proceed through all other modules
+    if pass_check:
+        run_module_group([m for m in module_run_order if m not in preset_check_modules], modules,
+                         prepare_assembly, args, results, result_cache, cache_keys)
+    else:
+        # Populate results with "Not Tested" for modules that did not run
+        for module in module_run_order:
+            if module not in preset_check_modules:
+                module_headers = [header for header in full_headers if header.startswith(module)]
+                for header in module_headers:
+                    results[header] = 'Not Tested'
+
+
+def run_auto_preset(assembly, prepare_assembly, select_modules, modules, args, results,
+                    preset_run_orders, result_cache=None, cache_keys=None):
+    """
+    This function runs one assembly for --preset auto. The presets' check modules (i.e. species
+    detection) are run once, and then only the modules of the first preset whose checks pass.
+    select_modules is given that preset's run order before any of its modules run. Returns the
+    preset's name, or None if the assembly didn't match any preset. As in run_modules, an error in
+    a check module counts as a failed check, but errors in the preset's other modules propagate.
+    """
+    presets = get_presets()
+    check_results = {}
+    for preset, run_order in preset_run_orders.items():
+        try:
+            passed = True
+            for module, check in presets[preset]['check']:
+                if module not in check_results:
+                    check_results[module] = get_module_results(module, modules, prepare_assembly,
+                                                               args, results, result_cache,
+                                                               cache_keys)
+                    results.update({f'{module}__{header}': result
+                                    for header, result in check_results[module].items()})
+                if not globals()[check](check_results[module]):
+                    passed = False
+                    break
+        except Exception as e:
+            print(f"Error encountered while processing {assembly} with preset {preset}: {e}.")
+            return None
+        if passed:
+            select_modules(run_order)
+            run_module_group([m for m in run_order if m not in check_results], modules,
+                             prepare_assembly, args, results, result_cache, cache_keys)
+            return preset
+    return None
+
+
+def run_module_group(module_names, modules, prepare_assembly, args, results, result_cache=None,
+                     cache_keys=None):
+    """
+    This function runs the given modules (in run order) on one assembly, adding their results to
+    the results dictionary. With --module_threads above one, the modules run on a thread pool:
+    each module starts as soon as its prerequisites (within the group) have finished, so
+    independent modules run at the same time, which helps because most of their time is spent
+    waiting on minimap2. Each module is given a copy of the results so far, which contains its
+    prerequisites' results, and the results dictionary is only updated from this thread.
+    """
+    if args.module_threads == 1 or len(module_names) < 2:
+        for module in module_names:
+            module_results = get_module_results(module, modules, prepare_assembly, args, results,
+                                                result_cache, cache_keys)
+            results.update({f'{module}__{header}': result
+                            for header, result in module_results.items()})
+        return
+
+    sorter = graphlib.TopologicalSorter({m: [p for p in modules[m].prerequisite_modules()
+                                             if p in module_names] for m in module_names})
+    sorter.prepare()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.module_threads) as executor:
+        running = {}  # key = future, value = module name
+        while sorter.is_active():
+            for module in sorter.get_ready():
+                module_results = None if result_cache is None else \
+                    result_cache.get(cache_keys[module])
+                if module_results is not None:
+                    results.update({f'{module}__{header}': result
+                                    for header, result in module_results.items()})
+                    sorter.done(module)
+                    continue
+                unzipped_assembly, minimap2_index = prepare_assembly()
+                running[executor.submit(run_module, module, modules, unzipped_assembly,
+                                        minimap2_index, args, dict(results))] = module
+            if not running:
+                continue  # only cached modules were ready, their dependents may be ready now
+            finished, _ = concurrent.futures.wait(running,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                module = running.pop(future)
+                module_results = future.result()
+                if result_cache is not None:
+                    result_cache.put(cache_keys[module], module_results)
+                results.update({f'{module}__{header}': result
+                                for header, result in module_results.items()})
+                sorter.done(module)
+
+
+def get_module_results(module, modules, prepare_assembly, args, results, result_cache, cache_keys):
+    """
+    Returns a module's results for the assembly, from the result cache if possible.
+    """
+    if result_cache is not None:
+        module_results = result_cache.get(cache_keys[module])
+        if module_results is not None:
+            return module_results
+    unzipped_assembly, minimap2_index = prepare_assembly()
+    module_results = run_module(module, modules, unzipped_assembly, minimap2_index, args, results)
+    if result_cache is not None:
+        result_cache.put(cache_keys[module], module_results)
+    return module_results
+
+
+def run_module(module, modules, unzipped_assembly, minimap2_index, args, results):
+    """
+    Runs a module's get_results (timed, if --profile was used) and returns its results.
+    """
+    with PROFILER.time_stage(results['strain'], module, 'get_results'):
+        return modules[module].get_results(unzipped_assembly, minimap2_index, args, results)
 
 
 # def main(): 
@@ -260,6 +633,38 @@ def print_modules(args, all_module_names, modules):
 
 
 
+def build_databases(args, all_module_names, modules):
+    if args.build_db:
+        built_dirs = set()
+        for m in all_module_names:
+            if not hasattr(modules[m], 'data_dir'):
+                continue
+            data_dir = modules[m].data_dir().resolve()
+            if not data_dir.is_dir() or data_dir in built_dirs:
+                continue
+            built_dirs.add(data_dir)
+            file_count = build_bundle(data_dir)
+            if file_count:
+                print(f'{m}: compiled {file_count} files into {data_dir / BUNDLE_FILENAME}')
+        sys.exit(0)
+
+
+def check_settings(args):
+    if args.jobs < 1:
+        sys.exit('Error: --jobs must be at least 1')
+    if args.module_threads < 1:
+        sys.exit('Error: --module_threads must be at least 1')
+    if args.profile_dumps and args.profile is None:
+        sys.exit('Error: --profile_dumps requires --profile')
+    if args.cache_size <= 0:
+        sys.exit('Error: --cache_size must be greater than 0')
+    check_output_format(args.output_format)
+    if args.preset == 'auto' and args.modules:
+        sys.exit('Error: --preset auto cannot be combined with --modules')
+    if args.resume and not OUTPUT_FORMATS[args.output_format].appendable:
+        sys.exit(f'Error: --resume cannot be used with --output_format {args.output_format}')
+
+
 def get_presets():
     kpsc_modules = {
         'check': [('enterobacterales__species', 'is_kp_complex')],
@@ -294,6 +699,34 @@ def get_presets():
     }
 
 
+def get_preset_output_suffixes():
+    """
+    Returns the suffix of each preset's output file, which is also the output file for assemblies
+    of that preset's species when running any preset.
+    """
+    return {'kpsc': 'klebsiella_pneumo_complex_output.txt',
+            'kosc': 'klebsiella_oxytoca_complex_output.txt',
+            'escherichia': 'escherichia_output.txt'}
+
+
+def get_preset_module_names(presets, modules):
+    """
+    Returns each preset's module names (key = preset name), in the same order they would be in
+    when running that preset on its own: the check modules, the pass modules and then any missing
+    prerequisite modules.
+    """
+    preset_module_names = {}
+    for preset, preset_modules in presets.items():
+        module_names = [module for module, _ in preset_modules['check']]
+        module_names += [m for m in preset_modules['pass'] if m not in module_names]
+        for m in module_names:  # the list grows, so prerequisites of prerequisites are included
+            for prereq in modules[m].prerequisite_modules():
+                if prereq not in module_names:
+                    module_names.append(prereq)
+        preset_module_names[preset] = module_names
+    return preset_module_names
+
+
 def add_module_cli_arguments(parser, args, all_module_names, modules):
     """
     This function add CLI argument for modules. Each modules that has options gets its own argument
@@ -316,7 +749,15 @@ def get_used_module_names(args, all_module_names, presets):
     check_modules = []
     pass_modules = []
 
-    if args.preset:
+    if args.preset == 'auto':
+        # All presets' modules are used, but each assembly only runs its own preset's modules.
+        for preset in presets.values():
+            check_modules += [module[0] for module in preset.get('check', [])
+                              if module[0] not in check_modules]
+            pass_modules += [m for m in preset.get('pass', []) if m not in pass_modules]
+        module_names += check_modules + [m for m in pass_modules if m not in check_modules]
+
+    elif args.preset:
         if args.preset not in presets:
             sys.exit(f'Error: {args.preset} is not a valid preset')
 
@@ -413,19 +854,24 @@ def get_run_order(dependency_graph):
 
 def check_assembly(assembly):
     """
-    This function does a quick check to make sure that the input assembly looks good.
+    This function does a quick check to make sure that the input assembly looks good. The file is
+    streamed, so the assembly's sequences are never all in memory.
     """
     # for assembly in args.assemblies:
     if os.path.isdir(assembly):
         sys.exit('Error: ' + assembly + ' is a directory (please specify assembly files)')
     if not os.path.isfile(assembly):
         sys.exit('Error: could not find ' + assembly)
-    fasta = load_fasta(assembly)
-    if len(fasta) < 1:
+    contig_count, length = 0, 0
+    for kind, value in iterate_fasta(assembly):
+        if kind == 'seq':
+            length += len(value)
+        else:
+            if length == 0:
+                sys.exit('Error: invalid FASTA file (contains a zero-length sequence): ' + assembly)
+            contig_count, length = contig_count + 1, 0
+    if contig_count < 1:
         sys.exit('Error: invalid FASTA file: ' + assembly)
-    for _, seq in fasta:
-        if len(seq) == 0:
-            sys.exit('Error: invalid FASTA file (contains a zero-length sequence): ' + assembly)
 
 
 def get_headers(module_names, modules):
@@ -449,6 +895,20 @@ def get_headers(module_names, modules):
     return full_headers, stdout_headers
 
 
+def get_header_types(module_names, modules):
+    """
+    This function returns the types of the modules' columns (key = full header, value = 'int',
+    'float' or 'str'), used for typed output formats. Modules can declare types for their headers
+    with an optional get_header_types function, and other columns are strings.
+    """
+    header_types = {}
+    for module_name in module_names:
+        if hasattr(modules[module_name], 'get_header_types'):
+            header_types.update({f'{module_name}__{h}': t
+                                 for h, t in modules[module_name].get_header_types().items()})
+    return header_types
+
+
 def gunzip_assembly_if_necessary(assembly, temp_dir):
     if get_compression_type(assembly) == 'gz':
         unzipped_assembly = pathlib.Path(temp_dir) / (uuid.uuid4().hex + '.fasta')
@@ -458,26 +918,35 @@ def gunzip_assembly_if_necessary(assembly, temp_dir):
         return assembly
 
 
+def get_alignment_query_files(module_names, modules, external_programs):
+    """
+    Returns the query files which the used modules align to each assembly (from each module's
+    optional get_alignment_query_files function). They are handed to an AlignmentBroker which
+    aligns them all in a single minimap2 run, so only files which some module will ask for are
+    included, each only once. Missing files are left out, so they only affect the modules which
+    use them. Modules without the function run their own alignments.
+    """
+    if 'minimap2' not in external_programs:
+        return []
+    query_files = []
+    for m in module_names:
+        if hasattr(modules[m], 'get_alignment_query_files'):
+            query_files += [pathlib.Path(f) for f in modules[m].get_alignment_query_files()
+                            if pathlib.Path(f).is_file()]
+    return list(dict.fromkeys(query_files))
+
+
 def build_minimap2_index(assembly, unzipped_assembly, external_programs, temp_dir):
     """
     A lot of the modules use minimap2 alignment, so pre-building the index for this assembly once
-    can save a bit of time.
+    can save a bit of time. What the index is depends on the alignment backend: a .mmi file for
+    the minimap2 backend or an in-memory aligner for the mappy backend.
     """
     if 'minimap2' not in external_programs:
         return None
-    minimap2_index = (pathlib.Path(temp_dir) / (uuid.uuid4().hex + '.mmi')).resolve()
-    command = ['minimap2', '-d', minimap2_index, unzipped_assembly]
-    p = subprocess.run(command, capture_output=True, text=True)
-    if p.returncode != 0:
-        sys.exit(f'\nError: minimap2 failed to index sample {assembly}:\n{p.stderr}')
-    return minimap2_index
+    return get_alignment_backend().build_index(assembly, unzipped_assembly, temp_dir)
 
 
-def decompress_file(in_file, out_file):
-    with gzip.GzipFile(in_file, 'rb') as i, open(out_file, 'wb') as o:
-        s = i.read()
-        o.write(s)
-
 def output_headers(full_headers, stdout_headers, outfile):
     """
     This function prints headers to stdout and writes headers to the output file. Module names are
@@ -490,29 +959,15 @@ def output_headers(full_headers, stdout_headers, outfile):
         o.write('\t'.join(trimmed_full_headers))
 
 
-def output_results(full_headers, stdout_headers, outfile, results, trim_headers=False):
+def output_results(full_headers, stdout_headers, outfile, results, trim_headers=False,
+                   journal=None):
     """
     This function writes the results to stdout and the output file.
     Always prints stdout headers and writes full headers to the file if the file is new (empty).
+    A whole run should use one OutputSink instead, which keeps the output files open.
     """
-    # Print results to the terminal using stdout_headers
-    print('\t'.join([str(results.get(x, "-")).strip("[] ") for x in stdout_headers]))
-
-    # Determine headers based on trim_headers option
-    headers_to_write = full_headers
-    if trim_headers:
-        headers_to_write = [h.split('__')[-1] for h in full_headers]
-
-    # Write results to the output file
-    with open(outfile, 'at') as o:
-        if o.tell() == 0:  # Write headers if file is empty
-            o.write('\t'.join(headers_to_write) + '\n')
-        o.write('\t'.join([str(results.get(x, "-")).strip("[] ") for x in full_headers]) + '\n')
-
-    # Check for any headers in results that are not in full_headers
-    for h in results.keys():
-        if h not in full_headers:
-            sys.exit(f'Error: results contained a value ({h}) that is not covered by the output headers')
+    with OutputSink(full_headers, stdout_headers, trim_headers, journal) as sink:
+        sink.write(outfile, results)
 
 
 # def output_results(full_headers, stdout_headers, outfile, results):
@@ -16,7 +16,11 @@ import argparse
 import os
 import pathlib
 import shutil
+import subprocess
 import sys
+import tempfile
+
+from ...shared.profiling import PROFILER
 
 
 def description():
@@ -66,10 +70,35 @@ def check_external_programs():
     return ['mash']
 
 
+# Species calls made by run_batch for all assemblies at once (key = strain name, value = (species,
+# distance)). Assemblies not in here get their own mash run in get_results.
+batch_species = {}
+
+
+def get_sketch_file():
+    return pathlib.Path(__file__).parents[0] / 'data' / 'species_mash_sketches.msh'
+
+
+def run_batch(assemblies, args):
+    """
+    Kleborate calls this before processing any assemblies, with a {strain name: assembly path}
+    dictionary. All assemblies are compared to the species sketches in a single mash run, which is
+    much faster than one mash run per assembly.
+    """
+    return get_batch_enterobacterales__species(assemblies, get_sketch_file(), args.jobs)
+
+
+def set_batch_results(batch_results):
+    global batch_species
+    batch_species = batch_results
+
+
 def get_results(assembly, minimap2_index, args, previous_results):
-    #print(previous_results)
-    sketch_file = pathlib.Path(__file__).parents[0] / 'data' / 'species_mash_sketches.msh'
-    species, distance = get_enterobacterales__species(assembly, sketch_file)
+    strain = previous_results.get('strain')
+    if strain in batch_species:
+        species, distance = batch_species[strain]
+    else:
+        species, distance = get_enterobacterales__species(assembly, get_sketch_file())
     if distance <= args.enterobacterales__species_strong:
         species_hit_strength = 'strong'
     elif distance <= args.enterobacterales__species_weak:
@@ -81,19 +110,67 @@ def get_results(assembly, minimap2_index, args, previous_results):
             'species_match': species_hit_strength}
 
 
-def get_enterobacterales__species(assembly, sketch_file):
-    f = os.popen('mash dist ' + str(sketch_file) + ' ' + str(assembly))
-    best_species, best_distance = None, 1.0
-    for line in f:
+def get_batch_enterobacterales__species(assemblies, sketch_file, threads=1):
+    """
+    Runs mash dist once for all assemblies ({strain name: assembly path}), streaming its output to
+    keep only the best hit for each assembly. The assembly paths are given to mash in a list file,
+    so there's no limit on their number from the command line's length. Returns a {strain name:
+    (species, distance)} dictionary, which is empty if mash failed (so each assembly will get its
+    own mash run instead).
+    """
+    if not assemblies:
+        return {}
+    query_strains = {str(path): strain for strain, path in assemblies.items()}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        query_list = pathlib.Path(temp_dir) / 'assemblies.txt'
+        query_list.write_text(''.join(f'{path}\n' for path in query_strains))
+        command = ['mash', 'dist', '-p', str(threads), str(sketch_file), '-l', str(query_list)]
+        try:
+            with PROFILER.time_subprocess('mash'):
+                with subprocess.Popen(command, stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL, text=True) as p:
+                    best_hits = get_best_species_per_query(p.stdout)
+        except OSError:
+            return {}
+    if p.returncode != 0:
+        return {}
+    return {query_strains[query]: (clean_species_name(species), distance)
+            for query, (species, distance) in best_hits.items() if query in query_strains}
+
+
+def get_best_species_per_query(mash_lines):
+    """
+    Takes lines of mash dist output and returns a {query: (species, distance)} dictionary with the
+    closest reference species for each query.
+    """
+    best_hits = {}
+    for line in mash_lines:
         line_parts = line.split('\t')
-        reference = line_parts[0]
         if len(line_parts) >= 3:
-            species = reference.split('/')[0]
-            distance = float(line_parts[2])
+            species = line_parts[0].split('/')[0]
+            query, distance = line_parts[1], float(line_parts[2])
+            best_species, best_distance = best_hits.get(query, (None, 1.0))
             if distance < best_distance:
-                best_distance = distance
-                best_species = species
-    f.close()
+                best_hits[query] = (species, distance)
+            elif query not in best_hits:
+                best_hits[query] = (best_species, best_distance)
+    return best_hits
+
+
+def get_enterobacterales__species(assembly, sketch_file):
+    best_species, best_distance = None, 1.0
+    with PROFILER.time_subprocess('mash'):
+        f = os.popen('mash dist ' + str(sketch_file) + ' ' + str(assembly))
+        for line in f:
+            line_parts = line.split('\t')
+            reference = line_parts[0]
+            if len(line_parts) >= 3:
+                species = reference.split('/')[0]
+                distance = float(line_parts[2])
+                if distance < best_distance:
+                    best_distance = distance
+                    best_species = species
+        f.close()
     best_species = clean_species_name(best_species)
     return best_species, best_distance
 
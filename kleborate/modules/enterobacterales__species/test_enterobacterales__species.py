@@ -19,7 +19,9 @@ not, see <https://www.gnu.org/licenses/>.
 """
 
 import collections
+import pathlib
 import pytest
+import subprocess
 
 from .enterobacterales__species import *
 
@@ -221,3 +223,42 @@ def test_yersinia_unknown():
     species, _ = get_enterobacterales__species(get_test_genome_dir() / 'GCF_001123825.1.fna.gz',
                                         get_sketch_file())
     assert species == 'Yersinia (unknown species)'
+
+
+def test_get_best_species_per_query():
+    mash_lines = ['Klebsiella_pneumoniae/a.fna\tx.fasta\t0.03\t0\t500/1000\n',
+                  'Klebsiella_variicola/b.fna\tx.fasta\t0.01\t0\t900/1000\n',
+                  'Klebsiella_pneumoniae/a.fna\ty.fasta\t0.02\t0\t600/1000\n',
+                  'Klebsiella_variicola/b.fna\ty.fasta\t0.02\t0\t600/1000\n',
+                  'Klebsiella_pneumoniae/a.fna\tz.fasta\t1\t1\t0/1000\n']
+    best_hits = get_best_species_per_query(mash_lines)
+    assert best_hits['x.fasta'] == ('Klebsiella_variicola', 0.01)
+    assert best_hits['y.fasta'] == ('Klebsiella_pneumoniae', 0.02)  # first of tied hits
+    assert best_hits['z.fasta'] == (None, 1.0)
+
+
+def test_get_batch_enterobacterales__species_1(mocker):
+    # The assemblies are given to mash in a list file, with the number of threads.
+    commands = []
+    real_popen = subprocess.Popen
+
+    def fake_popen(command, **kwargs):
+        commands.append(command)
+        query_list = pathlib.Path(command[command.index('-l') + 1])
+        mash_output = query_list.parent / 'mash_output.tsv'
+        mash_output.write_text(''.join(f'Klebsiella_variicola/b.fna\t{q}\t0.01\t0\t900/1000\n'
+                                       for q in query_list.read_text().splitlines()))
+        return real_popen(['cat', str(mash_output)], **kwargs)
+    mocker.patch('subprocess.Popen', side_effect=fake_popen)
+    species = get_batch_enterobacterales__species({'x': 'a/x.fasta', 'y': 'a/y.fasta.gz'},
+                                                  get_sketch_file(), 4)
+    assert species == {'x': ('Klebsiella variicola', 0.01), 'y': ('Klebsiella variicola', 0.01)}
+    assert commands[0][:4] == ['mash', 'dist', '-p', '4']
+    assert '-l' in commands[0] and 'a/x.fasta' not in commands[0]
+
+
+def test_get_batch_enterobacterales__species_2(mocker):
+    # If mash can't be run (e.g. the command is too long), there are no batch results, so each
+    # assembly will get its own mash run.
+    mocker.patch('subprocess.Popen', side_effect=OSError(7, 'Argument list too long'))
+    assert get_batch_enterobacterales__species({'x': 'a/x.fasta'}, get_sketch_file()) == {}
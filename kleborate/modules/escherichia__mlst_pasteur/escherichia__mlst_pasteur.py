@@ -69,8 +69,16 @@ def data_dir():
     return pathlib.Path(__file__).parents[0] / 'data'
 
 
+def get_genes():
+    return ['dinB', 'icdA', 'pabB', 'polB', 'putP', 'trpA', 'trpB', 'uidA']
+
+
+def get_alignment_query_files():
+    return [data_dir() / f'{gene}.fasta' for gene in get_genes()]
+
+
 def get_results(assembly, minimap2_index, args, previous_results):
-    genes = ['dinB', 'icdA', 'pabB', 'polB', 'putP', 'trpA', 'trpB', 'uidA']
+    genes = get_genes()
     profiles = data_dir() / 'profiles.tsv'
     alleles = {gene: data_dir() / f'{gene}.fasta' for gene in genes}
 
@@ -11,13 +11,15 @@ details. You should have received a copy of the GNU General Public License along
 not, see <https://www.gnu.org/licenses/>.
 """
 
-import collections
 import json
 import pathlib
 from pathlib import Path
 import ast
 
-from ...shared.misc import load_fasta
+import numpy as np
+
+from ...shared.assembly_store import get_assembly_store
+from ...shared.misc import load_cached_fasta
 
 
 
@@ -36,6 +38,10 @@ def get_headers():
     return full_headers, stdout_headers
 
 
+def get_header_types():
+    return {'contig_count': 'int', 'N50': 'int', 'largest_contig': 'int', 'total_size': 'int'}
+
+
 def add_cli_options(parser):
     pass
 
@@ -67,39 +73,36 @@ def get_results(assembly, minimap2_index, args, previous_results):
 
 
 def get_contig_stats(assembly):
-    fasta = load_fasta(assembly)
-
-    base_counts = collections.defaultdict(int)
-    for _, seq in fasta:
-        for b in seq:
-            base_counts[b] += 1
-    base_counts.pop('A', None)
-    base_counts.pop('C', None)
-    base_counts.pop('G', None)
-    base_counts.pop('T', None)
-    ambiguous_base_count = sum(base_counts.values())
+    """
+    Returns the contig count, N50, largest contig length, total size and ambiguous base summary for
+    an assembly. The contigs come from the assembly's AssemblyStore if it's an AssemblyFile,
+    otherwise they're loaded from the assembly file.
+    """
+    store = get_assembly_store(assembly)
+    if store is not None:
+        contig_lengths = np.array(store.lengths, dtype=np.int64)
+    else:
+        fasta = load_cached_fasta(assembly)
+        contig_lengths = np.array([len(seq) for _, seq in fasta], dtype=np.int64)
+    if len(contig_lengths) == 0:
+        return 0, 0, 0, 0, 'no'
+
+    if store is not None:
+        ambiguous_base_count = store.ambiguous_base_count()
+    else:
+        ambiguous_base_count = sum(len(seq.encode('ascii', 'replace').translate(None, b'ACGT'))
+                                   for _, seq in fasta)
     if ambiguous_base_count:
         ambiguous_bases = 'yes (' + str(ambiguous_base_count) + ')'
     else:
         ambiguous_bases = 'no'
 
-    contig_lengths = sorted([len(x[1]) for x in fasta])
-    if not contig_lengths:
-        return 0, 0, 0, 0, 'no'
-    longest = contig_lengths[-1]
-
-    total_size = sum(contig_lengths)
-    half_total_length = total_size / 2
-    total_so_far = 0
-    segment_lengths = contig_lengths[::-1]
-    N50 = 0
-    for length in segment_lengths:
-        total_so_far += length
-        if total_so_far >= half_total_length:
-            N50 = length
-            break
-
-    return len(contig_lengths), N50, longest, total_size, ambiguous_bases
+    contig_lengths = np.sort(contig_lengths)[::-1]
+    total_size = int(contig_lengths.sum())
+    cumulative_lengths = np.cumsum(contig_lengths)
+    N50 = int(contig_lengths[np.searchsorted(cumulative_lengths, total_size / 2)])
+
+    return len(contig_lengths), N50, int(contig_lengths[0]), total_size, ambiguous_bases
 
 
 def load_species_specifications(file_path):
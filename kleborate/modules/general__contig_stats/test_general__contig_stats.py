@@ -94,6 +94,13 @@ def test_ambiguous_bases_4():
     assert ambiguous == 'yes (4)'
 
 
+def test_mixed_ambiguous_bases(tmp_path):
+    # All non-ACGT characters count as ambiguous bases.
+    assembly = tmp_path / 'assembly.fasta'
+    assembly.write_text('>a\nACGTN\n>b\nACGTRYACGT\n>c\nAC\n')
+    assert get_contig_stats(assembly) == (3, 10, 10, 17, 'yes (3)')
+
+
 def test_total_size_1():
     _, _, _, total_size, _ = get_contig_stats(get_file_dir() / 'test_1.fasta')
     assert total_size == 115
@@ -75,9 +75,17 @@ def data_dir():
     return pathlib.Path(__file__).parents[0] / 'data'
 
 
+def get_genes():
+    return ['clbA', 'clbB', 'clbC', 'clbD', 'clbE', 'clbF', 'clbG', 'clbH', 'clbI', 'clbL',
+            'clbM', 'clbN', 'clbO', 'clbP', 'clbQ']
+
+
+def get_alignment_query_files():
+    return [data_dir() / f'{gene}.fasta' for gene in get_genes()]
+
+
 def get_results(assembly, minimap2_index, args, previous_results):
-    genes = ['clbA', 'clbB', 'clbC', 'clbD', 'clbE', 'clbF', 'clbG', 'clbH', 'clbI', 'clbL',
-             'clbM', 'clbN', 'clbO', 'clbP', 'clbQ']
+    genes = get_genes()
     profiles = data_dir() / 'profiles.tsv'
     alleles = {gene: data_dir() / f'{gene}.fasta' for gene in genes}
     
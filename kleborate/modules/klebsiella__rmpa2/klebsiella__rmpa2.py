@@ -63,6 +63,10 @@ def data_dir():
     return pathlib.Path(__file__).parents[0] / 'data'
 
 
+def get_alignment_query_files():
+    return [data_dir() / 'rmpA2.fasta']
+
+
 def get_results(assembly, minimap2_index, args, previous_results):
     ref_file = data_dir() / 'rmpA2.fasta'
     rmpa2_allele = rmpa2_minimap(
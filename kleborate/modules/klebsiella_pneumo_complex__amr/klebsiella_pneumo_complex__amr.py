@@ -73,6 +73,11 @@ def data_dir():
     return pathlib.Path(__file__).parents[0] / 'data'
 
 
+def get_alignment_query_files():
+    return [data_dir() / f for f in ['CARD_v3.2.9.fasta', 'QRDR_120.fasta', 'MgrB_and_PmrB.fasta',
+                                     'OmpK.fasta']]
+
+
 def get_results(assembly, minimap2_index, args, previous_results):
     gene_info, _, _ = read_class_file(data_dir() / 'CARD_AMR_clustered.csv')
     full_headers, _ = get_headers() 
@@ -13,10 +13,8 @@ details. You should have received a copy of the GNU General Public License along
 not, see <http://www.gnu.org/licenses/>.
 """
 
-from Bio.Seq import Seq
-from Bio import Align
-from Bio.Align import substitution_matrices
 from ...shared.alignment import align_query_to_ref, truncation_check, get_bases_per_ref_pos
+from ...shared.pairwise import get_best_alignment
 
 
 def check_omp_genes(hits_dict, assembly, omp, min_identity, min_coverage):
@@ -24,9 +22,6 @@ def check_omp_genes(hits_dict, assembly, omp, min_identity, min_coverage):
     best_ompk35_cov, best_ompk36_cov = 0.0, 0.0
     ompk36_loci = {'OmpK36': [(25, 'C')]}
     
-    # define the aligner
-    aligner = Align.PairwiseAligner(mode='global', match_score=5, mismatch_score=-4, open_gap_score = -10, extend_gap_score = -0.5)
-    
     alignment_hits = align_query_to_ref(omp, assembly, min_query_coverage=None, min_identity=None)
     
     ompk35_hit = False
@@ -44,8 +39,8 @@ def check_omp_genes(hits_dict, assembly, omp, min_identity, min_coverage):
             ompk36_hit = True
             query_seq = hit.query_seq
             assembly_seq = hit.ref_seq
-            alignments = aligner.align(query_seq , assembly_seq)
-            bases_per_ref_pos = get_bases_per_ref_pos(alignments[0])
+            alignment = get_best_alignment('nucleotide', query_seq, assembly_seq)
+            bases_per_ref_pos = get_bases_per_ref_pos(alignment)
             loci = ompk36_loci[hit.query_name]
             for pos, wt_base in loci:
                 assembly_base = bases_per_ref_pos[pos]
@@ -13,11 +13,9 @@ details. You should have received a copy of the GNU General Public License along
 not, see <http://www.gnu.org/licenses/>.
 """
 
-from Bio.Seq import Seq
-from Bio import Align
-from Bio.Align import substitution_matrices
 from ...shared.alignment import align_query_to_ref, truncation_check, get_bases_per_ref_pos
 from ...shared.misc import load_fasta, reverse_complement
+from ...shared.pairwise import get_best_alignment
 
 
 
@@ -38,12 +36,6 @@ def check_for_qrdr_mutations(hits_dict, assembly, qrdr, min_identity, min_covera
     parc_ref = 'MSDMAERLALHEFTENAYLNYSMYVIMDRALPFIGDGLKPVQRRIVYAMSELGLNASAKF' \
                'KKSARTVGDVLGKYHPHGDSACYEAMVLMAQPFSYRYPLVDGQGNWGAPDDPKSFAAMRY'
 
-    # define PairwiseAligner
-    protein_aligner = Align.PairwiseAligner()
-    protein_aligner.substitution_matrix = substitution_matrices.load("BLOSUM62")
-    protein_aligner.open_gap_score = -10
-    protein_aligner.extend_gap_score = -0.5
-
     snps = []
 
     alignment_hits = align_query_to_ref(qrdr, assembly, min_query_coverage=None, min_identity=min_identity) 
@@ -52,12 +44,12 @@ def check_for_qrdr_mutations(hits_dict, assembly, qrdr, min_identity, min_covera
         
         if coverage > min_coverage:
             if hit.query_name == 'GyrA':
-                alignments = protein_aligner.align(gyra_ref, translation)
+                alignment = get_best_alignment('protein', gyra_ref, translation)
             elif hit.query_name == 'ParC':
-                alignments = protein_aligner.align(parc_ref, translation)
+                alignment = get_best_alignment('protein', parc_ref, translation)
             else:
                 assert False
-            bases_per_ref_pos = get_bases_per_ref_pos(alignments[0])
+            bases_per_ref_pos = get_bases_per_ref_pos(alignment)
             loci = qrdr_loci[hit.query_name]
 
             for pos, wt_base in loci:
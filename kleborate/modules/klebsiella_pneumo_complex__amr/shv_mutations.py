@@ -13,10 +13,9 @@ details. You should have received a copy of the GNU General Public License along
 not, see <http://www.gnu.org/licenses/>.
 """
 
-from Bio.Seq import Seq
-from Bio import Align
-from Bio.Align import substitution_matrices
 from ...shared.misc import reverse_complement
+from ...shared.pairwise import get_best_alignment
+from ...shared.translation import translate
 
 def check_for_shv_mutations(hit, hit_allele, bla_class, exact_match):
     
@@ -34,29 +33,20 @@ def check_for_shv_mutations(hit, hit_allele, bla_class, exact_match):
     # BioPython doesn't like it if the sequence isn't a multiple of 3.
     nucl_seq = nucl_seq[:len(nucl_seq) // 3 * 3]
 
-    coding_dna = Seq(nucl_seq)
-    translation = str(coding_dna.translate(table='Bacterial', to_stop=True))
+    translation = translate(nucl_seq, to_stop=True)
 
     shv_1_ref = 'MRYIRLCIISLLATLPLAVHASPQPLEQIKLSESQLSGRVGMIEMDLASGRTLTAWRADERFPMMSTFKVVLCGAVLAR' \
                 'VDAGDEQLERKIHYRQQDLVDYSPVSEKHLADGMTVGELCAAAITMSDNSAANLLLATVGGPAGLTAFLRQIGDNVTRL' \
                 'DRWETELNEALPGDARDTTTPASMAATLRKLLTSQRLSARSQRQLLQWMVDDRVAGPLIRSVLPAGWFIADKTGAGERG' \
                 'ARGIVALLGPNNKAERIVVIYLRDTPASMAERNQQIAGIGAALIEHWQR'
 
-    # define the aligner
-    protein_aligner = Align.PairwiseAligner()
-    protein_aligner.substitution_matrix = substitution_matrices.load("BLOSUM62")
-    protein_aligner.open_gap_score = -10
-    protein_aligner.extend_gap_score = -0.5
-
-
-    alignments = protein_aligner.align(shv_1_ref, translation)
+    alignment = get_best_alignment('protein', shv_1_ref, translation)
 
     # If we didn't get any global amino acid alignments, then it's not appropriate to look for SHV
     # mutations in this hit.
-    if not alignments:
+    if alignment is None:
         return bla_class, [], [], None
 
-    alignment = alignments[0]
     ref_aligned, hit_aligned = alignment
     score = alignment.score
     
@@ -18,11 +18,16 @@ If not, see <https://www.gnu.org/licenses/>.
 import os
 from pathlib import Path
 import shutil
+from subprocess import Popen, PIPE
 import sys
 
-from kaptive.database import load_database
+from kaptive.database import get_database, load_database
 from kaptive.misc import check_python_version, check_programs, get_logo, check_cpus, check_file
-from kaptive.assembly import typing_pipeline
+from kaptive.assembly import Assembly, iter_alns, parse_assembly, typing_pipeline
+from Bio.Seq import Seq
+
+from ...shared.assembly_store import get_assembly_store
+from ...shared.profiling import PROFILER
 
 
 def description():
@@ -49,9 +54,9 @@ def add_cli_options(parser):
     group = parser.add_argument_group(f'{module_name} module')
     group.add_argument('-t', '--threads', type=check_cpus, default=8, metavar='',
                        help="Kaptive number of threads for alignment (default: %(default)s)")
-    group.add_argument('--k-db', type=load_database, default=load_database('kpsc_k'), metavar='',
+    group.add_argument('--k-db', type=get_database, default='kpsc_k', metavar='',
                        help="Kaptive database for K-locus typing (default: kpsc_k)")
-    group.add_argument('--o-db', type=load_database, default=load_database('kpsc_k'), metavar='',
+    group.add_argument('--o-db', type=get_database, default='kpsc_o', metavar='',
                        help="Kaptive database for O-locus typing (default: kpsc_o)")
     return group
 
@@ -67,49 +72,26 @@ def check_external_programs():
     return ['minimap2']
 
 
-# define all headers
-
-all_headers = [
-    'Assembly', 'locus', 'type', 'locus confidence',
-    'locus problems', 'locus identity', 'Coverage', 'Length discrepancy',
-    'Expected genes in locus', 'Expected genes in locus, details',
-    'Missing expected genes', 'Other genes in locus',
-    'Other genes in locus, details', 'Expected genes outside locus',
-    'Expected genes outside locus, details', 'Other genes outside locus',
-    'Other genes outside locus, details', 'Truncated genes, details'
-]
+# The --k-db and --o-db options only hold database paths. The databases themselves are loaded on
+# first use and kept for the rest of the run (in a KaptiveSession), so runs that don't do any
+# Kaptive typing (or just print help) don't have to parse them.
+kaptive_session = None
 
 
 def get_results(assembly, minimap2_index, args, previous_results):
+    global kaptive_session
     full_headers, _ = get_headers()
+    if kaptive_session is None or not kaptive_session.matches(args):
+        kaptive_session = KaptiveSession(args.k_db, args.o_db, args.threads)
 
-    assembly_path = Path(assembly)
-
+    k_result, o_result = kaptive_session.type_assembly(assembly, minimap2_index)
     results_dict = {}
-
-    k_results = typing_pipeline(assembly_path, args.k_db, threads=args.threads)
-    if k_results is not None:
-        k_result_table = k_results.format('tsv')
-        for line in k_result_table.split('\n'):
-            if line:
-                parts = line.split('\t')
-                for key, value in zip(all_headers, parts):
-                    header = 'K_' + key.replace(' ', '_')
-                    if header in full_headers:
-                        results_dict[header] = value
+    if k_result is not None:
+        results_dict.update(get_locus_results('K', k_result))
     else:
         print("Warning: No gene alignments sufficient for typing. Skipping k_results processing.")
-
-    o_results = typing_pipeline(assembly_path, args.o_db, threads=args.threads)
-    if o_results is not None:
-        o_result_table = o_results.format('tsv')
-        for line in o_result_table.split('\n'):
-            if line:
-                parts = line.split('\t')
-                for key, value in zip(all_headers, parts):
-                    header = 'O_' + key.replace(' ', '_')
-                    if header in full_headers:
-                        results_dict[header] = value
+    if o_result is not None:
+        results_dict.update(get_locus_results('O', o_result))
     else:
         print("Warning: No gene alignments sufficient for typing. Skipping o_results processing.")
 
@@ -120,3 +102,94 @@ def get_results(assembly, minimap2_index, args, previous_results):
     results_dict = {k: (v if v else '-') for k, v in results_dict.items()}
 
     return results_dict
+
+
+def get_locus_results(prefix, result):
+    """
+    Returns the output columns for a Kaptive TypingResult, formatted the same as in Kaptive's
+    tabular output.
+    """
+    return {f'{prefix}_locus': result.best_match.name,
+            f'{prefix}_type': result.phenotype,
+            f'{prefix}_locus_confidence': result.confidence,
+            f'{prefix}_locus_problems': result.problems,
+            f'{prefix}_locus_identity': f'{result.percent_identity:.2f}%',
+            f'{prefix}_Missing_expected_genes': ';'.join(result.missing_genes)}
+
+
+class KaptiveSession(object):
+    """
+    This class holds the K and O locus databases for the whole run and types both loci in each
+    assembly. The first step of Kaptive's typing (aligning all of a database's genes to the
+    assembly) is done for both databases in a single minimap2 run.
+    """
+    def __init__(self, k_db_path, o_db_path, threads):
+        self.k_db_path, self.o_db_path, self.threads = k_db_path, o_db_path, threads
+        self.k_db, self.o_db = load_database(k_db_path), load_database(o_db_path)
+        self.k_genes, self.o_genes = self.k_db.format('ffn'), self.o_db.format('ffn')
+
+    def matches(self, args):
+        return (self.k_db_path, self.o_db_path, self.threads) == \
+            (args.k_db, args.o_db, args.threads)
+
+    def type_assembly(self, assembly, minimap2_index):
+        """
+        Returns Kaptive's K locus and O locus TypingResults (either can be None). When Kleborate
+        gives the assembly as an AssemblyFile, Kaptive takes sequences from its AssemblyStore
+        instead of parsing its own copy of the assembly.
+        """
+        store = get_assembly_store(assembly)
+        if store is not None:
+            kaptive_assembly = Assembly(Path(assembly))
+        else:
+            kaptive_assembly = parse_assembly(Path(assembly))
+            if kaptive_assembly is None:
+                return None, None
+        kaptive_assembly = SharedAlignmentAssembly(kaptive_assembly, minimap2_index, store)
+        kaptive_assembly.align_together([self.k_genes, self.o_genes], self.threads)
+        return (typing_pipeline(kaptive_assembly, self.k_db, threads=self.threads),
+                typing_pipeline(kaptive_assembly, self.o_db, threads=self.threads))
+
+
+class SharedAlignmentAssembly(Assembly):
+    """
+    A Kaptive Assembly which aligns to Kleborate's minimap2 index of the assembly (when there is
+    one) and can align several query sets in one minimap2 run, handing each query set's
+    alignments back when Kaptive asks for them. With an AssemblyStore, sequences come from the
+    store (Kaptive only gets sequences through Assembly.seq).
+    """
+    def __init__(self, assembly, minimap2_index, store=None):
+        super().__init__(assembly.path, assembly.name, assembly.contigs)
+        self.store = store
+        if isinstance(minimap2_index, (str, Path)) and Path(minimap2_index).is_file():
+            self.ref = Path(minimap2_index)
+        else:
+            self.ref = self.path
+        self.aligned_queries = {}  # key = query FASTA text, value = list of alignments
+
+    def align_together(self, queries, threads):
+        query_names = [{line[1:].split()[0] for line in q.splitlines() if line.startswith('>')}
+                       for q in queries]
+        if sum(len(n) for n in query_names) != len(set().union(*query_names)):
+            return  # shared query names, so the alignments couldn't be split apart
+        alignments = list(self.run_minimap2(''.join(queries), threads))
+        for query, names in zip(queries, query_names):
+            self.aligned_queries[query] = [a for a in alignments if a.q in names]
+
+    def seq(self, ctg, start, end, strand='+'):
+        if self.store is None:
+            return super().seq(ctg, start, end, strand)
+        seq = Seq(self.store[ctg][start:end])
+        return seq if strand == '+' else seq.reverse_complement()
+
+    def map(self, stdin, threads):
+        if stdin in self.aligned_queries:
+            return iter(self.aligned_queries.pop(stdin))
+        return self.run_minimap2(stdin, threads)
+
+    def run_minimap2(self, stdin, threads):
+        command = ['minimap2', '-c', '-t', str(threads), str(self.ref), '-']
+        with PROFILER.time_subprocess('minimap2'):
+            paf = Popen(command, stdin=PIPE, stdout=PIPE,
+                        stderr=PIPE).communicate(stdin.encode())[0].decode()
+        return iter_alns(paf)
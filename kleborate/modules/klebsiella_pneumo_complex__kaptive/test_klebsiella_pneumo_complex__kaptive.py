@@ -0,0 +1,107 @@
+"""
+This file contains tests for Kleborate. To run all tests, go the repo's root directory and run:
+  python3 -m pytest
+
+To get code coverage stats:
+  coverage run --source . -m pytest && coverage report -m
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import pathlib
+import tempfile
+
+from .klebsiella_pneumo_complex__kaptive import *
+from ...shared.alignment import get_alignment_backend
+from ...shared.assembly_store import AssemblyFile
+from ...shared.misc import decompress_file
+
+
+def get_test_genome_dir():
+    return pathlib.Path(__file__).parents[3] / 'test' / 'test_genomes'
+
+
+def get_default_args(*options):
+    parser = argparse.ArgumentParser()
+    add_cli_options(parser)
+    return parser.parse_args(list(options))
+
+
+def test_prerequisite_modules():
+    assert prerequisite_modules() == []
+
+
+def test_default_databases():
+    args = get_default_args()
+    assert args.k_db == get_database('kpsc_k')
+    assert args.o_db == get_database('kpsc_o')
+
+
+def test_get_results_default_databases():
+    # NTUH-K2044 is K1 and O1, and the O columns come from the O locus database.
+    results = get_results(get_test_genome_dir() / 'GCF_000009885.1.fna.gz', None,
+                          get_default_args(), {})
+    assert results['K_locus'] == 'KL1'
+    assert results['K_type'] == 'K1'
+    assert results['O_locus'] == 'O1/O2v2'
+    assert results['O_type'] == 'O1ab'
+    assert results['O_locus_confidence'] == 'Typeable'
+
+
+def get_kaptive_results(assembly, k_db, o_db):
+    # Kaptive's own typing, one database at a time, for comparison.
+    results = {}
+    for prefix, db in [('K', k_db), ('O', o_db)]:
+        results.update(get_locus_results(prefix, typing_pipeline(Path(assembly),
+                                                                 load_database(db), threads=1)))
+    return results
+
+
+def sort_missing_genes(results):
+    return {k: ';'.join(sorted(v.split(';'))) if k.endswith('_Missing_expected_genes') else v
+            for k, v in results.items()}
+
+
+def test_kaptive_session():
+    # Typing both loci with one shared alignment (with or without Kleborate's minimap2 index)
+    # gives the same results as Kaptive's own typing.
+    assembly = get_test_genome_dir() / 'GCF_000009885.1.fna.gz'
+    k_db, o_db = get_database('kpsc_k'), get_database('kpsc_o')
+    expected = sort_missing_genes(get_kaptive_results(assembly, k_db, o_db))
+    session = KaptiveSession(k_db, o_db, 1)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        unzipped_assembly = Path(temp_dir) / 'assembly.fasta'
+        decompress_file(assembly, unzipped_assembly)
+        index = get_alignment_backend().build_index(assembly, unzipped_assembly, temp_dir)
+        for minimap2_index in [None, index]:
+            k_result, o_result = session.type_assembly(unzipped_assembly, minimap2_index)
+            results = {**get_locus_results('K', k_result), **get_locus_results('O', o_result)}
+            assert sort_missing_genes(results) == expected
+
+        # With an AssemblyFile, Kaptive takes its sequences from the assembly's store.
+        with AssemblyFile(unzipped_assembly, temp_dir) as assembly_file:
+            k_result, o_result = session.type_assembly(assembly_file, index)
+            assert assembly_file.store is not None
+        results = {**get_locus_results('K', k_result), **get_locus_results('O', o_result)}
+        assert sort_missing_genes(results) == expected
+
+
+def test_shared_alignment_assembly():
+    # Query sets with clashing sequence names aren't aligned together, so each is aligned
+    # separately when Kaptive asks for it.
+    kaptive_assembly = parse_assembly(get_test_genome_dir() / 'GCF_000009885.1.fna.gz')
+    shared = SharedAlignmentAssembly(kaptive_assembly, None)
+    queries = ['>a\nACGTACGTAGCTAGCATCGACTAGC\n', '>a\nTTGACGATCGACTAGCTAGCAT\n']
+    shared.align_together(queries, 1)
+    assert shared.aligned_queries == {}
+    assert shared.ref == kaptive_assembly.path
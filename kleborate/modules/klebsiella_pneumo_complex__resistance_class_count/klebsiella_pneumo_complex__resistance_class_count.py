@@ -34,6 +34,10 @@ def get_headers():
     return full_headers, stdout_headers
 
 
+def get_header_types():
+    return {'num_resistance_classes': 'int'}
+
+
 def add_cli_options(parser):
     pass
 
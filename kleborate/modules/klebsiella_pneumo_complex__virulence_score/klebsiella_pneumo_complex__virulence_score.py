@@ -28,6 +28,10 @@ def get_headers():
     return full_headers, stdout_headers
 
 
+def get_header_types():
+    return {'virulence_score': 'int'}
+
+
 def add_cli_options(parser):
     pass
 
@@ -64,6 +64,10 @@ def data_dir():
     return pathlib.Path(__file__).parents[0] / 'data'
 
 
+def get_alignment_query_files():
+    return [data_dir() / 'wzi.fasta']
+
+
 def get_results(assembly, minimap2_index, args, previous_results):
     gene = 'wzi'
     profile = data_dir() / 'wzi.txt'
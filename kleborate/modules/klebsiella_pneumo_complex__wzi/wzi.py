@@ -12,7 +12,10 @@ not, see <https://www.gnu.org/licenses/>.
 """
 import re
 
+import numpy as np
+
 from ...shared.alignment import align_query_to_ref, truncation_check
+from ...shared.database import get_bundled_profiles
 from ...shared.mlst import get_best_hits, number_from_hit
 
 
@@ -21,6 +24,20 @@ def load_st_profiles(database_path, gene_name, extra_info_name=None):
     This function returns a list of WZI ST profiles, where each value is a tuple:
     (ST number, list of allele numbers, extra info)
     """
+    bundled = get_bundled_profiles(database_path)
+    if bundled is not None and all(isinstance(c, np.ndarray) for c in bundled[1][:2]):
+        header, columns = bundled
+        assert header[0] == 'ST' and header[1] == gene_name
+        if extra_info_name is not None:
+            assert header[2] == extra_info_name
+        if extra_info_name is None:
+            extra_infos = [None] * len(columns[0])
+        elif isinstance(columns[2], np.ndarray):  # numeric extra info, as str like the text path
+            extra_infos = [str(e) for e in columns[2].tolist()]
+        else:
+            extra_infos = columns[2]
+        return [(st, [allele], extra_info) for st, allele, extra_info
+                in zip(columns[0].tolist(), columns[1].tolist(), extra_infos)]
     profiles, first_line = [], True
     with open(database_path, 'r') as f:
         for line in f:
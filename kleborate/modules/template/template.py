@@ -56,6 +56,16 @@ def get_headers():
     return full_headers, stdout_headers
 
 
+def get_header_types():
+    """
+    This optional function returns the types of this module's columns, for output formats with
+    typed columns (JSON Lines and Parquet). It returns a dictionary where the keys are headers and
+    the values are 'int', 'float' or 'str'. Headers which aren't included are strings. Results in
+    an 'int' or 'float' column which aren't numbers (e.g. '-') are output as null values.
+    """
+    return {'header_b': 'int'}
+
+
 def add_cli_options(parser):
     """
     This function adds a group of arguments for this module. If the template doesn't require any
@@ -12,14 +12,23 @@ details. You should have received a copy of the GNU General Public License along
 not, see <https://www.gnu.org/licenses/>.
 """
 
+import collections
+import contextlib
+import copy
 import os
+import pathlib
 import re
 import subprocess
 import sys
+import threading
+import uuid
 
-from Bio.Seq import Seq
 from Bio.Data.CodonTable import TranslationError
-from .misc import load_fasta, reverse_complement
+from .assembly_store import get_assembly_seqs
+from .database import get_bundled_data
+from .misc import load_cached_fasta, load_cached_fasta_dict, reverse_complement, SEQUENCE_CACHE
+from .profiling import PROFILER
+from .translation import translate
 
 
 class Alignment(object):
@@ -31,27 +40,56 @@ class Alignment(object):
     percent_identity).
 
     If dictionaries of the query and reference sequences are also provided (key=name, value=seq),
-    then the Alignment object will also contain the
+    then the Alignment object will also contain the aligned parts of the query and reference
+    sequences (query_seq and ref_seq, the latter reverse complemented for hits on the negative
+    strand). These are only sliced out on first access, as many alignments are discarded without
+    their sequences ever being looked at.
     """
+    __slots__ = ('query_name', 'query_length', 'query_start', 'query_end', 'strand',
+                 'ref_name', 'ref_length', 'ref_start', 'ref_end',
+                 'matching_bases', 'num_bases', 'percent_identity', 'query_cov', 'ref_cov',
+                 'cigar', 'alignment_score',
+                 '_query_seq', '_ref_seq', '_query_source', '_ref_source')
 
     def __init__(self, paf_line, query_seqs=None, ref_seqs=None):
-        self.query_name, self.query_length = None, None
-        self.query_start, self.query_end = None, None
-        self.strand = None
-        self.ref_name, self.ref_length = None, None
-        self.ref_start, self.ref_end = None, None
-        self.matching_bases, self.num_bases = None, None
-        self.percent_identity = None
-        self.query_cov, self.ref_cov = None, None
-        self.cigar, self.alignment_score = None, None
-        self.query_seq, self.ref_seq = None, None
-
         self.parse_paf_line(paf_line)
         self.set_identity_and_coverages()
         self.set_sequences(query_seqs, ref_seqs)
 
+    @classmethod
+    def from_paf_parts(cls, line_parts, query_seqs=None, ref_seqs=None):
+        """
+        Creates an Alignment from a PAF line which has already been split into its columns.
+        """
+        a = cls.__new__(cls)
+        a.set_paf_parts(line_parts)
+        a.set_identity_and_coverages()
+        a.set_sequences(query_seqs, ref_seqs)
+        return a
+
+    @classmethod
+    def from_mappy_hit(cls, query_name, query_length, hit, query_seqs=None, ref_seqs=None):
+        """
+        Creates an Alignment directly from a mappy hit, i.e. without going through PAF text. mappy
+        doesn't report minimap2's alignment score, so it is recalculated from the CIGAR.
+        """
+        a = cls.__new__(cls)
+        a.query_name, a.query_length = query_name, query_length
+        a.query_start, a.query_end = hit.q_st, hit.q_en
+        a.strand = '+' if hit.strand > 0 else '-'
+        a.ref_name, a.ref_length = hit.ctg, hit.ctg_len
+        a.ref_start, a.ref_end = hit.r_st, hit.r_en
+        a.matching_bases, a.num_bases = hit.mlen, hit.blen
+        a.cigar = hit.cigar_str
+        a.alignment_score = get_alignment_score(hit.cigar)
+        a.set_identity_and_coverages()
+        a.set_sequences(query_seqs, ref_seqs)
+        return a
+
     def parse_paf_line(self, paf_line):
-        line_parts = paf_line.strip().split('\t')
+        self.set_paf_parts(paf_line.strip().split('\t'))
+
+    def set_paf_parts(self, line_parts):
         if len(line_parts) < 11:
             sys.exit('Error: alignment file does not seem to be in PAF format')
 
@@ -70,7 +108,7 @@ class Alignment(object):
         self.num_bases = int(line_parts[10])
 
         self.cigar, self.alignment_score = None, None
-        for part in line_parts:
+        for part in line_parts[11:]:
             if part.startswith('cg:Z:'):
                 self.cigar = part[5:]
             if part.startswith('AS:i:'):
@@ -82,12 +120,35 @@ class Alignment(object):
         self.ref_cov = 100.0 * (self.ref_end - self.ref_start) / self.ref_length
 
     def set_sequences(self, query_seqs, ref_seqs):
-        if query_seqs is not None:
-            self.query_seq = query_seqs[self.query_name][self.query_start:self.query_end]
-        if ref_seqs is not None:
-            self.ref_seq = ref_seqs[self.ref_name][self.ref_start:self.ref_end]
+        # Only the whole sequences are looked up here (callers sometimes rename the query, so it
+        # can't be done later by name). The slicing happens in the query_seq/ref_seq properties.
+        self._query_seq, self._ref_seq = None, None
+        self._query_source = None if query_seqs is None else query_seqs[self.query_name]
+        self._ref_source = None if ref_seqs is None else ref_seqs[self.ref_name]
+
+    @property
+    def query_seq(self):
+        if self._query_source is not None:
+            self._query_seq = self._query_source[self.query_start:self.query_end]
+            self._query_source = None
+        return self._query_seq
+
+    @query_seq.setter
+    def query_seq(self, seq):
+        self._query_seq, self._query_source = seq, None
+
+    @property
+    def ref_seq(self):
+        if self._ref_source is not None:
+            self._ref_seq = self._ref_source[self.ref_start:self.ref_end]
             if self.strand == '-':
-                self.ref_seq = reverse_complement(self.ref_seq)
+                self._ref_seq = reverse_complement(self._ref_seq)
+            self._ref_source = None
+        return self._ref_seq
+
+    @ref_seq.setter
+    def ref_seq(self, seq):
+        self._ref_seq, self._ref_source = seq, None
 
     def __repr__(self):
         return self.query_name + ':' + str(self.query_start) + '-' + str(self.query_end) + \
@@ -101,8 +162,7 @@ class Alignment(object):
         for b in ambiguous_bases:
             nucl_seq = nucl_seq.split(b)[0]  # truncate to first ambiguous base
         nucl_seq = nucl_seq[:len(nucl_seq) // 3 * 3]  # truncate to a multiple of 3
-        coding_dna = Seq(nucl_seq)
-        return str(coding_dna.translate(table='Bacterial', to_stop=True))
+        return translate(nucl_seq, to_stop=True)
 
     def is_exact(self):
         """
@@ -124,20 +184,275 @@ def align_query_to_ref(query_filename, ref_filename, ref_index=None, preset='map
                      Expressed as a percentage, so values should be 0-100.
      * min_query_coverage: if provided, alignments with a query coverage lower than this are
                            discarded. Expressed as a percentage, so values should be 0-100.
+
+     If an AlignmentBroker is active for the reference and it covers the query file, the
+     alignments come from the broker's single batched alignment run instead. Otherwise the
+     current alignment backend (see set_alignment_backend) aligns just this file.
      """
-     query_seqs = dict(load_fasta(query_filename))
-     ref_seqs = dict(load_fasta(ref_filename))
-     ref = ref_filename if ref_index is None else ref_index
-     with open(os.devnull, 'w') as dev_null:
-         out = subprocess.check_output(['minimap2','--end-bonus=10','--eqx', '-c', '-x', preset,
-                                        str(ref), str(query_filename)], stderr=dev_null)
-     alignments = [Alignment(x, query_seqs=query_seqs, ref_seqs=ref_seqs)
-                   for x in out.decode().splitlines()]
-     if min_identity is not None:
-         alignments = [a for a in alignments if a.percent_identity >= min_identity]
-     if min_query_coverage is not None:
-         alignments = [a for a in alignments if a.query_cov >= min_query_coverage]
-     return alignments
+     broker = _active_brokers.get(str(ref_filename))
+     if broker is None or not broker.covers(query_filename, preset):
+         return get_alignment_backend().align_files([query_filename], ref_filename, ref_index,
+                                                    preset, min_identity,
+                                                    min_query_coverage)[str(query_filename)]
+     alignments = broker.get_alignments(query_filename)
+     return [a for a in alignments if passes_filters(a.matching_bases, a.num_bases, a.query_start,
+                                                     a.query_end, a.query_length, min_identity,
+                                                     min_query_coverage)]
+
+
+def passes_filters(matching_bases, num_bases, query_start, query_end, query_length,
+                   min_identity=None, min_query_coverage=None):
+    """
+    Checks an alignment's identity and query coverage (calculated the same way as in Alignment)
+    against the thresholds, so hits can be filtered before any Alignment object is made.
+    """
+    if min_identity is not None and 100.0 * matching_bases / num_bases < min_identity:
+        return False
+    if min_query_coverage is not None and \
+            100.0 * (query_end - query_start) / query_length < min_query_coverage:
+        return False
+    return True
+
+
+def read_paf_alignments(paf_lines, query_seqs=None, ref_seqs=None, min_identity=None,
+                        min_query_coverage=None):
+    """
+    Generates Alignment objects from lines of PAF text. Lines which fail the identity or query
+    coverage thresholds are skipped using only their numeric columns, so no objects are made for
+    them.
+    """
+    for line in paf_lines:
+        line_parts = line.rstrip('\n').split('\t')
+        if len(line_parts) < 11:
+            sys.exit('Error: alignment file does not seem to be in PAF format')
+        if (min_identity is not None or min_query_coverage is not None) and \
+                not passes_filters(int(line_parts[9]), int(line_parts[10]), int(line_parts[2]),
+                                   int(line_parts[3]), int(line_parts[1]), min_identity,
+                                   min_query_coverage):
+            continue
+        yield Alignment.from_paf_parts(line_parts, query_seqs, ref_seqs)
+
+
+class Minimap2Backend(object):
+    """
+    The default alignment backend: runs minimap2 as a subprocess and parses its PAF output as it
+    is produced.
+    """
+    name = 'minimap2'
+
+    def build_index(self, assembly, ref_filename, temp_dir):
+        index = (pathlib.Path(temp_dir) / (uuid.uuid4().hex + '.mmi')).resolve()
+        command = ['minimap2', '-d', index, ref_filename]
+        with PROFILER.time_subprocess('minimap2'):
+            p = subprocess.run(command, capture_output=True, text=True)
+        if p.returncode != 0:
+            sys.exit(f'\nError: minimap2 failed to index sample {assembly}:\n{p.stderr}')
+        return index
+
+    def align_files(self, query_filenames, ref_filename, ref_index, preset, min_identity=None,
+                    min_query_coverage=None):
+        """
+        Aligns the query files to the reference and returns a dictionary of alignments (key =
+        query filename, value = list of Alignment objects). A single file is given to minimap2
+        directly. Multiple files are concatenated (with each sequence name prefixed by its file's
+        number, so names can't clash between files) and piped to a single minimap2 process. A
+        repeated query file is only aligned once. Alignments below min_identity or
+        min_query_coverage (percentages) are left out.
+        """
+        query_filenames = list(dict.fromkeys(str(q) for q in query_filenames))
+        ref_seqs = get_assembly_seqs(ref_filename)
+        query_seqs = {q: load_cached_fasta_dict(q) for q in query_filenames}
+        ref = ref_filename if ref_index is None else ref_index
+        command = ['minimap2', '--end-bonus=10', '--eqx', '-c', '-x', preset, str(ref)]
+        if len(query_filenames) == 1:
+            query_filename = query_filenames[0]
+            with self.run_minimap2(command + [query_filename]) as paf_lines:
+                return {query_filename: list(read_paf_alignments(paf_lines,
+                                                                 query_seqs[query_filename],
+                                                                 ref_seqs, min_identity,
+                                                                 min_query_coverage))}
+
+        combined_fasta = []
+        for i, query_filename in enumerate(query_filenames):
+            for name, seq in query_seqs[query_filename].items():
+                combined_fasta.append(f'>{i}:{name}\n{seq}\n')
+
+        # minimap2 outputs alignments in query order, so each file's alignments stay in the same
+        # order as they would be from a separate minimap2 run on that file.
+        alignments = {q: [] for q in query_filenames}
+        with self.run_minimap2(command + ['-'], ''.join(combined_fasta)) as paf_lines:
+            for line in paf_lines:
+                file_num, line = line.split(':', 1)
+                query_filename = query_filenames[int(file_num)]
+                alignments[query_filename].extend(
+                    read_paf_alignments([line], query_seqs[query_filename], ref_seqs,
+                                        min_identity, min_query_coverage))
+        return alignments
+
+    @staticmethod
+    @contextlib.contextmanager
+    def run_minimap2(command, stdin_text=None):
+        """
+        Runs minimap2 and yields its output lines as they are produced. Any stdin text is written
+        from a separate thread, so minimap2 can't block on a full output pipe while its input is
+        still being written. Raises CalledProcessError if minimap2 fails.
+        """
+        with PROFILER.time_subprocess('minimap2'):
+            with open(os.devnull, 'w') as dev_null:
+                p = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=dev_null,
+                                     stdin=None if stdin_text is None else subprocess.PIPE,
+                                     encoding='utf-8')
+            writer = None
+            if stdin_text is not None:
+                writer = threading.Thread(target=write_and_close, args=(p.stdin, stdin_text))
+                writer.start()
+            try:
+                yield p.stdout
+                p.stdout.read()  # drain any unread output so minimap2 can finish
+            finally:
+                p.stdout.close()
+                if writer is not None:
+                    writer.join()
+                p.wait()
+        if p.returncode != 0:
+            raise subprocess.CalledProcessError(p.returncode, command)
+
+
+def write_and_close(f, text):
+    try:
+        f.write(text)
+    except BrokenPipeError:  # the process exited early, which run_minimap2 reports
+        pass
+    finally:
+        try:
+            f.close()
+        except BrokenPipeError:
+            pass
+
+
+class MappyBackend(object):
+    """
+    An in-process alignment backend using mappy (minimap2's Python binding). The assembly's index
+    is a mappy.Aligner built once per assembly, and Alignment objects are made directly from the
+    hits, so there are no minimap2 processes, no temporary index file and no PAF text to parse.
+
+    mappy doesn't expose minimap2's --end-bonus option or its alignment score (the score is
+    recalculated from the CIGAR), so results can differ slightly from the minimap2 backend for
+    hits near the ends of query sequences.
+    """
+    name = 'mappy'
+    EQX_FLAG = 0x4000000  # MM_F_EQX in minimap.h: use =/X instead of M in the CIGAR
+
+    def __init__(self):
+        try:
+            import mappy
+        except ImportError:
+            sys.exit('Error: the mappy alignment backend requires the mappy Python package')
+        self.mappy = mappy
+
+    def build_index(self, assembly, ref_filename, temp_dir, preset='map-ont'):
+        aligner = self.mappy.Aligner(str(ref_filename), preset=preset, extra_flags=self.EQX_FLAG)
+        if not aligner:
+            sys.exit(f'\nError: mappy failed to index sample {assembly}')
+        return aligner
+
+    def align_files(self, query_filenames, ref_filename, ref_index, preset, min_identity=None,
+                    min_query_coverage=None):
+        """
+        Takes and returns the same things as Minimap2Backend.align_files.
+        """
+        if isinstance(ref_index, self.mappy.Aligner) and preset == 'map-ont':
+            aligner = ref_index
+        else:
+            aligner = self.build_index(ref_filename, ref_filename, None, preset=preset)
+        ref_seqs = get_assembly_seqs(ref_filename)
+        alignments = {}
+        for query_filename in dict.fromkeys(str(q) for q in query_filenames):
+            query_seqs = load_cached_fasta_dict(query_filename)
+            alignments[query_filename] = \
+                [Alignment.from_mappy_hit(name, len(seq), hit, query_seqs, ref_seqs)
+                 for name, seq in query_seqs.items() for hit in aligner.map(seq)
+                 if passes_filters(hit.mlen, hit.blen, hit.q_st, hit.q_en, len(seq),
+                                   min_identity, min_query_coverage)]
+        return alignments
+
+
+ALIGNMENT_BACKENDS = {'minimap2': Minimap2Backend, 'mappy': MappyBackend}
+_backend = Minimap2Backend()
+
+
+def set_alignment_backend(name):
+    global _backend
+    if _backend.name != name:
+        _backend = ALIGNMENT_BACKENDS[name]()
+
+
+def get_alignment_backend():
+    return _backend
+
+
+def get_alignment_score(cigar, match=2, mismatch=4, gap_open=(4, 24), gap_extend=(2, 1)):
+    """
+    Calculates an alignment score from a mappy CIGAR (list of [length, operation] pairs) using
+    minimap2's default (map-ont) scoring, including its two-piece affine gap cost.
+    """
+    score = 0
+    for length, op in cigar:
+        if op == 7 or op == 0:  # = or M
+            score += match * length
+        elif op == 8:  # X
+            score -= mismatch * length
+        elif op == 1 or op == 2:  # I or D
+            score -= min(gap_open[0] + gap_extend[0] * length,
+                         gap_open[1] + gap_extend[1] * length)
+    return score
+
+
+# Brokers which are currently active, key = reference (assembly) filename, value = AlignmentBroker
+_active_brokers = {}
+
+
+class AlignmentBroker(object):
+    """
+    Aligns many query files to one reference in a single batch. Most modules align a handful of
+    small allele files to the assembly, one minimap2 process per file, and each of those processes
+    has to load the assembly's index. The broker instead gives all of the query files to the
+    alignment backend at once and then hands each caller only the alignments for its own file.
+
+    Used as a context manager, so while it is active, align_query_to_ref will transparently use it
+    for any of its query files. The alignment happens lazily on the first request, and only once
+    even when modules request alignments from several threads at the same time.
+    """
+
+    def __init__(self, ref_filename, ref_index, query_filenames, preset='map-ont'):
+        self.ref_filename = ref_filename  # not made a str, as it may be an AssemblyFile
+        self.ref_index = ref_index
+        self.query_filenames = [str(q) for q in query_filenames]
+        self.preset = preset
+        self.alignments = None  # key = query filename, value = list of Alignment objects
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        _active_brokers[str(self.ref_filename)] = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _active_brokers.pop(str(self.ref_filename), None)
+
+    def covers(self, query_filename, preset):
+        return preset == self.preset and str(query_filename) in self.query_filenames
+
+    def get_alignments(self, query_filename):
+        with self.lock:
+            if self.alignments is None:
+                with PROFILER.time_stage(None, '-', 'align'):
+                    self.alignments = get_alignment_backend().align_files(
+                        self.query_filenames, self.ref_filename, self.ref_index, self.preset)
+
+        # Callers sometimes modify their alignments (e.g. renaming the query), so each caller gets
+        # its own copies.
+        return [copy.copy(a) for a in self.alignments[str(query_filename)]]
+
 
 def get_expanded_cigar(cigar):
     """
@@ -230,7 +545,7 @@ def check_for_exact_aa_match(ref_file, hit, contigs):
     
     # First, we extract the nucleotide sequence from the assembly.
     hit_seq = hit.ref_seq
-    assembly_seqs = dict(load_fasta(contigs))
+    assembly_seqs = get_assembly_seqs(contigs)
     contig_start, contig_end = hit.ref_start, hit.ref_end  # 0-based indexing
     contig_length = len(assembly_seqs[hit.ref_name])
     gene_nucl_seq = assembly_seqs[hit.ref_name][contig_start:contig_end]
@@ -244,8 +559,7 @@ def check_for_exact_aa_match(ref_file, hit, contigs):
     # missing start or end bases (relative to the reference), then we add those back on and will
     # include this augmented sequence in the exact amino acid check.
     
-    ref_seqs = load_fasta(ref_file)
-    ref_length = len(dict(ref_seqs)[hit.query_name])
+    ref_length = len(load_cached_fasta_dict(ref_file)[hit.query_name])
     ref_start, ref_end = sorted([hit.query_start, hit.query_end])
     missing_start = ref_start
     missing_end = ref_length - ref_end
@@ -269,24 +583,75 @@ def check_for_exact_aa_match(ref_file, hit, contigs):
             augmented_gene_nucl_seq = reverse_complement(augmented_gene_nucl_seq)
             
     # Look for an amino acid match between the assembly sequence and any reference sequence.
-    best_match_length = 0
-    best_matches = []
-    for name, ref_nucl_seq in ref_seqs:
-        match = is_exact_aa_match(gene_nucl_seq, ref_nucl_seq)
-        if augmented_gene_nucl_seq is not None and \
-                is_exact_aa_match(augmented_gene_nucl_seq, ref_nucl_seq):
-            match = True
-        if match:
-            if len(ref_nucl_seq) > best_match_length:
-                best_matches = [name]
-                best_match_length = len(ref_nucl_seq)
-            elif len(ref_nucl_seq) == best_match_length:
-                best_matches.append(name)
-    if not best_matches:
+    gene_prots = get_frame_translations(gene_nucl_seq)
+    if augmented_gene_nucl_seq is not None:
+        gene_prots += get_frame_translations(augmented_gene_nucl_seq)
+    matches = get_protein_index(ref_file).find_contained(gene_prots)
+    if not matches:
         return None
-    else:
-        return sorted(best_matches)[0]
+    best_match_length = max(nucl_length for _, nucl_length in matches)
+    return sorted(name for name, nucl_length in matches if nucl_length == best_match_length)[0]
+
+
+def get_frame_translations(gene_nucl_seq):
+    # The gene nucleotide sequence translated in all three frames of the forward strand.
+    return [translate_nucl_to_prot(gene_nucl_seq[i:]) for i in range(3)]
+
+
+class ProteinIndex(object):
+    """
+    An index of the translated sequences of a reference FASTA file, for finding the references
+    whose protein is contained in a query protein (the exact amino acid match used by
+    check_for_exact_aa_match). Reference proteins are indexed by their first few amino acids, so
+    a query only needs one dictionary lookup per position instead of a substring search for
+    every reference.
+    """
+    PREFIX_LENGTH = 8
+
+    def __init__(self, translations):
+        self.translations = translations  # list of (name, protein, nucleotide length)
+        self.by_prefix = collections.defaultdict(list)
+        self.short = []  # references too short to index
+        for i, (_, prot, _) in enumerate(translations):
+            if len(prot) >= self.PREFIX_LENGTH:
+                self.by_prefix[prot[:self.PREFIX_LENGTH]].append(i)
+            else:
+                self.short.append(i)
+
+    def find_contained(self, query_prots):
+        """
+        Returns a set of (name, nucleotide length) tuples for the references whose protein is
+        contained in any of the query proteins.
+        """
+        found = set()
+        for query in query_prots:
+            for pos in range(len(query) - self.PREFIX_LENGTH + 1):
+                for i in self.by_prefix.get(query[pos:pos + self.PREFIX_LENGTH], ()):
+                    if query.startswith(self.translations[i][1], pos):
+                        found.add(i)
+            found.update(i for i in self.short if self.translations[i][1] in query)
+        return {(self.translations[i][0], self.translations[i][2]) for i in found}
+
+
+_protein_indices = {}  # key = (path, mtime, size), value = ProteinIndex
+
+
+def get_protein_index(ref_file):
+    """
+    Returns the ProteinIndex for a reference FASTA file, built once per run (from the database
+    bundle's translations, if there is one).
+    """
+    key = SEQUENCE_CACHE.get_key(ref_file)
+    if key not in _protein_indices:
+        translations = get_bundled_data(ref_file, 'translations')
+        if translations is None:
+            translations = translate_reference_seqs(load_cached_fasta(ref_file))
+        _protein_indices[key] = ProteinIndex(translations)
+    return _protein_indices[key]
+
 
+def translate_reference_seqs(seqs):
+    return [(name, translate_nucl_to_prot(seq), len(seq)) for name, seq in seqs]
 
 
 def is_exact_aa_match(gene_nucl_seq_1, ref_nucl_seq):
@@ -309,14 +674,14 @@ def translate_nucl_to_prot(nucl_seq):
     # codons (e.g. GTG -> M) if it works. We have to manually add the stop codon (*) here because
     # using cds=True turns that off.
     try:
-        return str(Seq(nucl_seq).translate(table='Bacterial', to_stop=False, cds=True)) + '*'
+        return translate(nucl_seq, cds=True) + '*'
     except TranslationError:
         pass
 
     # If that failed, we will translate in a more relaxed way using a nucleotide sequence truncated
     # to a multiple-of-three length.
     truncated_nucl_seq = nucl_seq[:len(nucl_seq) // 3 * 3]
-    return str(Seq(truncated_nucl_seq).translate(table='Bacterial', to_stop=False, cds=False))
+    return translate(truncated_nucl_seq)
 
 def get_bases_per_ref_pos(alignment):
     aligned_seq1, aligned_seq2 = alignment[0], alignment[1]
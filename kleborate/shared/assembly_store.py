@@ -0,0 +1,277 @@
+"""
+This file contains Kleborate's AssemblyStore: an assembly's contigs packed at 2 bits per base into
+a memory-mapped file, with the ambiguous (non-ACGT) bases kept separately as runs. The store is
+packed while streaming through the assembly file, so the assembly is never held in memory as
+Python strings. Modules are given the assembly as an AssemblyFile, which is its filename but also
+carries its store, and the functions which need the assembly's sequences (alignment, exact amino
+acid checks, contig stats, Kaptive) get them from there. The store is only packed when sequences
+are first needed, and only the regions which are actually used (e.g. the hit regions of
+alignments) are decoded.
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections.abc
+import mmap
+import pathlib
+import threading
+import uuid
+
+import numpy as np
+
+from .misc import iterate_fasta, load_cached_fasta_dict, reverse_complement
+
+
+# Base codes for packing (any other character is ambiguous) and the four bases of each packed
+# byte (the first base in the two highest bits).
+BASE_CODES = np.full(256, 255, dtype=np.uint8)
+for code, base in enumerate(b'ACGT'):
+    BASE_CODES[base] = code
+UNPACK_TABLE = np.array([[b'ACGT'[(byte >> shift) & 3] for shift in (6, 4, 2, 0)]
+                         for byte in range(256)], dtype=np.uint8)
+
+PACK_CHUNK_SIZE = 1000000  # bases of sequence packed at a time (a multiple of 4)
+
+
+class AssemblyStore(collections.abc.Mapping):
+    """
+    A read-only {contig name: ContigSequence} mapping, built from a FASTA file (read with the same
+    rules as load_fasta). Sequences must be ASCII (non-ASCII characters come back as '?').
+
+    Used as a context manager, so the packed file is closed at the end.
+    """
+
+    def __init__(self, assembly, store_dir):
+        self.path = pathlib.Path(store_dir) / (uuid.uuid4().hex + '.packed')
+        self.names, self.lengths, self.offsets, self.ambiguous_runs = [], [], [], []
+        offset = 0
+        with open(self.path, 'wb') as f:
+            packer = ContigPacker(f)
+            for kind, value in iterate_fasta(assembly):
+                if kind == 'seq':
+                    packer.add(value)
+                else:
+                    length, byte_count, runs = packer.finish()
+                    self.names.append(value)
+                    self.lengths.append(length)
+                    self.offsets.append(offset)
+                    self.ambiguous_runs.append(runs)
+                    offset += byte_count
+        self.indices = {name: i for i, name in enumerate(self.names)}
+        self.mmap = None
+        if offset > 0:
+            with open(self.path, 'rb') as f:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.mmap is not None:
+            try:
+                self.mmap.close()
+            except BufferError:  # a decoded region is still being used, so leave it to the GC
+                pass
+            self.mmap = None
+
+    def __getitem__(self, name):
+        return ContigSequence(self, self.indices[name])
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def ambiguous_base_count(self):
+        return sum(int((ends - starts).sum()) for starts, ends, _ in self.ambiguous_runs)
+
+    def decode(self, i, start, end):
+        """
+        Returns bases start to end (0-based, end exclusive) of the ith contig as a string.
+        """
+        if end <= start:
+            return ''
+        first_byte, last_byte = start // 4, (end + 3) // 4
+        packed = np.frombuffer(self.mmap, dtype=np.uint8, count=last_byte - first_byte,
+                               offset=self.offsets[i] + first_byte)
+        bases = UNPACK_TABLE[packed].reshape(-1)[start - first_byte * 4:end - first_byte * 4]
+        del packed  # release the mmap's buffer
+        starts, ends, chars = self.ambiguous_runs[i]
+        for j in range(np.searchsorted(ends, start, side='right'),
+                       np.searchsorted(starts, end, side='left')):
+            bases[max(starts[j], start) - start:min(ends[j], end) - start] = chars[j]
+        return bases.tobytes().decode('ascii')
+
+
+class ContigSequence(object):
+    """
+    One contig of an AssemblyStore. It acts like the contig's sequence string for len() and
+    slicing (which returns a string), so it can be used wherever a sequence is only sliced.
+    """
+    __slots__ = ('store', 'index')
+
+    def __init__(self, store, index):
+        self.store, self.index = store, index
+
+    def __len__(self):
+        return self.store.lengths[self.index]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self.store.decode(self.index, start, stop)
+            return ''.join(self[i] for i in range(start, stop, step))
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError('contig index out of range')
+        return self.store.decode(self.index, key, key + 1)
+
+    def __str__(self):
+        return self.store.decode(self.index, 0, len(self))
+
+    def get_region(self, start, end, strand='+'):
+        """
+        Returns a region of the contig (0-based, end exclusive), reverse complemented for the
+        negative strand.
+        """
+        seq = self.store.decode(self.index, start, end)
+        return reverse_complement(seq) if strand == '-' else seq
+
+
+class ContigPacker(object):
+    """
+    Packs one contig at a time into the store's file, from lines of sequence. Lines are packed in
+    chunks of PACK_CHUNK_SIZE bases, so only one chunk of a contig is in memory at a time.
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.start()
+
+    def start(self):
+        self.lines, self.line_bases = [], 0
+        self.length, self.byte_count, self.runs = 0, 0, []
+
+    def add(self, line):
+        self.lines.append(line)
+        self.line_bases += len(line)
+        if self.line_bases >= PACK_CHUNK_SIZE:
+            seq = ''.join(self.lines)
+            chunk_size = len(seq) - len(seq) % 4
+            self.pack(seq[:chunk_size])
+            self.lines = [seq[chunk_size:]]
+            self.line_bases = len(self.lines[0])
+
+    def pack(self, seq):
+        packed, (starts, ends, chars) = pack_sequence(seq)
+        self.f.write(packed)
+        self.runs.append((starts + self.length, ends + self.length, chars))
+        self.length += len(seq)
+        self.byte_count += len(packed)
+
+    def finish(self):
+        """
+        Packs the rest of the contig and returns its length, its number of packed bytes and its
+        ambiguous base runs. The packer is then ready for the next contig.
+        """
+        self.pack(''.join(self.lines))
+        starts, ends, chars = (np.concatenate(r) for r in zip(*self.runs))
+        if len(starts) > 1:  # join runs which were split between chunks
+            joined = (ends[:-1] == starts[1:]) & (chars[:-1] == chars[1:])
+            starts, chars = starts[np.concatenate(([True], ~joined))], \
+                chars[np.concatenate(([True], ~joined))]
+            ends = ends[np.concatenate((~joined, [True]))]
+        contig = self.length, self.byte_count, (starts, ends, chars)
+        self.start()
+        return contig
+
+
+def pack_sequence(seq):
+    """
+    Returns a sequence packed at 2 bits per base (ambiguous bases are packed as A) and its
+    ambiguous bases as runs of the same character: (run starts, run ends, run characters) arrays.
+    """
+    codes = np.frombuffer(seq.encode('ascii', 'replace'), dtype=np.uint8)
+    base_codes = BASE_CODES[codes]
+    ambiguous = np.flatnonzero(base_codes == 255)
+    if len(ambiguous):
+        breaks = np.flatnonzero((np.diff(ambiguous) != 1) |
+                                (codes[ambiguous[1:]] != codes[ambiguous[:-1]])) + 1
+        run_starts = ambiguous[np.concatenate(([0], breaks))]
+        run_ends = ambiguous[np.concatenate((breaks - 1, [len(ambiguous) - 1]))] + 1
+        runs = (run_starts, run_ends, codes[run_starts])
+        base_codes[ambiguous] = 0
+    else:
+        runs = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                np.zeros(0, dtype=np.uint8))
+    base_codes = np.concatenate((base_codes, np.zeros(-len(seq) % 4, dtype=np.uint8)))
+    quads = base_codes.reshape(-1, 4)
+    packed = (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]
+    return packed.astype(np.uint8).tobytes(), runs
+
+
+class AssemblyFile(str):
+    """
+    An assembly's filename, which also gives the assembly's AssemblyStore. It is a str, so it can
+    be used (and passed on to modules) wherever the filename can be. The store is packed the first
+    time it's asked for, so assemblies whose sequences are never read (e.g. when only the species
+    module runs) aren't packed at all.
+
+    Used as a context manager, so the store (if it was packed) is closed at the end.
+    """
+
+    def __new__(cls, filename, store_dir):
+        assembly_file = super().__new__(cls, filename)
+        assembly_file.store_dir = store_dir
+        assembly_file.store = None
+        assembly_file.lock = threading.Lock()
+        return assembly_file
+
+    def __reduce__(self):  # pickled (e.g. to another process) as just the filename
+        return str, (str(self),)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.store is not None:
+            self.store.close()
+
+    def get_store(self):
+        with self.lock:  # modules may ask for the store from several threads at once
+            if self.store is None:
+                self.store = AssemblyStore(self, self.store_dir)
+        return self.store
+
+
+def get_assembly_store(assembly):
+    """
+    Returns the AssemblyStore of an AssemblyFile (packing it if it isn't already), or None for a
+    plain filename.
+    """
+    return assembly.get_store() if isinstance(assembly, AssemblyFile) else None
+
+
+def get_assembly_seqs(assembly):
+    """
+    Returns a {contig name: sequence} mapping for the assembly: its AssemblyStore for an
+    AssemblyFile, otherwise the (cached) parsed file. Either way, the sequences support len() and
+    slicing.
+    """
+    store = get_assembly_store(assembly)
+    return store if store is not None else load_cached_fasta_dict(assembly)
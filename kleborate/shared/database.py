@@ -0,0 +1,213 @@
+"""
+This file contains code for precompiling the files in a module's data directory into a binary
+bundle (built with kleborate --build-db), so they don't need to be parsed from text on every run.
+
+Bundles are pickles, and loading a pickle can run code, so bundles are only loaded from module data
+directories (inside Kleborate's modules directory, which holds Kleborate's code anyway) or from
+directories whose bundle was built in this run. A bundle next to any other file read by Kleborate
+(e.g. in an assembly directory) is ignored.
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import pathlib
+import pickle
+import sys
+import threading
+
+import numpy as np
+
+from .misc import load_fasta
+
+
+BUNDLE_FILENAME = 'kleborate_db.pkl'
+BUNDLE_VERSION = 3
+
+CLASS_FILENAME = 'CARD_AMR_clustered.csv'
+TRANSLATED_FASTA_PATTERN = 'CARD_*.fasta'  # references used for exact amino acid matching
+
+MODULES_DIR = pathlib.Path(__file__).resolve().parents[1] / 'modules'
+
+_loaded_bundles = {}  # key = bundle path, value = bundle's entries (or None if unusable)
+_built_bundle_dirs = set()  # directories whose bundles were built in this run
+_bundle_lock = threading.Lock()
+
+
+def build_bundle(data_dir):
+    """
+    Compiles the files in a data directory into a bundle in that same directory and returns the
+    number of files compiled (no bundle is written if there are none):
+    * FASTA files are stored as a packed store: names, one concatenated sequence and offsets.
+    * Tab-delimited profile tables (first column 'ST') are stored with integer columns as arrays.
+    * The CARD class file is stored as a snapshot of read_class_file's output.
+    * The CARD reference sequences are also stored translated, for exact amino acid matching.
+    Each entry records the size and modification time of its source file, and an entry is only
+    used when these still match.
+    """
+    data_dir = pathlib.Path(data_dir)
+    entries = {}
+    for path in sorted(data_dir.iterdir()):
+        for kind, data in compile_file(path):
+            entries[(path.name, kind)] = (source_signature(path), data)
+    if not entries:
+        return 0
+    bundle_path = data_dir / BUNDLE_FILENAME
+    try:
+        with open(bundle_path, 'wb') as f:
+            pickle.dump({'version': BUNDLE_VERSION, 'entries': entries}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError as e:
+        sys.exit(f'Error: could not write {bundle_path}: {e}')
+    with _bundle_lock:
+        _loaded_bundles.pop(str(bundle_path.resolve()), None)
+        _built_bundle_dirs.add(data_dir.resolve())
+    return len({filename for filename, _ in entries})
+
+
+def compile_file(path):
+    """
+    Returns a list of (kind, data) tuples for a file, which is empty if the file can't be bundled.
+    """
+    if path.name.endswith('.fasta'):
+        seqs = load_fasta(path)
+        compiled = [('fasta', pack_fasta(seqs))]
+        if path.match(TRANSLATED_FASTA_PATTERN):
+            from .alignment import translate_reference_seqs
+            compiled.append(('translations', translate_reference_seqs(seqs)))
+        return compiled
+    if path.name == CLASS_FILENAME:
+        from .resMinimap import parse_class_file
+        return [('class_file', parse_class_file(path))]
+    if path.suffix in ('.tsv', '.txt'):
+        table = parse_profile_table(path)
+        if table is not None:
+            return [('profiles', table)]
+    return []
+
+
+def pack_fasta(seqs):
+    names = [name for name, _ in seqs]
+    offsets = np.zeros(len(seqs) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(seq) for _, seq in seqs])
+    return names, ''.join(seq for _, seq in seqs), offsets
+
+
+def unpack_fasta(packed):
+    names, sequence, offsets = packed
+    offsets = offsets.tolist()
+    return [(name, sequence[offsets[i]:offsets[i+1]]) for i, name in enumerate(names)]
+
+
+def parse_profile_table(path):
+    """
+    Reads a tab-delimited ST profile table (header starting with 'ST') into a header list and a
+    list of columns. Columns which only contain integers (written plainly, so str gives back the
+    same text) are stored as NumPy arrays, other columns as lists of strings. Returns None if the
+    file isn't a profile table.
+    """
+    with open(path, 'rt') as f:
+        header = f.readline().rstrip('\n').split('\t')
+        if header[0] != 'ST':
+            return None
+        rows = [line.rstrip('\n').split('\t') for line in f if line.strip()]
+    if any(len(row) != len(header) for row in rows):
+        return None
+    columns = []
+    for i in range(len(header)):
+        values = [row[i] for row in rows]
+        try:
+            integers = [int(v) for v in values]
+        except ValueError:
+            integers = None
+        if integers is not None and all(str(i) == v for i, v in zip(integers, values)):
+            columns.append(np.array(integers, dtype=np.int64))
+        else:
+            columns.append(values)
+    return header, columns
+
+
+def source_signature(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def load_bundle(data_dir):
+    """
+    Returns the entries of the bundle in the given directory (loaded on first use), or None if
+    there is no usable bundle or the directory isn't one bundles are loaded from.
+    """
+    if not is_bundle_dir(data_dir):
+        return None
+    bundle_path = pathlib.Path(data_dir) / BUNDLE_FILENAME
+    if not bundle_path.is_file():
+        return None
+    key = str(bundle_path.resolve())
+    with _bundle_lock:
+        if key not in _loaded_bundles:
+            entries = None
+            try:
+                with open(bundle_path, 'rb') as f:
+                    bundle = pickle.load(f)
+                if bundle.get('version') == BUNDLE_VERSION:
+                    entries = bundle['entries']
+            except (OSError, EOFError, pickle.UnpicklingError):
+                pass
+            _loaded_bundles[key] = entries
+        return _loaded_bundles[key]
+
+
+def is_bundle_dir(directory):
+    """
+    Returns whether bundles can be loaded from the directory: one inside the modules directory or
+    one whose bundle was built in this run.
+    """
+    directory = pathlib.Path(directory).resolve()
+    with _bundle_lock:
+        if directory in _built_bundle_dirs:
+            return True
+    return directory == MODULES_DIR or MODULES_DIR in directory.parents
+
+
+def get_bundled_data(filename, kind):
+    """
+    Returns the compiled data for the given file if it is in a bundle (and the file hasn't changed
+    since the bundle was built), otherwise None.
+    """
+    path = pathlib.Path(filename)
+    entries = load_bundle(path.parent)
+    if entries is None or (path.name, kind) not in entries:
+        return None
+    signature, data = entries[(path.name, kind)]
+    try:
+        if source_signature(path) != signature:
+            return None
+    except OSError:
+        return None
+    return data
+
+
+def get_bundled_fasta(filename):
+    """
+    Returns the (name, seq) tuples for a bundled FASTA file, or None if it isn't bundled.
+    """
+    packed = get_bundled_data(filename, 'fasta')
+    if packed is None:
+        return None
+    return unpack_fasta(packed)
+
+
+def get_bundled_profiles(filename):
+    """
+    Returns the header and columns for a bundled profile table, or None if it isn't bundled.
+    """
+    return get_bundled_data(filename, 'profiles')
@@ -12,8 +12,13 @@ details. You should have received a copy of the GNU General Public License along
 not, see <https://www.gnu.org/licenses/>.
 """
 
+import collections
+import functools
 import gzip
+import os
+import shutil
 import sys
+import threading
 
 
 def load_fasta(filename):
@@ -40,11 +45,140 @@ def load_fasta(filename):
     return fasta_seqs
 
 
+def iterate_fasta(filename):
+    """
+    Reads a FASTA file line by line, following the same rules as load_fasta but without holding
+    any sequence in memory. Yields ('seq', line) for each (uppercased) line of sequence and
+    ('end', name) when a contig ends, so a contig's sequence is all of the lines yielded since the
+    previous contig ended.
+    """
+    with get_open_func(filename)(filename, 'rt') as fasta_file:
+        name = ''
+        for line in fasta_file:
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] == '>':  # Header line = start of new contig
+                if name:
+                    yield 'end', name.split()[0]
+                name = line[1:]
+            else:
+                yield 'seq', line.upper()
+        if name:
+            yield 'end', name.split()[0]
+
+
+class SequenceCache(object):
+    """
+    A process-wide store of parsed FASTA files, so each file only needs to be parsed once even
+    though many functions (assembly checks, alignments, exact amino acid checks, contig stats) want
+    its sequences. Files are keyed by their path, modification time and size, so a file which
+    changes on disk gets parsed again. When the cached files contain more than max_bases bases in
+    total, the least recently used files are evicted.
+
+    The cached sequences are shared between callers, so they must not be modified.
+    """
+
+    def __init__(self, max_bases=50000000):
+        self.max_bases = max_bases
+        self.total_bases = 0
+        self.entries = collections.OrderedDict()  # key = file key, value = (seqs, seq dict, bases)
+        self.lock = threading.Lock()
+
+    def get(self, filename):
+        """
+        Returns the parsed file as a tuple of (name, seq) tuples and as a {name: seq} dictionary.
+        """
+        key = self.get_key(filename)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                seqs, seq_dict, _ = self.entries[key]
+                return seqs, seq_dict
+        return self.store(key, load_bundled_or_text_fasta(filename))
+
+    def add(self, filename, seqs):
+        """
+        Stores already-loaded sequences for a file, e.g. for a decompressed copy of a file whose
+        sequences were loaded from the compressed original.
+        """
+        self.store(self.get_key(filename), seqs)
+
+    @staticmethod
+    def get_key(filename):
+        stat = os.stat(filename)
+        return os.path.abspath(filename), stat.st_mtime_ns, stat.st_size
+
+    def store(self, key, seqs):
+        seqs = tuple(seqs)
+        seq_dict = dict(seqs)
+        bases = sum(len(seq) for _, seq in seqs)
+        if bases <= self.max_bases:
+            with self.lock:
+                if key not in self.entries:
+                    self.entries[key] = (seqs, seq_dict, bases)
+                    self.total_bases += bases
+                while self.total_bases > self.max_bases:
+                    _, (_, _, evicted_bases) = self.entries.popitem(last=False)
+                    self.total_bases -= evicted_bases
+        return seqs, seq_dict
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bases = 0
+
+
+SEQUENCE_CACHE = SequenceCache()
+
+
+def load_bundled_or_text_fasta(filename):
+    """
+    Loads a FASTA file from its data directory's database bundle (kleborate --build-db) if it has
+    one, otherwise parses the file.
+    """
+    from .database import get_bundled_fasta  # imported here because database.py imports this file
+    seqs = get_bundled_fasta(filename)
+    return seqs if seqs is not None else load_fasta(filename)
+
+
+def load_cached_fasta(filename):
+    """
+    Like load_fasta, but using the process-wide sequence cache. Returns a tuple of (name, seq)
+    tuples.
+    """
+    return SEQUENCE_CACHE.get(filename)[0]
+
+
+def load_cached_fasta_dict(filename):
+    """
+    Like load_cached_fasta, but returns a {name: seq} dictionary. The dictionary is shared by all
+    callers, so it must not be modified.
+    """
+    return SEQUENCE_CACHE.get(filename)[1]
+
+
+_compression_types = {}  # key = (path, mtime, size), value = compression type
+
+
 def get_compression_type(filename):
     """
-    Attempts to guess the compression (if any) on a file using the first few bytes.
+    Attempts to guess the compression (if any) on a file using the first few bytes. The result is
+    remembered for each file (keyed like the sequence cache), so a file is only sniffed once.
     http://stackoverflow.com/questions/13044562
     """
+    key = SequenceCache.get_key(filename)
+    if key not in _compression_types:
+        _compression_types[key] = sniff_compression_type(filename)
+    compression_type = _compression_types[key]
+    if compression_type == 'bz2':
+        sys.exit('Error: cannot use bzip2 format - use gzip instead')
+    if compression_type == 'zip':
+        sys.exit('Error: cannot use zip format - use gzip instead')
+    return compression_type
+
+
+def sniff_compression_type(filename):
     magic_dict = {'gz': (b'\x1f', b'\x8b', b'\x08'),
                   'bz2': (b'\x42', b'\x5a', b'\x68'),
                   'zip': (b'\x50', b'\x4b', b'\x03', b'\x04')}
@@ -56,10 +190,6 @@ def get_compression_type(filename):
     for file_type, magic_bytes in magic_dict.items():
         if file_start.startswith(magic_bytes):
             compression_type = file_type
-    if compression_type == 'bz2':
-        sys.exit('Error: cannot use bzip2 format - use gzip instead')
-    if compression_type == 'zip':
-        sys.exit('Error: cannot use zip format - use gzip instead')
     return compression_type
 
 
@@ -70,6 +200,33 @@ def get_open_func(filename):
         return open
 
 
+@functools.lru_cache(maxsize=None)
+def get_fast_gzip_open_func():
+    """
+    Returns the fastest available function for opening gzipped files: python-isal's or zlib-ng's
+    (both optional) if one is installed, otherwise the standard library's gzip.open.
+    """
+    try:
+        from isal import igzip
+        return igzip.open
+    except ImportError:
+        pass
+    try:
+        from zlib_ng import gzip_ng
+        return gzip_ng.open
+    except ImportError:
+        pass
+    return gzip.open
+
+
+def decompress_file(in_file, out_file, chunk_size=1048576):
+    """
+    Decompresses a gzipped file in chunks, so memory use doesn't depend on the file's size.
+    """
+    with get_fast_gzip_open_func()(in_file, 'rb') as i, open(out_file, 'wb') as o:
+        shutil.copyfileobj(i, o, chunk_size)
+
+
 REV_COMP_DICT = {'A': 'T', 'T': 'A', 'G': 'C', 'C': 'G', 'a': 't', 't': 'a', 'g': 'c', 'c': 'g',
                  'R': 'Y', 'Y': 'R', 'S': 'S', 'W': 'W', 'K': 'M', 'M': 'K', 'B': 'V', 'V': 'B',
                  'D': 'H', 'H': 'D', 'N': 'N', 'r': 'y', 'y': 'r', 's': 's', 'w': 'w', 'k': 'm',
@@ -84,5 +241,11 @@ def complement_base(base):
         return 'N'
 
 
+# A str.translate table for every ASCII character, so characters not in REV_COMP_DICT also become N.
+REV_COMP_TABLE = str.maketrans({chr(i): REV_COMP_DICT.get(chr(i), 'N') for i in range(128)})
+
+
 def reverse_complement(seq):
-    return ''.join([complement_base(x) for x in seq][::-1])
\ No newline at end of file
+    if not seq.isascii():  # the table only covers ASCII, so use the slow path for anything else
+        return ''.join([complement_base(x) for x in seq][::-1])
+    return seq.translate(REV_COMP_TABLE)[::-1]
@@ -15,9 +15,16 @@ details. You should have received a copy of the GNU General Public License along
 not, see <https://www.gnu.org/licenses/>.
 """
 
+import os
 import re
 
+import numpy as np
+
 from .alignment import align_query_to_ref, truncation_check
+from .database import get_bundled_profiles
+
+
+_loaded_profiles = {}  # key = (path, mtime, size, gene names, extra info name), value = ProfileList
 
 
 def mlst(assembly_path, minimap2_index, profiles_path, allele_paths, gene_names, extra_info,
@@ -107,7 +114,29 @@ def load_st_profiles(database_path, gene_names, extra_info_name):
 
     This function returns a list of ST profiles, where each value is a tuple:
     (ST number, list of allele numbers, extra info)
+
+    If the file has been compiled into a database bundle (kleborate --build-db), the profiles are
+    loaded from the bundle instead.
+
+    Loaded profiles are cached (keyed by the file's path, modification time and size), so each
+    scheme is only loaded once per run and its ProfileIndex can be reused for every assembly. The
+    returned list is shared, so it must not be modified.
     """
+    stat = os.stat(database_path)
+    key = (os.path.abspath(database_path), stat.st_mtime_ns, stat.st_size, tuple(gene_names),
+           extra_info_name)
+    if key not in _loaded_profiles:
+        _loaded_profiles[key] = ProfileList(read_st_profiles(database_path, gene_names,
+                                                             extra_info_name))
+    return _loaded_profiles[key]
+
+
+def read_st_profiles(database_path, gene_names, extra_info_name):
+    bundled = get_bundled_profiles(database_path)
+    if bundled is not None:
+        profiles = profiles_from_table(bundled, gene_names, extra_info_name)
+        if profiles is not None:
+            return profiles
     profiles, first_line = [], True
     with open(database_path, 'r') as f:
         for line in f:
@@ -131,6 +160,81 @@ def load_st_profiles(database_path, gene_names, extra_info_name):
     return profiles
 
 
+def profiles_from_table(table, gene_names, extra_info_name):
+    """
+    Builds the load_st_profiles output from a bundled profile table. Returns None if the table's
+    allele columns aren't all integers, in which case the text file is parsed instead.
+    """
+    header, columns = table
+    assert header[0] == 'ST'
+    if extra_info_name is None:
+        assert header[1:] == gene_names
+        allele_columns, extra_infos = columns[1:], None
+    else:
+        assert header[1:] == gene_names + [extra_info_name]
+        allele_columns, extra_infos = columns[1:-1], columns[-1]
+    if not all(isinstance(c, np.ndarray) for c in [columns[0]] + allele_columns):
+        return None
+    sts = columns[0].tolist()
+    alleles = np.column_stack(allele_columns).tolist() if allele_columns else [[] for _ in sts]
+    if extra_infos is None:
+        extra_infos = [None] * len(sts)
+    elif isinstance(extra_infos, np.ndarray):
+        extra_infos = [str(e) for e in extra_infos.tolist()]
+    return list(zip(sts, alleles, extra_infos))
+
+
+class ProfileList(list):
+    """
+    A list of ST profiles (as returned by load_st_profiles) which also holds the scheme's
+    ProfileIndex, so the index is only built once per scheme.
+    """
+    def get_profile_index(self, gene_names):
+        if getattr(self, 'profile_index', None) is None or \
+                self.profile_index.gene_names != list(gene_names):
+            self.profile_index = ProfileIndex(self, gene_names)
+        return self.profile_index
+
+
+class ProfileIndex(object):
+    """
+    An index of an MLST scheme's profiles which maps each (gene name, allele number) pair to the
+    array of profile row numbers with that allele, so the number of matching genes can be counted
+    for all profiles at once.
+    """
+    def __init__(self, profiles, gene_names):
+        self.gene_names = list(gene_names)
+        self.profile_count = len(profiles)
+        self.rows = {}  # key = (gene name, allele number), value = array of profile row numbers
+        if not profiles:
+            return
+        alleles = np.array([p[1] for p in profiles], dtype=np.int64).reshape(len(profiles), -1)
+        for i, gene_name in enumerate(self.gene_names):
+            column = alleles[:, i]
+            order = np.argsort(column, kind='stable')
+            numbers, starts = np.unique(column[order], return_index=True)
+            for number, rows in zip(numbers.tolist(), np.split(order, starts[1:])):
+                self.rows[(gene_name, number)] = rows
+
+    def get_match_counts(self, best_hits_per_gene):
+        """
+        Returns an array with the number of genes in each profile that have a matching hit.
+        """
+        counts = np.zeros(self.profile_count, dtype=np.int32)
+        for gene_name in self.gene_names:
+            for number in {number_from_hit(h) for h in best_hits_per_gene[gene_name]}:
+                rows = self.rows.get((gene_name, number))
+                if rows is not None:
+                    counts[rows] += 1
+        return counts
+
+
+def get_profile_index(profiles, gene_names):
+    if isinstance(profiles, ProfileList):
+        return profiles.get_profile_index(gene_names)
+    return ProfileIndex(profiles, gene_names)
+
+
 def get_best_hits(hits):
     """
     Given a bunch of hits to an allele, this function returns a list of the best hits. 'Best' is
@@ -172,15 +276,10 @@ def get_best_matching_profile(profiles, gene_names, best_hits_per_gene):
     preferred, so if an assembly matches multiple STs equally well, this function will return
     whichever is first in the profiles.
     """
-    best_st, best_extra_info, best_matches = 0, '', 0
-    best_alleles = [0] * len(gene_names)
-    for st, alleles, extra_info in profiles:
-        matches = 0
-        for gene_name, allele in zip(gene_names, alleles):
-            if any(allele == number_from_hit(h) for h in best_hits_per_gene[gene_name]):
-                matches += 1
-        if matches > best_matches:
-            best_st, best_alleles, best_extra_info, best_matches = st, alleles, extra_info, matches
+    counts = get_profile_index(profiles, gene_names).get_match_counts(best_hits_per_gene)
+    if len(counts) == 0 or counts.max() == 0:
+        return 0, [0] * len(gene_names), ''
+    best_st, best_alleles, best_extra_info = profiles[int(np.argmax(counts))]  # first of any ties
     return best_st, best_alleles, best_extra_info
 
 
@@ -0,0 +1,361 @@
+"""
+This file contains code for writing Kleborate's output files (tab-delimited, JSON Lines or Parquet)
+and making runs resumable (--resume). Rows are written through an OutputSink, and after each flush
+of the output files, each file's length after each of the flushed rows is recorded in a journal in
+the output directory. When a run is resumed, each output file is cut back to the length the journal
+last recorded for it, which removes any row that was only partly written when the previous run
+stopped, and the strains in the output files make up the set of assemblies which don't need to be
+processed again.
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import json
+import os
+import pathlib
+import sys
+import time
+
+
+JOURNAL_FILENAME = 'kleborate_journal.tsv'
+
+
+class OutputJournal(object):
+    """
+    The journal is a tab-delimited file with one line per processed assembly: the output file its
+    row went to (empty if the assembly didn't match any of the output species), that file's length
+    after the row was written, and the strain name.
+    """
+
+    def __init__(self, outdir):
+        self.path = pathlib.Path(outdir) / JOURNAL_FILENAME
+
+    def record(self, entries):
+        """
+        Appends (output file, length, strain) entries to the journal. The output file is None for
+        assemblies which didn't go to any output file.
+        """
+        if not entries:
+            return
+        with open(self.path, 'at') as j:
+            j.write(''.join(f'{"" if outfile is None else pathlib.Path(outfile).name}\t'
+                            f'{size}\t{strain}\n' for outfile, size, strain in entries))
+
+    def read(self):
+        """
+        Returns the recorded length of each output file (key = filename) and the strains which
+        didn't go to any output file. Returns None for the lengths if there is no journal. A
+        partly written last line (from an interrupted run) is ignored.
+        """
+        if not self.path.is_file():
+            return None, []
+        sizes, unmatched_strains = {}, []
+        with open(self.path, 'rt') as j:
+            for line in j:
+                parts = line.rstrip('\n').split('\t')
+                if not line.endswith('\n') or len(parts) != 3:
+                    break
+                filename, size, strain = parts
+                if filename:
+                    sizes[filename] = int(size)
+                else:
+                    unmatched_strains.append(strain)
+        return sizes, unmatched_strains
+
+    def remove(self):
+        if self.path.is_file():
+            self.path.unlink()
+
+
+def resume_output_files(outdir, output_files, output_format='tsv'):
+    """
+    Repairs the existing output files for a resumed run and returns the strain names which are
+    already done (as a Counter, since different assemblies can have the same strain name), so those
+    assemblies can be skipped. Each output file is truncated to the length recorded in the journal,
+    or if there is no journal (e.g. output from an older version of Kleborate), to the end of its
+    last complete line.
+    """
+    journal = OutputJournal(outdir)
+    sizes, unmatched_strains = journal.read()
+    done_strains = collections.Counter(unmatched_strains)
+    for output_file in output_files:
+        output_file = pathlib.Path(output_file)
+        if sizes is not None:
+            truncate_file(output_file, sizes.get(output_file.name, 0))
+        else:
+            truncate_file(output_file, get_complete_lines_length(output_file))
+        done_strains.update(OUTPUT_FORMATS[output_format].read_strains(output_file))
+    return done_strains
+
+
+def truncate_file(filename, size):
+    if os.path.getsize(filename) > size:
+        with open(filename, 'r+b') as f:
+            f.truncate(size)
+
+
+def get_complete_lines_length(filename):
+    with open(filename, 'rb') as f:
+        contents = f.read()
+    return contents.rfind(b'\n') + 1
+
+
+def get_typed_value(value, header_type):
+    """
+    Converts a result (formatted as a string) to its column's type: 'str' (the default), 'int' or
+    'float'. Values which aren't numbers (e.g. '-' or 'Not Tested') are None in numeric columns.
+    """
+    if header_type == 'int' or header_type == 'float':
+        try:
+            return int(value) if header_type == 'int' else float(value)
+        except ValueError:
+            return None
+    return value
+
+
+def get_column_names(full_headers, trim_headers, unique=False):
+    """
+    Returns the output's column names: the full headers, or with trim_headers, the headers without
+    their module names. If the names must be unique (e.g. for keys in JSON objects), any trimmed
+    name which would be shared by more than one column keeps its module name.
+    """
+    if not trim_headers:
+        return list(full_headers)
+    trimmed = [h.split('__')[-1] for h in full_headers]
+    if not unique:
+        return trimmed
+    counts = collections.Counter(trimmed)
+    return [t if counts[t] == 1 else h for h, t in zip(full_headers, trimmed)]
+
+
+class TsvWriter(object):
+    """
+    Writes a tab-delimited output file with a header line.
+    """
+    extension = '.txt'
+    appendable = True
+
+    def __init__(self, path, full_headers, header_types, trim_headers):
+        self.file = open(path, 'ab', buffering=1048576)
+        self.size = self.file.tell()
+        if self.size == 0:  # write headers if the file is new (empty)
+            self.write_bytes(('\t'.join(get_column_names(full_headers, trim_headers)) +
+                              '\n').encode())
+
+    def write(self, values):
+        """
+        Writes a row (the formatted results in header order) and returns the file's length after
+        the row.
+        """
+        return self.write_bytes(('\t'.join(values) + '\n').encode())
+
+    def write_bytes(self, data):
+        self.file.write(data)
+        self.size += len(data)
+        return self.size
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    @staticmethod
+    def read_strains(path):
+        """
+        Returns the strain names (first column) in an output file.
+        """
+        with open(path, 'rt') as f:
+            next(f, None)  # header
+            return [line.split('\t', 1)[0].rstrip('\n') for line in f if line.strip()]
+
+
+class JsonlWriter(TsvWriter):
+    """
+    Writes a JSON Lines output file: one JSON object per assembly, with numeric columns as numbers.
+    """
+    extension = '.jsonl'
+
+    def __init__(self, path, full_headers, header_types, trim_headers):
+        self.file = open(path, 'ab', buffering=1048576)
+        self.size = self.file.tell()
+        self.column_names = get_column_names(full_headers, trim_headers, unique=True)
+        self.column_types = [header_types.get(h, 'str') for h in full_headers]
+
+    def write(self, values):
+        row = {name: get_typed_value(v, t)
+               for name, v, t in zip(self.column_names, values, self.column_types)}
+        return self.write_bytes((json.dumps(row) + '\n').encode())
+
+    @staticmethod
+    def read_strains(path):
+        with open(path, 'rt') as f:
+            return [json.loads(line)['strain'] for line in f if line.strip()]
+
+
+class ParquetWriter(object):
+    """
+    Writes a Parquet output file (requires pyarrow) with typed columns. Rows are collected and
+    written in row groups of ROW_GROUP_SIZE rows, so memory use doesn't grow with the number of
+    assemblies. Parquet files can't be appended to, so an existing file is replaced.
+    """
+    extension = '.parquet'
+    appendable = False
+    ROW_GROUP_SIZE = 10000
+    ARROW_TYPES = {'int': 'int64', 'float': 'float64', 'str': 'string'}
+
+    def __init__(self, path, full_headers, header_types, trim_headers):
+        import pyarrow
+        import pyarrow.parquet
+        self.pyarrow = pyarrow
+        self.column_names = get_column_names(full_headers, trim_headers, unique=True)
+        self.column_types = [header_types.get(h, 'str') for h in full_headers]
+        self.schema = pyarrow.schema([(name, self.ARROW_TYPES[t]) for name, t
+                                      in zip(self.column_names, self.column_types)])
+        self.writer = pyarrow.parquet.ParquetWriter(str(path), self.schema)
+        self.columns = [[] for _ in full_headers]
+
+    def write(self, values):
+        for column, v, t in zip(self.columns, values, self.column_types):
+            column.append(get_typed_value(v, t))
+        if len(self.columns[0]) >= self.ROW_GROUP_SIZE:
+            self.write_row_group()
+        return None
+
+    def write_row_group(self):
+        if self.columns[0]:
+            table = self.pyarrow.Table.from_arrays(
+                [self.pyarrow.array(c, type=f.type) for c, f in zip(self.columns, self.schema)],
+                schema=self.schema)
+            self.writer.write_table(table)
+            self.columns = [[] for _ in self.columns]
+
+    def flush(self):
+        pass  # rows are only written in whole row groups
+
+    def close(self):
+        self.write_row_group()
+        self.writer.close()
+
+    @staticmethod
+    def read_strains(path):
+        sys.exit('Error: Parquet output files cannot be resumed')
+
+
+OUTPUT_FORMATS = {'tsv': TsvWriter, 'jsonl': JsonlWriter, 'parquet': ParquetWriter}
+
+
+def check_output_format(output_format):
+    if output_format == 'parquet':
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            sys.exit('Error: Parquet output requires the pyarrow Python package')
+
+
+class OutputSink(object):
+    """
+    Writes result rows to stdout and to the output files (in the given output format). Each output
+    file is opened once and written through a buffer, which is flushed every flush_rows rows or
+    flush_seconds seconds (whichever comes first) and when the sink is closed. The journal (if
+    given) is only updated after a flush, so it never records a row which isn't completely in its
+    file.
+
+    Output files are given as paths with any extension, which is replaced by the output format's
+    extension. Used as a context manager, so the output files are flushed and closed at the end.
+    """
+
+    def __init__(self, full_headers, stdout_headers, trim_headers=False, journal=None,
+                 flush_rows=100, flush_seconds=10.0, output_format='tsv', header_types=None):
+        self.full_headers = full_headers
+        self.stdout_headers = stdout_headers
+        self.header_positions = {}  # key = output filename, value = (headers, positions)
+        self.header_types = {} if header_types is None else header_types
+        self.trim_headers = trim_headers
+        self.writer_class = OUTPUT_FORMATS[output_format]
+        self.journal = journal if self.writer_class.appendable else None
+        self.flush_rows, self.flush_seconds = flush_rows, flush_seconds
+        self.writers = {}  # key = output filename, value = writer
+        self.pending = []  # journal entries for rows which haven't been flushed yet
+        self.last_flush = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get_path(self, outfile):
+        return str(pathlib.Path(outfile).with_suffix(self.writer_class.extension))
+
+    def get_header_positions(self, path, full_headers):
+        """
+        Returns the output file's headers and their {header: column index} positions. These are
+        set by the file's first row, so every row of a file has the same columns.
+        """
+        if path not in self.header_positions:
+            self.header_positions[path] = \
+                (full_headers, {h: i for i, h in enumerate(full_headers)})
+        return self.header_positions[path]
+
+    def write(self, outfile, results, full_headers=None):
+        """
+        Writes one assembly's results to stdout and to the given output file. The file's columns
+        are the sink's full headers, unless other headers are given (e.g. for --preset auto, where
+        each species' output file has its own preset's columns).
+        """
+        if full_headers is None:
+            full_headers = self.full_headers
+        path = self.get_path(outfile)
+        full_headers, header_positions = self.get_header_positions(path, full_headers)
+        for h in results:
+            if h not in header_positions:
+                sys.exit(f'Error: results contained a value ({h}) that is not covered by the '
+                         f'output headers')
+        values = [str(results.get(h, '-')).strip('[] ') for h in full_headers]
+        print('\t'.join([values[header_positions[h]] if h in header_positions
+                         else str(results.get(h, '-')).strip('[] ')
+                         for h in self.stdout_headers]))
+
+        if path not in self.writers:
+            self.writers[path] = self.writer_class(path, full_headers, self.header_types,
+                                                   self.trim_headers)
+        size = self.writers[path].write(values)
+        self.pending.append((path, size, results.get('strain')))
+        self.flush_if_due()
+
+    def skip(self, strain):
+        """
+        Records (in the journal) an assembly which doesn't go to any output file.
+        """
+        self.pending.append((None, 0, strain))
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        if len(self.pending) >= self.flush_rows or \
+                time.monotonic() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        for writer in self.writers.values():
+            writer.flush()
+        if self.journal is not None:
+            self.journal.record(self.pending)
+        self.pending = []
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
@@ -0,0 +1,64 @@
+"""
+This file contains a registry of Biopython pairwise aligners for Kleborate. Scoring matrices are
+loaded once, each scoring profile's aligner is configured once, and alignments are cached, as the
+same fixed references (e.g. SHV-1, GyrA, ParC, OmpK36) are aligned against recurring sequences.
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import functools
+
+from Bio import Align
+from Bio.Align import substitution_matrices
+
+
+# Aligner settings for each scoring profile. A substitution_matrix setting is the name of one of
+# Biopython's substitution matrices.
+ALIGNER_PROFILES = {
+    'protein': {'substitution_matrix': 'BLOSUM62',
+                'open_gap_score': -10, 'extend_gap_score': -0.5},
+    'nucleotide': {'mode': 'global', 'match_score': 5, 'mismatch_score': -4,
+                   'open_gap_score': -10, 'extend_gap_score': -0.5},
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_substitution_matrix(name):
+    return substitution_matrices.load(name)
+
+
+@functools.lru_cache(maxsize=None)
+def get_aligner(profile):
+    """
+    Returns the (shared) PairwiseAligner for one of the scoring profiles in ALIGNER_PROFILES.
+    """
+    settings = dict(ALIGNER_PROFILES[profile])
+    if 'substitution_matrix' in settings:
+        settings['substitution_matrix'] = get_substitution_matrix(settings['substitution_matrix'])
+    aligner = Align.PairwiseAligner()
+    for name, value in settings.items():
+        setattr(aligner, name, value)
+    return aligner
+
+
+@functools.lru_cache(maxsize=1024)
+def get_best_alignment(profile, target, query):
+    """
+    Aligns the query to the target with the given scoring profile's aligner and returns the first
+    (best) alignment, or None if there aren't any. Results are cached, so the returned alignment
+    is shared and must not be modified.
+    """
+    alignments = get_aligner(profile).align(target, query)
+    try:
+        return alignments[0]
+    except IndexError:
+        return None
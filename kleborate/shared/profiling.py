@@ -0,0 +1,214 @@
+"""
+This file contains Kleborate's profiler (--profile). When it is enabled, each stage of the run (a
+module's get_results or run_batch, preparing an assembly, or the AlignmentBroker's batched
+alignment) records its wall time, its CPU time and the time spent waiting on each external program
+(minimap2, mash) it ran. Optionally, each module's get_results is also run under cProfile, with one
+dump per assembly and module. The records are written to a timing report in the output directory,
+one assembly at a time.
+
+When the profiler isn't enabled, the timing functions do nothing, so they can stay in the code.
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import collections
+import contextlib
+import cProfile
+import json
+import pathlib
+import re
+import sys
+import threading
+import time
+
+
+PROFILE_FILENAME = 'kleborate_profile'  # with the report format (tsv or jsonl) as its extension
+PROFILE_DUMP_DIRNAME = 'kleborate_profile_dumps'
+PROFILE_FORMATS = ['tsv', 'jsonl']
+
+
+class Profiler(object):
+    """
+    Collects timing records, each a dictionary with the strain, module, stage, wall_time, cpu_time
+    and subprocesses (key = program, value = seconds). Stages can run in several threads (with
+    --module_threads), so the stage being timed is kept per thread, and subprocess times go to the
+    stage of the thread which ran the subprocess. A stage which starts inside another one (e.g. the
+    batched alignment, which happens in whichever module first needs it) gets its own record, and
+    its time is left out of the outer stage's time.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.dump_dir = None
+        self.records = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def enable(self, dump_dir=None):
+        self.enabled = True
+        self.dump_dir = None if dump_dir is None else pathlib.Path(dump_dir)
+        if self.dump_dir is not None:
+            self.dump_dir.mkdir(parents=True, exist_ok=True)
+
+    @contextlib.contextmanager
+    def time_stage(self, strain, module, stage):
+        """
+        Times the code in the with block as one stage. If strain is None, it is taken from the
+        outer stage. For get_results stages, the code is also run under cProfile if dumps were
+        requested.
+        """
+        if not self.enabled:
+            yield
+            return
+        outer_record = getattr(self.local, 'record', None)
+        if strain is None:
+            strain = '-' if outer_record is None else outer_record['strain']
+        record = {'strain': strain, 'module': module, 'stage': stage,
+                  'subprocesses': collections.Counter(), 'nested_wall_time': 0.0,
+                  'nested_cpu_time': 0.0}
+        self.local.record = record
+        profile = None
+        if self.dump_dir is not None and stage == 'get_results':
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # another profiler is active in this process (Python 3.12+)
+                profile = None
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.thread_time() - cpu_start
+            if profile is not None:
+                profile.disable()
+                profile.dump_stats(self.dump_dir / get_dump_filename(strain, module))
+            record['wall_time'] = wall_time - record.pop('nested_wall_time')
+            record['cpu_time'] = cpu_time - record.pop('nested_cpu_time')
+            if outer_record is not None:
+                outer_record['nested_wall_time'] += wall_time
+                outer_record['nested_cpu_time'] += cpu_time
+            self.local.record = outer_record
+            with self.lock:
+                self.records.append(record)
+
+    @contextlib.contextmanager
+    def time_subprocess(self, program):
+        """
+        Adds the time spent in the with block (which runs an external program) to the current
+        stage's time for that program.
+        """
+        record = getattr(self.local, 'record', None) if self.enabled else None
+        if record is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record['subprocesses'][program] += time.perf_counter() - start
+
+    def take_records(self):
+        """
+        Returns the records collected so far and forgets them.
+        """
+        with self.lock:
+            records, self.records = self.records, []
+        return records
+
+    def add_records(self, records):
+        """
+        Adds records collected elsewhere (i.e. in a worker process).
+        """
+        with self.lock:
+            self.records.extend(records)
+
+
+PROFILER = Profiler()
+
+
+def get_dump_filename(strain, module):
+    return re.sub(r'[^\w.-]', '_', f'{strain}__{module}') + '.prof'
+
+
+class ProfileReport(object):
+    """
+    The timing report. In tsv format, there is one line per stage, and in jsonl format (JSON Lines),
+    one object per assembly (or for the batch stages, per run) with that assembly's stages. The
+    report also keeps per-module totals for a summary at the end of the run.
+    """
+    TSV_HEADERS = ['strain', 'module', 'stage', 'wall_time', 'cpu_time', 'subprocess_time',
+                   'subprocesses']
+
+    def __init__(self, outdir, report_format, append=False):
+        self.report_format = report_format
+        self.path = pathlib.Path(outdir) / f'{PROFILE_FILENAME}.{report_format}'
+        self.file = open(self.path, 'at' if append else 'wt')
+        if report_format == 'tsv' and self.file.tell() == 0:
+            self.file.write('\t'.join(self.TSV_HEADERS) + '\n')
+        self.totals = collections.defaultdict(lambda: [0, 0.0, 0.0, 0.0])  # key = (module, stage)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+
+    def write(self, records):
+        """
+        Writes the given records, grouped by strain, and flushes so the report is up to date even
+        if the run is interrupted.
+        """
+        by_strain = collections.defaultdict(list)
+        for r in records:
+            by_strain[r['strain']].append(r)
+            totals = self.totals[(r['module'], r['stage'])]
+            totals[0] += 1
+            totals[1] += r['wall_time']
+            totals[2] += r['cpu_time']
+            totals[3] += sum(r['subprocesses'].values())
+        for strain, strain_records in by_strain.items():
+            if self.report_format == 'tsv':
+                self.file.write(''.join(get_tsv_line(r) for r in strain_records))
+            else:
+                self.file.write(json.dumps(
+                    {'strain': strain,
+                     'stage_wall_time': round(sum(r['wall_time'] for r in strain_records), 6),
+                     'stages': [get_json_record(r) for r in strain_records]}) + '\n')
+        self.file.flush()
+
+    def print_summary(self, file=sys.stderr):
+        """
+        Prints each module's (and stage's) total time, slowest first.
+        """
+        print(f'\nProfile ({self.path}):', file=file)
+        print('module\tstage\tcount\twall_time\tcpu_time\tsubprocess_time', file=file)
+        for (module, stage), (count, wall, cpu, subprocess_time) in \
+                sorted(self.totals.items(), key=lambda t: t[1][1], reverse=True):
+            print(f'{module}\t{stage}\t{count}\t{wall:.3f}\t{cpu:.3f}\t{subprocess_time:.3f}',
+                  file=file)
+
+
+def get_tsv_line(record):
+    subprocesses = ';'.join(f'{program}={seconds:.6f}'
+                            for program, seconds in sorted(record['subprocesses'].items()))
+    return '\t'.join([record['strain'], record['module'], record['stage'],
+                      f'{record["wall_time"]:.6f}', f'{record["cpu_time"]:.6f}',
+                      f'{sum(record["subprocesses"].values()):.6f}',
+                      subprocesses if subprocesses else '-']) + '\n'
+
+
+def get_json_record(record):
+    return {'module': record['module'], 'stage': record['stage'],
+            'wall_time': round(record['wall_time'], 6), 'cpu_time': round(record['cpu_time'], 6),
+            'subprocesses': {program: round(seconds, 6)
+                             for program, seconds in sorted(record['subprocesses'].items())}}
@@ -22,6 +22,7 @@ from Bio import SeqIO
 from Bio.Data.CodonTable import TranslationError
  
 from .alignment import align_query_to_ref, cull_redundant_hits, is_exact_aa_match, translate_nucl_to_prot, check_for_exact_aa_match, truncation_check
+from .database import get_bundled_data
 from .misc import load_fasta, reverse_complement
 from kleborate.modules.klebsiella_pneumo_complex__amr.shv_mutations import*
 from kleborate.modules.klebsiella_pneumo_complex__amr.qrdr_mutations import*
@@ -44,6 +45,14 @@ def resminimap_assembly(assembly, minimap2_index, ref_file, gene_info, qrdr, tru
 
 
 def read_class_file(res_class_file):
+    bundled = get_bundled_data(res_class_file, 'class_file')
+    if bundled is not None:
+        gene_info, res_classes, bla_classes = bundled
+        return dict(gene_info), list(res_classes), list(bla_classes)
+    return parse_class_file(res_class_file)
+
+
+def parse_class_file(res_class_file):
     gene_info = {}  # key = sequence id (fasta header in ref file), value = (allele,class,Bla_Class)
     res_classes = []
     bla_classes = ['Bla', 'Bla_inhR', 'Bla_ESBL', 'Bla_ESBL_inhR', 'Bla_Carb', 'Bla_chr']
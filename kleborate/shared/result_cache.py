@@ -0,0 +1,251 @@
+"""
+This file contains Kleborate's persistent result cache (--cache_dir). Each module's results for an
+assembly are stored in an SQLite database, keyed by a hash of the assembly file and a signature of
+everything else which can change the module's results: Kleborate's version, the module's code and
+data files, Kleborate's shared code, its command-line options, the alignment backend and the
+signatures of its prerequisite modules. So an assembly which has been seen before gets its results
+loaded instead of recomputed, and changing one module's options only invalidates that module (and
+the modules which depend on it). When the cache grows past its maximum size, the least recently
+used results are deleted.
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+import sqlite3
+import sys
+import time
+
+from .database import BUNDLE_FILENAME
+
+
+CACHE_FILENAME = 'kleborate_cache.sqlite'
+
+# Module options which only affect speed, not results, so they're left out of signatures.
+IGNORED_OPTIONS = {'threads'}  # Kaptive's -t
+
+# Lookups are remembered and their last-used times written in one transaction at most this often.
+MAX_PENDING_USES = 100
+
+_file_hashes = {}  # key = (path, mtime, size), value = SHA-256 of the file's contents
+
+
+class ResultCache(object):
+    """
+    The cache's SQLite database, with the signatures of the modules used in this run. Each process
+    opens its own connection (on first use), so the object can be handed to worker processes.
+
+    The total size of the cached results is kept in a metadata row, so storing results doesn't
+    need to add up the whole table.
+    """
+
+    def __init__(self, cache_dir, max_size, module_signatures):
+        self.path = pathlib.Path(cache_dir) / CACHE_FILENAME
+        self.max_size = max_size  # in bytes
+        self.module_signatures = module_signatures  # key = module name, value = signature
+        self.connection, self.connection_pid = None, None
+        self.pending_uses = {}  # key = cache key, value = time of use
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+        except OSError as e:
+            sys.exit(f'Error: could not create cache directory {cache_dir}: {e}')
+        self.connect()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['connection'], state['connection_pid'] = None, None
+        state['pending_uses'] = {}
+        return state
+
+    def connect(self):
+        if self.connection is None or self.connection_pid != os.getpid():
+            try:
+                self.connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+                self.connection.execute('CREATE TABLE IF NOT EXISTS results ('
+                                        'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+                                        'size INTEGER NOT NULL, last_used REAL NOT NULL)')
+                self.connection.execute('CREATE INDEX IF NOT EXISTS results_last_used '
+                                        'ON results (last_used)')
+                self.connection.execute('CREATE TABLE IF NOT EXISTS metadata ('
+                                        'name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+                if self.connection.execute("SELECT 1 FROM metadata WHERE name = 'total_size'"
+                                           ).fetchone() is None:
+                    self.connection.execute("INSERT OR IGNORE INTO metadata SELECT 'total_size', "
+                                            "COALESCE(SUM(size), 0) FROM results")
+            except sqlite3.Error as e:
+                sys.exit(f'Error: could not open result cache {self.path}: {e}')
+            self.connection_pid = os.getpid()
+        return self.connection
+
+    def get_keys(self, assembly):
+        """
+        Returns the cache key for each of the run's modules for the given assembly.
+        """
+        assembly_hash = get_file_hash(assembly)
+        return {m: hashlib.sha256(f'{assembly_hash}:{signature}'.encode()).hexdigest()
+                for m, signature in self.module_signatures.items()}
+
+    def get(self, key):
+        """
+        Returns the cached results for the key, or None if there aren't any. The use is written to
+        the database later (see flush).
+        """
+        row = self.connect().execute('SELECT value FROM results WHERE key = ?',
+                                     (key,)).fetchone()
+        if row is None:
+            return None
+        self.pending_uses[key] = time.time()
+        if len(self.pending_uses) >= MAX_PENDING_USES:
+            self.flush()
+        return pickle.loads(row[0])
+
+    def contains(self, key):
+        """
+        Returns whether there are cached results for the key (without counting as a use).
+        """
+        row = self.connect().execute('SELECT 1 FROM results WHERE key = ?', (key,)).fetchone()
+        return row is not None
+
+    def put(self, key, results):
+        """
+        Stores a module's results and then evicts the least recently used results if the cache has
+        grown past its maximum size.
+        """
+        value = pickle.dumps(results, protocol=pickle.HIGHEST_PROTOCOL)
+        size = len(key) + len(value)
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.write_uses(connection)
+            old_row = connection.execute('SELECT size FROM results WHERE key = ?',
+                                         (key,)).fetchone()
+            connection.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                               (key, value, size, time.time()))
+            total_size = connection.execute("SELECT value FROM metadata WHERE name = 'total_size'"
+                                            ).fetchone()[0]
+            total_size += size - (0 if old_row is None else old_row[0])
+            if total_size > self.max_size:
+                evicted = []
+                for old_key, size in connection.execute('SELECT key, size FROM results '
+                                                        'ORDER BY last_used'):
+                    if total_size <= self.max_size:
+                        break
+                    evicted.append((old_key,))
+                    total_size -= size
+                connection.executemany('DELETE FROM results WHERE key = ?', evicted)
+            connection.execute("UPDATE metadata SET value = ? WHERE name = 'total_size'",
+                               (total_size,))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def flush(self):
+        """
+        Writes the last-used times of the results looked up since the last write, in a single
+        transaction. Kleborate calls this after each assembly.
+        """
+        if not self.pending_uses:
+            return
+        connection = self.connect()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            self.write_uses(connection)
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def write_uses(self, connection):
+        connection.executemany('UPDATE results SET last_used = ? WHERE key = ?',
+                               [(t, key) for key, t in self.pending_uses.items()])
+        self.pending_uses = {}
+
+
+def get_module_signatures(module_names, modules, args, version):
+    """
+    Returns a signature (hash) for each of the given modules, which changes whenever anything
+    other than the assembly that can affect the module's results changes.
+    """
+    signatures = {}
+    shared_code = get_directory_digest(pathlib.Path(__file__).parent, '*.py')
+
+    def get_signature(m):
+        if m not in signatures:
+            module_dir = pathlib.Path(modules[m].__file__).parent
+            data_dir = modules[m].data_dir() if hasattr(modules[m], 'data_dir') else None
+            options = {dest: get_option_value(getattr(args, dest, None))
+                       for dest in get_module_option_dests(modules[m])
+                       if dest not in IGNORED_OPTIONS}
+            parts = {'version': version, 'module': m, 'aligner': args.aligner,
+                     'code': get_directory_digest(module_dir, '*.py'),
+                     'shared_code': shared_code,
+                     'data': None if data_dir is None else get_directory_digest(data_dir, '*'),
+                     'options': options,
+                     'prerequisites': [get_signature(p) for p in modules[m].prerequisite_modules()]}
+            signatures[m] = hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+        return signatures[m]
+
+    for m in module_names:
+        get_signature(m)
+    return {m: signatures[m] for m in module_names}
+
+
+def get_module_option_dests(module):
+    """
+    Returns the names (argparse dests) of a module's command-line options.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    module.add_cli_options(parser)
+    return sorted(a.dest for a in parser._actions)
+
+
+def get_option_value(value):
+    # Options which name a file (e.g. a database) are represented by the file's contents.
+    if isinstance(value, (str, pathlib.Path)) and os.path.isfile(value):
+        return get_file_hash(value)
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def get_directory_digest(directory, pattern):
+    """
+    Returns a hash of the names and contents of the files in a directory (not including database
+    bundles, which are derived from the other files).
+    """
+    digest = hashlib.sha256()
+    for path in sorted(pathlib.Path(directory).glob(pattern)):
+        if path.is_file() and path.name != BUNDLE_FILENAME:
+            digest.update(f'{path.name}:{get_file_hash(path)}\n'.encode())
+    return digest.hexdigest()
+
+
+def get_file_hash(filename):
+    """
+    Returns the SHA-256 of a file's contents, remembered for the rest of the run (unless the file
+    changes).
+    """
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1048576), b''):
+                digest.update(chunk)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
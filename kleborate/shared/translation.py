@@ -0,0 +1,79 @@
+"""
+This file contains a fast translation function for Kleborate. It gives the same results as
+Biopython's Seq.translate with the bacterial codon table (11) but looks up all codons at once with
+NumPy and remembers recent translations, as the same sequences often get translated repeatedly.
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import functools
+
+import numpy as np
+from Bio.Data import CodonTable
+from Bio.Data.CodonTable import TranslationError
+from Bio.Seq import Seq
+
+
+BACTERIAL_TABLE = CodonTable.unambiguous_dna_by_id[11]
+
+# Each base is coded as 0-3 (anything other than ACGT is coded as 4), so a codon's index in
+# CODON_AMINO_ACIDS is 16 * first base + 4 * second base + third base.
+BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for i, b in enumerate(b'ACGT'):
+    BASE_CODES[b] = i
+CODON_AMINO_ACIDS = np.frombuffer(''.join(BACTERIAL_TABLE.forward_table.get(a + b + c, '*')
+                                          for a in 'ACGT' for b in 'ACGT' for c in 'ACGT').encode(),
+                                  dtype=np.uint8)
+START_CODONS = frozenset(BACTERIAL_TABLE.start_codons)
+STOP_CODONS = frozenset(BACTERIAL_TABLE.stop_codons)
+
+
+def translate(nucl_seq, to_stop=False, cds=False):
+    """
+    Translates a nucleotide sequence with the bacterial codon table, giving the same result as
+    str(Seq(nucl_seq).translate(table='Bacterial', to_stop=to_stop, cds=cds)):
+    * to_stop: translation ends at the first stop codon (which isn't included).
+    * cds: the sequence must be a complete coding sequence (start codon, whole number of codons,
+      a stop codon at the end and no other stop codons), otherwise a TranslationError is raised.
+      The start codon is translated as M (even alternative start codons) and the final stop codon
+      isn't included.
+    Sequences with any bases other than ACGT are translated by Biopython, which handles ambiguous
+    codons. A partial codon at the end of the sequence is ignored.
+    """
+    return translate_upper(str(nucl_seq).upper(), to_stop, cds)
+
+
+@functools.lru_cache(maxsize=4096)
+def translate_upper(nucl_seq, to_stop, cds):
+    codes = BASE_CODES[np.frombuffer(nucl_seq.encode('ascii', 'replace'), dtype=np.uint8)]
+    if (codes > 3).any():
+        return str(Seq(nucl_seq).translate(table='Bacterial', to_stop=to_stop, cds=cds))
+    if cds:
+        if nucl_seq[:3] not in START_CODONS:
+            raise TranslationError(f"First codon '{nucl_seq[:3]}' is not a start codon")
+        if len(nucl_seq) % 3 != 0:
+            raise TranslationError(f'Sequence length {len(nucl_seq)} is not a multiple of three')
+        if nucl_seq[-3:] not in STOP_CODONS:
+            raise TranslationError(f"Final codon '{nucl_seq[-3:]}' is not a stop codon")
+        protein = 'M' + translate_codes(codes[3:-3])
+        if '*' in protein:
+            raise TranslationError('Extra in frame stop codon found.')
+        return protein
+    protein = translate_codes(codes)
+    if to_stop:
+        protein = protein.split('*', 1)[0]
+    return protein
+
+
+def translate_codes(codes):
+    codons = codes[:len(codes) // 3 * 3].reshape(-1, 3)
+    return CODON_AMINO_ACIDS[codons[:, 0] * 16 + codons[:, 1] * 4 + codons[:, 2]].tobytes().decode()
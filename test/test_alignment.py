@@ -18,9 +18,16 @@ details. You should have received a copy of the GNU General Public License along
 not, see <https://www.gnu.org/licenses/>.
 """
 
+import copy
+import pathlib
 import pytest
+import shutil
+import tempfile
 
+import kleborate.shared.alignment
 from kleborate.shared.alignment import *
+from kleborate.shared.assembly_store import AssemblyFile
+from kleborate.shared.misc import load_fasta
 
 
 def test_bad_paf():
@@ -45,6 +52,53 @@ def test_is_exact():
     assert not a.is_exact()  # coverage < 100%
 
 
+def test_lazy_sequences():
+    query_seqs, ref_seqs = {'A': 'ACGTACGTAC'}, {'C': 'AAAAGGGTTTCCC'}
+    a = Alignment('A\t10\t2\t6\t-\tC\t13\t4\t7\t3\t4\tAS:i:100\tcg:Z:4=', query_seqs, ref_seqs)
+    a.query_name = 'renamed'  # callers can rename the query before the sequences are accessed
+    assert a.query_seq == 'GTAC'
+    assert a.ref_seq == 'CCC'
+    a.ref_seq = 'ACGT'
+    assert a.ref_seq == 'ACGT'
+    assert not hasattr(a, '__dict__')
+
+
+def test_lazy_sequences_copy():
+    a = Alignment('A\t10\t0\t4\t+\tC\t13\t0\t4\t4\t4\tAS:i:100\tcg:Z:4=',
+                  {'A': 'ACGTACGTAC'}, {'C': 'AAAAGGGTTTCCC'})
+    b = copy.copy(a)
+    b.query_name = 'B'
+    assert a.query_name == 'A'
+    assert b.ref_seq == a.ref_seq == 'AAAA'
+
+
+def test_read_paf_alignments():
+    lines = ['A\t100\t0\t100\t+\tC\t1000\t0\t100\t100\t100\tAS:i:100\tcg:Z:100=\n',
+             'B\t100\t0\t100\t+\tC\t1000\t0\t100\t80\t100\tAS:i:100\tcg:Z:100=\n',
+             'C\t100\t0\t50\t+\tC\t1000\t0\t50\t50\t50\tAS:i:100\tcg:Z:50=\n']
+    assert [a.query_name for a in read_paf_alignments(lines)] == ['A', 'B', 'C']
+    assert [a.query_name for a in read_paf_alignments(lines, min_identity=90.0)] == ['A', 'C']
+    assert [a.query_name for a in read_paf_alignments(lines, min_query_coverage=90.0)] == \
+        ['A', 'B']
+    assert [a.query_name for a in read_paf_alignments(lines, min_identity=80.0,
+                                                      min_query_coverage=100.0)] == ['A', 'B']
+
+
+def test_read_paf_alignments_bad_line():
+    with pytest.raises(SystemExit) as e:
+        list(read_paf_alignments(['not_a_paf_line\n'], min_identity=90.0))
+    assert 'PAF format' in str(e.value)
+
+
+def test_align_query_to_ref_filters():
+    all_alignments = align_query_to_ref('test/test_alignment/query.fasta',
+                                        'test/test_alignment/forward_hit.fasta')
+    filtered = align_query_to_ref('test/test_alignment/query.fasta',
+                                  'test/test_alignment/forward_hit.fasta', min_identity=100.0)
+    assert [str(a) for a in filtered] == \
+        [str(a) for a in all_alignments if a.percent_identity >= 100.0]
+
+
 def test_get_expanded_cigar():
     assert get_expanded_cigar('5=') == '====='
     assert get_expanded_cigar('3=1I4=2D2=1X4=') == '===I====DD==X===='
@@ -100,3 +154,117 @@ def test_sequences_3():
     assert a.ref_seq.startswith('CTTCCACAACCCTCCCAAATGTCCC')
     assert a.query_seq.endswith('ATGCGCGTTAGCTGCCTGACAGCTG')
     assert a.ref_seq.endswith('ATGCGCGTTAGCTGCCTGACAGCTG')
+
+
+def test_alignment_broker_1():
+    # Alignments from the broker should match those from separate minimap2 runs.
+    ref = 'test/test_alignment/imperfect_hit.fasta'
+    direct = align_query_to_ref('test/test_alignment/query.fasta', ref)
+    with AlignmentBroker(ref, None, ['test/test_alignment/query.fasta',
+                                     'test/test_alignment/forward_hit.fasta']):
+        brokered = align_query_to_ref('test/test_alignment/query.fasta', ref)
+    assert [str(a) for a in brokered] == [str(a) for a in direct]
+    assert brokered[0].query_name == direct[0].query_name
+    assert brokered[0].ref_seq == direct[0].ref_seq
+    assert brokered[0].cigar == direct[0].cigar
+
+
+def test_alignment_broker_2():
+    # Each query file only gets its own alignments, even when sequence names clash between files.
+    ref = 'test/test_alignment/forward_hit.fasta'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        query_copy = pathlib.Path(tmp_dir) / 'query_copy.fasta'
+        shutil.copyfile('test/test_alignment/query.fasta', query_copy)
+        with AlignmentBroker(ref, None, ['test/test_alignment/query.fasta', query_copy]) as broker:
+            hits_1 = align_query_to_ref('test/test_alignment/query.fasta', ref)
+            hits_2 = align_query_to_ref(query_copy, ref)
+            assert sum(len(hits) for hits in broker.alignments.values()) == 2
+    assert len(hits_1) == 1 and len(hits_2) == 1
+    assert hits_1[0].query_name == hits_2[0].query_name == 'a'
+    assert ref not in kleborate.shared.alignment._active_brokers
+
+
+def test_alignment_broker_3():
+    # A query file given more than once (e.g. by modules sharing a data directory) is only aligned
+    # once, with both backends.
+    ref = 'test/test_alignment/forward_hit.fasta'
+    query = 'test/test_alignment/query.fasta'
+    backends = ['minimap2']
+    try:
+        import mappy  # noqa: F401
+        backends.append('mappy')
+    except ImportError:
+        pass
+    for backend in backends:
+        set_alignment_backend(backend)
+        try:
+            with AlignmentBroker(ref, None, [query, 'test/test_alignment/reverse_hit.fasta',
+                                             query]):
+                hits = align_query_to_ref(query, ref)
+        finally:
+            set_alignment_backend('minimap2')
+        assert len(hits) == 1
+
+
+def test_alignment_broker_4():
+    # With an AssemblyFile as the reference, the broker's alignments take their reference
+    # sequences from the assembly's store.
+    query = 'test/test_alignment/query.fasta'
+    direct = align_query_to_ref(query, 'test/test_alignment/reverse_hit.fasta')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with AssemblyFile('test/test_alignment/reverse_hit.fasta', tmp_dir) as ref:
+            with AlignmentBroker(ref, None, [query]):
+                brokered = align_query_to_ref(query, ref)
+            assert ref.store is not None
+            assert [a.ref_seq for a in brokered] == [a.ref_seq for a in direct]
+
+
+def test_mappy_backend():
+    pytest.importorskip('mappy')
+    set_alignment_backend('mappy')
+    try:
+        forward = align_query_to_ref('test/test_alignment/query.fasta',
+                                     'test/test_alignment/forward_hit.fasta')
+        reverse = align_query_to_ref('test/test_alignment/query.fasta',
+                                     'test/test_alignment/reverse_hit.fasta')
+    finally:
+        set_alignment_backend('minimap2')
+    assert len(forward) == 1 and len(reverse) == 1
+    assert forward[0].strand == '+' and reverse[0].strand == '-'
+    for a in forward + reverse:
+        assert a.percent_identity == pytest.approx(100.0)
+        assert a.query_cov == pytest.approx(100.0)
+        assert a.cigar == '1000='
+        assert a.alignment_score == 2000
+        assert a.ref_seq.startswith('CTTCCACAACCCTCCCAAATGTCCC')
+
+
+def test_get_alignment_score():
+    assert get_alignment_score([[100, 7]]) == 200
+    assert get_alignment_score([[50, 7], [1, 8], [49, 7]]) == 194
+    assert get_alignment_score([[50, 7], [2, 2], [50, 7]]) == 192
+    assert get_alignment_score([[50, 7], [100, 1], [50, 7]]) == 76
+
+
+def test_protein_index_1():
+    # References are found when their protein is contained in any query protein.
+    index = kleborate.shared.alignment.ProteinIndex([('a', 'MKLVTTAHHKL*', 36),
+                                                     ('b', 'MKLVTTAHH', 27),
+                                                     ('c', 'MKV*', 12),
+                                                     ('d', 'MSTNPKPQRKTKRNTNRRPQ*', 63)])
+    assert index.find_contained(['XXMKLVTTAHHKL*']) == {('a', 36), ('b', 27)}
+    assert index.find_contained(['MKLVTTAHHK', 'AAMKV*']) == {('b', 27), ('c', 12)}
+    assert index.find_contained(['MSTNPKPQRKTKRNTNRRPQ']) == set()
+
+
+def test_protein_index_2():
+    # The index gives the same matches as checking each reference in turn.
+    ref_file = 'kleborate/modules/klebsiella_pneumo_complex__amr/data/QRDR_120.fasta'
+    ref_seqs = load_fasta(ref_file)
+    index = kleborate.shared.alignment.get_protein_index(ref_file)
+    for _, seq in ref_seqs:
+        gene_nucl_seq = 'A' + seq + 'CC'
+        expected = {(name, len(ref_seq)) for name, ref_seq in ref_seqs
+                    if kleborate.shared.alignment.is_exact_aa_match(gene_nucl_seq, ref_seq)}
+        gene_prots = kleborate.shared.alignment.get_frame_translations(gene_nucl_seq)
+        assert index.find_contained(gene_prots) == expected
@@ -0,0 +1,160 @@
+"""
+This file contains tests for Kleborate. To run all tests, go the repo's root directory and run:
+  python3 -m pytest
+
+To get code coverage stats:
+  coverage run --source . -m pytest && coverage report -m
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import concurrent.futures
+import pathlib
+import pickle
+import random
+import tempfile
+
+import pytest
+
+import kleborate.shared.assembly_store
+from kleborate.modules.general__contig_stats.general__contig_stats import get_contig_stats
+from kleborate.shared.assembly_store import *
+from kleborate.shared.misc import load_fasta, reverse_complement
+
+
+FASTA = [('a', 'ACGTACGTAC'), ('b', 'NNNACGTRYNNG'), ('c', 'T'), ('d', 'ACGNNNNNNNNNNNNNNT')]
+
+
+def write_fasta(fasta, directory, line_length=5):
+    path = pathlib.Path(directory) / 'assembly.fasta'
+    with open(path, 'wt') as f:
+        for name, seq in fasta:
+            f.write(f'>{name} description\n')
+            for i in range(0, len(seq), line_length):
+                f.write(seq[i:i+line_length].lower() + '\n')
+    return path
+
+
+def test_pack_sequence():
+    packed, (starts, ends, chars) = pack_sequence('ACGTNNAR')
+    assert packed == bytes([0b00011011, 0b00000000])
+    assert list(starts) == [4, 7]
+    assert list(ends) == [6, 8]
+    assert bytes(chars) == b'NR'
+
+
+def test_assembly_store_slicing():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with AssemblyStore(write_fasta(FASTA, temp_dir), temp_dir) as store:
+            assert list(store) == ['a', 'b', 'c', 'd']
+            assert len(store) == 4
+            for name, seq in FASTA:
+                contig = store[name]
+                assert len(contig) == len(seq)
+                assert str(contig) == seq
+                for start in range(len(seq) + 1):
+                    for end in range(start, len(seq) + 1):
+                        assert contig[start:end] == seq[start:end]
+                assert contig[-1] == seq[-1]
+                assert contig[:-2] == seq[:-2]
+                assert contig[::-2] == seq[::-2]
+            with pytest.raises(IndexError):
+                store['c'][1]
+            with pytest.raises(KeyError):
+                store['e']
+
+
+def test_assembly_store_random(monkeypatch):
+    # Contigs longer than a packing chunk (made small here) are packed in several pieces, with
+    # ambiguous runs which can span the pieces.
+    monkeypatch.setattr(kleborate.shared.assembly_store, 'PACK_CHUNK_SIZE', 100)
+    random.seed(0)
+    fasta = [(f'contig_{i}', ''.join(random.choice('ACGTACGTACGTN') for _ in range(length)))
+             for i, length in enumerate([1, 2, 3, 4, 5, 999, 1000, 1001])]
+    fasta.append(('all_n', 'N' * 1234))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        assembly = write_fasta(fasta, temp_dir, line_length=7)
+        with AssemblyStore(assembly, temp_dir) as store:
+            assert store.ambiguous_base_count() == sum(seq.count('N') for _, seq in fasta)
+            assert len(store.ambiguous_runs[-1][0]) == 1
+            for name, seq in fasta:
+                assert str(store[name]) == seq
+                for _ in range(100):
+                    start = random.randint(0, len(seq))
+                    end = random.randint(start, len(seq))
+                    assert store[name][start:end] == seq[start:end]
+
+
+def test_assembly_store_get_region():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with AssemblyStore(write_fasta(FASTA, temp_dir), temp_dir) as store:
+            assert store['b'].get_region(2, 8) == 'NACGTR'
+            assert store['b'].get_region(2, 8, '+') == 'NACGTR'
+            assert store['b'].get_region(2, 8, '-') == reverse_complement('NACGTR')
+
+
+def test_assembly_store_ambiguous_base_count():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with AssemblyStore(write_fasta(FASTA, temp_dir), temp_dir) as store:
+            assert store.ambiguous_base_count() == 21
+            assert store.lengths == [10, 12, 1, 18]
+
+
+def test_assembly_file():
+    # An AssemblyFile is its filename, and it only packs its store when sequences are needed.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = 'test/test_misc/lowercase.fasta'
+        with AssemblyFile(filename, temp_dir) as assembly_file:
+            assert assembly_file == filename
+            assert pathlib.Path(assembly_file) == pathlib.Path(filename)
+            assert assembly_file.store is None
+            store = get_assembly_store(assembly_file)
+            assert assembly_file.store is store
+            assert get_assembly_seqs(assembly_file) is store
+            assert str(store['A']) == load_fasta(filename)[0][1]
+            assert pickle.loads(pickle.dumps(assembly_file)) == filename
+        assert store.mmap is None  # closed at the end
+        assert get_assembly_store(filename) is None
+        assert get_assembly_seqs(filename)['A'].startswith('TTGCCTGTAG')
+
+
+def test_assembly_file_unused():
+    # Without any request for sequences, nothing is packed.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with AssemblyFile('test/test_misc/lowercase.fasta', temp_dir) as assembly_file:
+            pass
+        assert assembly_file.store is None
+        assert list(pathlib.Path(temp_dir).iterdir()) == []
+
+
+def test_assembly_file_threads():
+    # Threads asking for the store at the same time all get the same one.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with AssemblyFile('test/test_genomes/GCF_000009885.1.fna.gz', temp_dir) as assembly_file:
+            with concurrent.futures.ThreadPoolExecutor(4) as executor:
+                stores = list(executor.map(lambda _: get_assembly_store(assembly_file), range(8)))
+            assert all(s is stores[0] for s in stores)
+        assert len(list(pathlib.Path(temp_dir).iterdir())) == 1
+
+
+def test_assembly_store_genome():
+    # A gzipped genome gives the same sequences and contig stats as the parsed file.
+    assembly = 'test/test_genomes/GCF_000009885.1.fna.gz'
+    fasta = load_fasta(assembly)
+    expected = get_contig_stats(assembly)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with AssemblyFile(assembly, temp_dir) as assembly_file:
+            assert get_contig_stats(assembly_file) == expected
+            store = assembly_file.store
+            assert list(store) == [name for name, _ in fasta]
+            for name, seq in fasta:
+                assert str(store[name]) == seq
@@ -0,0 +1,153 @@
+"""
+This file contains tests for Kleborate. To run all tests, go the repo's root directory and run:
+  python3 -m pytest
+
+To get code coverage stats:
+  coverage run --source . -m pytest && coverage report -m
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import pathlib
+import pickle
+import shutil
+import tempfile
+
+from kleborate.modules.klebsiella_pneumo_complex__wzi.wzi import \
+    load_st_profiles as load_wzi_profiles
+from kleborate.shared.database import *
+from kleborate.shared.misc import load_fasta
+from kleborate.shared.mlst import load_st_profiles
+from kleborate.shared.resMinimap import parse_class_file, read_class_file
+
+
+def copy_data_dir(data_dir, tmp_dir, filenames):
+    for f in filenames:
+        shutil.copy2(pathlib.Path(data_dir) / f, tmp_dir)
+    return pathlib.Path(tmp_dir)
+
+
+def test_build_bundle_1():
+    # Profiles loaded from a bundle are the same as those parsed from the text file.
+    gene_names = ['adk', 'fumC', 'gyrB', 'icd', 'mdh', 'purA', 'recA']
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = copy_data_dir('kleborate/modules/escherichia__mlst_achtman/data', tmp_dir,
+                                 ['profiles.tsv', 'adk.fasta'])
+        profiles = data_dir / 'profiles.tsv'
+        text_profiles = load_st_profiles(profiles, gene_names, 'clonal_complex')
+        assert build_bundle(data_dir) == 2
+        assert get_bundled_profiles(profiles) is not None
+        assert load_st_profiles(profiles, gene_names, 'clonal_complex') == text_profiles
+
+
+def test_build_bundle_2():
+    # FASTA files loaded from a bundle are the same as those parsed from the text file.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = copy_data_dir('kleborate/modules/klebsiella__rmst/data', tmp_dir,
+                                 ['rmpA.fasta', 'rmpC.fasta'])
+        build_bundle(data_dir)
+        for f in ['rmpA.fasta', 'rmpC.fasta']:
+            assert get_bundled_fasta(data_dir / f) == load_fasta(data_dir / f)
+
+
+def test_build_bundle_3():
+    # The class file loaded from a bundle is the same as the one parsed from the text file.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = copy_data_dir('kleborate/modules/klebsiella_pneumo_complex__amr/data', tmp_dir,
+                                 [CLASS_FILENAME])
+        build_bundle(data_dir)
+        assert get_bundled_data(data_dir / CLASS_FILENAME, 'class_file') is not None
+        assert read_class_file(data_dir / CLASS_FILENAME) == \
+            parse_class_file(data_dir / CLASS_FILENAME)
+
+
+def test_build_bundle_4():
+    # A file which changed after the bundle was built is not loaded from the bundle.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fasta = pathlib.Path(tmp_dir) / 'seqs.fasta'
+        fasta.write_text('>a\nACGT\n')
+        build_bundle(tmp_dir)
+        assert get_bundled_fasta(fasta) == [('a', 'ACGT')]
+        fasta.write_text('>a\nACGTACGT\n')
+        assert get_bundled_fasta(fasta) is None
+
+
+def test_build_bundle_5():
+    # Directories without any compilable files don't get a bundle.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        (pathlib.Path(tmp_dir) / 'notes.txt').write_text('not a profile table\n')
+        assert build_bundle(tmp_dir) == 0
+        assert not os.path.exists(pathlib.Path(tmp_dir) / BUNDLE_FILENAME)
+        assert load_bundle(tmp_dir) is None
+
+
+def test_build_bundle_6():
+    # CARD reference sequences are also bundled as translations.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = pathlib.Path(tmp_dir)
+        (data_dir / 'CARD_test.fasta').write_text('>a\nATGAAATAA\n>b\nGTGCCC\n')
+        build_bundle(data_dir)
+        assert get_bundled_data(data_dir / 'CARD_test.fasta', 'translations') == \
+            [('a', 'MK*', 9), ('b', 'VP', 6)]
+
+
+class Exploit(object):
+    ran = False
+
+    def __reduce__(self):
+        return setattr, (Exploit, 'ran', True)
+
+
+def test_load_bundle_untrusted_dir():
+    # A bundle in a directory which isn't a module data directory (e.g. next to a user's
+    # assemblies) is never unpickled.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fasta = pathlib.Path(tmp_dir) / 'assembly.fasta'
+        fasta.write_text('>a\nACGT\n')
+        with open(pathlib.Path(tmp_dir) / BUNDLE_FILENAME, 'wb') as f:
+            pickle.dump({'version': BUNDLE_VERSION, 'entries': Exploit()}, f)
+        assert not is_bundle_dir(tmp_dir)
+        assert load_bundle(tmp_dir) is None
+        assert get_bundled_fasta(fasta) is None
+        assert not Exploit.ran
+
+
+def test_is_bundle_dir():
+    assert is_bundle_dir('kleborate/modules/klebsiella__rmst/data')
+    assert not is_bundle_dir('test/test_genomes')
+
+
+def test_parse_profile_table():
+    # Columns are only stored as integers when that doesn't change their text.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        table = pathlib.Path(tmp_dir) / 'profiles.tsv'
+        table.write_text('ST\tgene\tinfo\n1\t01\t5\n2\t2\t6\n')
+        header, columns = parse_profile_table(table)
+        assert header == ['ST', 'gene', 'info']
+        assert columns[0].tolist() == [1, 2]
+        assert columns[1] == ['01', '2']
+        assert columns[2].tolist() == [5, 6]
+
+
+def test_build_bundle_wzi():
+    # wzi profiles loaded from a bundle are the same as those parsed from the text file, including
+    # a numeric extra-info column.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        profiles = pathlib.Path(tmp_dir) / 'wzi.txt'
+        profiles.write_text('ST\twzi\tKL\n1\t1\t10\n2\t2\t20\n')
+        text_profiles = load_wzi_profiles(profiles, 'wzi', 'KL')
+        assert text_profiles == [(1, [1], '10'), (2, [2], '20')]
+        build_bundle(tmp_dir)
+        assert get_bundled_profiles(profiles) is not None
+        assert load_wzi_profiles(profiles, 'wzi', 'KL') == text_profiles
+        assert all(isinstance(p[2], str) for p in load_wzi_profiles(profiles, 'wzi', 'KL'))
@@ -18,11 +18,13 @@ details. You should have received a copy of the GNU General Public License along
 not, see <https://www.gnu.org/licenses/>.
 """
 
+import argparse
 import collections
 import pathlib
 import pytest
 import re
 import tempfile
+import threading
 
 import kleborate.__main__
 
@@ -251,6 +253,98 @@ def test_get_used_module_names_7():
     assert 'either --preset or --modules is required' in str(e.value)
 
 
+def test_get_used_module_names_auto():
+    all_module_names = ['a', 'b', 'c', 'd', 'e']
+    presets = {'1': {'check': [['a', 'x']], 'pass': ['b', 'c']},
+               '2': {'check': [['a', 'y']], 'pass': ['c', 'd']}}
+    Args = collections.namedtuple('Args', ['modules', 'preset'])
+    module_names, check_modules, pass_modules = \
+        kleborate.__main__.get_used_module_names(Args(modules=None, preset='auto'),
+                                                 all_module_names, presets)
+    assert module_names == ['a', 'b', 'c', 'd']
+    assert check_modules == ['a']
+    assert pass_modules == ['b', 'c', 'd']
+
+
+def test_get_preset_module_names():
+    _, modules = kleborate.__main__.import_modules()
+    presets = kleborate.__main__.get_presets()
+    preset_module_names = kleborate.__main__.get_preset_module_names(presets, modules)
+    assert list(preset_module_names) == list(presets)
+    for preset, module_names in preset_module_names.items():
+        assert module_names[0] == 'enterobacterales__species'
+        assert module_names[1:len(presets[preset]['pass']) + 1] == presets[preset]['pass']
+    assert 'klebsiella_pneumo_complex__amr' in preset_module_names['kpsc']
+    assert 'klebsiella_pneumo_complex__amr' not in preset_module_names['escherichia']
+
+
+def test_run_auto_preset(monkeypatch):
+    # The species module runs once, then only the modules of the preset which matches.
+    class FakeModule(object):
+        def __init__(self, results):
+            self.results, self.run_count = results, 0
+
+        def get_results(self, assembly, minimap2_index, args, previous_results):
+            self.run_count += 1
+            return self.results
+
+    modules = {'species': FakeModule({'species': 'Klebsiella oxytoca'}),
+               'a': FakeModule({'x': '1'}), 'b': FakeModule({'y': '2'})}
+    monkeypatch.setattr(kleborate.__main__, 'get_presets',
+                        lambda: {'p1': {'check': [('species', 'is_kp_complex')], 'pass': ['a']},
+                                 'p2': {'check': [('species', 'is_ko_complex')], 'pass': ['b']}})
+    preset_run_orders = {'p1': ['species', 'a'], 'p2': ['species', 'b']}
+    args = argparse.Namespace(module_threads=1)
+    selected, results = [], {'strain': 'test'}
+    preset = kleborate.__main__.run_auto_preset('test.fasta', lambda: ('test.fasta', None),
+                                                selected.extend, modules, args, results,
+                                                preset_run_orders)
+    assert preset == 'p2'
+    assert selected == ['species', 'b']
+    assert results == {'strain': 'test', 'species__species': 'Klebsiella oxytoca', 'b__y': '2'}
+    assert [m.run_count for m in modules.values()] == [1, 0, 1]
+
+    modules['species'].results = {'species': 'Serratia marcescens'}
+    results = {'strain': 'test'}
+    assert kleborate.__main__.run_auto_preset('test.fasta', lambda: ('test.fasta', None),
+                                              selected.extend, modules, args, results,
+                                              preset_run_orders) is None
+    assert results == {'strain': 'test', 'species__species': 'Serratia marcescens'}
+
+    # An error in one of the preset's modules isn't taken as a species mismatch.
+    modules['species'].results = {'species': 'Klebsiella oxytoca'}
+    modules['b'].get_results = lambda *args: 1 / 0
+    with pytest.raises(ZeroDivisionError):
+        kleborate.__main__.run_auto_preset('test.fasta', lambda: ('test.fasta', None),
+                                           selected.extend, modules, args, {'strain': 'test'},
+                                           preset_run_orders)
+
+
+def test_run_module_group():
+    # Independent modules run at the same time (the barrier needs both), and a dependent module
+    # runs after its prerequisites and is given their results.
+    barrier = threading.Barrier(2, timeout=10)
+
+    class FakeModule(object):
+        def __init__(self, name, prerequisites, wait=False):
+            self.name, self.prerequisites, self.wait = name, prerequisites, wait
+
+        def prerequisite_modules(self):
+            return self.prerequisites
+
+        def get_results(self, assembly, minimap2_index, args, previous_results):
+            if self.wait:
+                barrier.wait()
+            return {'x': ','.join(sorted(k for k in previous_results if k != 'strain')) or '-'}
+
+    modules = {'a': FakeModule('a', [], wait=True), 'b': FakeModule('b', [], wait=True),
+               'c': FakeModule('c', ['a', 'b'])}
+    results = {'strain': 'test'}
+    kleborate.__main__.run_module_group(['a', 'b', 'c'], modules, lambda: ('test.fasta', None),
+                                        argparse.Namespace(module_threads=2), results)
+    assert results == {'strain': 'test', 'a__x': '-', 'b__x': '-', 'c__x': 'a__x,b__x'}
+
+
 def test_paper_refs():
     papers = kleborate.__main__.paper_refs()
     assert 'Lam MMC, et al.' in papers
@@ -330,3 +424,170 @@ def test_get_run_order_2():
     dependency_graph = {'a': ['b'], 'b': ['a'], 'c': []}
     with pytest.raises(SystemExit) as e:
         assert kleborate.__main__.get_run_order(dependency_graph)
+
+
+def test_check_settings():
+    all_module_names, modules = kleborate.__main__.import_modules()
+    args = kleborate.__main__.parse_arguments(['-a', 'test/test_main/test.fasta', '-j', '0'],
+                                              all_module_names, modules)
+    with pytest.raises(SystemExit) as e:
+        kleborate.__main__.check_settings(args)
+    assert '--jobs must be at least 1' in str(e.value)
+
+    args = kleborate.__main__.parse_arguments(['-a', 'test/test_main/test.fasta',
+                                               '--module_threads', '0'],
+                                              all_module_names, modules)
+    with pytest.raises(SystemExit) as e:
+        kleborate.__main__.check_settings(args)
+    assert '--module_threads must be at least 1' in str(e.value)
+
+    args = kleborate.__main__.parse_arguments(['-a', 'test/test_main/test.fasta',
+                                               '--profile_dumps'],
+                                              all_module_names, modules)
+    with pytest.raises(SystemExit) as e:
+        kleborate.__main__.check_settings(args)
+    assert '--profile_dumps requires --profile' in str(e.value)
+
+    for profile_args, profile_format in [(['--profile'], 'tsv'), (['--profile', 'jsonl'], 'jsonl')]:
+        args = kleborate.__main__.parse_arguments(['-a', 'test/test_main/test.fasta'] +
+                                                  profile_args, all_module_names, modules)
+        assert args.profile == profile_format
+
+    args = kleborate.__main__.parse_arguments(['-a', 'test/test_main/test.fasta', '-p', 'auto',
+                                               '-m', 'general__contig_stats'],
+                                              all_module_names, modules)
+    with pytest.raises(SystemExit) as e:
+        kleborate.__main__.check_settings(args)
+    assert '--preset auto cannot be combined with --modules' in str(e.value)
+
+
+def test_run_assemblies():
+    # Parallel runs should give the same results, in the same order, as a serial run.
+    all_module_names, modules = kleborate.__main__.import_modules()
+    assemblies = ['test/test_main/test.fasta', 'test/test_main/test.fasta.gz']
+    args = kleborate.__main__.parse_arguments(['-a'] + assemblies +
+                                              ['-m', 'klebsiella_pneumo_complex__mlst'],
+                                              all_module_names, modules)
+    module_names, run_order, external_programs = \
+        kleborate.__main__.check_modules(args, modules, ['klebsiella_pneumo_complex__mlst'], [], [])
+    full_headers, _ = kleborate.__main__.get_headers(module_names, modules)
+    run_settings = (args, run_order, [], [], full_headers, external_programs)
+    serial = list(kleborate.__main__.run_assemblies(assemblies, 1, modules, run_settings, {}))
+    parallel = list(kleborate.__main__.run_assemblies(assemblies, 2, modules, run_settings, {}))
+    assert serial == parallel
+    assert [a for a, _, _ in parallel] == assemblies
+    assert all(s == 'klebsiella_pneumo_complex__mlst_output.txt' for _, _, s in parallel)
+
+
+def test_get_alignment_query_files_1():
+    # The resistance modules share the AMR module's data directory, but don't align anything
+    # themselves, so only the AMR module's files are included (once).
+    _, modules = kleborate.__main__.import_modules()
+    module_names = ['klebsiella_pneumo_complex__amr', 'klebsiella_pneumo_complex__resistance_score',
+                    'klebsiella_pneumo_complex__resistance_gene_count']
+    query_files = kleborate.__main__.get_alignment_query_files(module_names, modules, ['minimap2'])
+    assert len(query_files) == len(set(query_files))
+    assert query_files == kleborate.__main__.get_alignment_query_files(module_names[:1], modules,
+                                                                       ['minimap2'])
+    assert [f.name for f in query_files] == ['CARD_v3.2.9.fasta', 'QRDR_120.fasta',
+                                             'MgrB_and_PmrB.fasta', 'OmpK.fasta']
+    assert kleborate.__main__.get_alignment_query_files(module_names, modules, []) == []
+
+
+def test_get_alignment_query_files_2():
+    # Only the files a module asks for are included, not everything in its data directory, and
+    # missing files are left out.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        data_dir = pathlib.Path(temp_dir)
+        for name in ['a.fasta', 'b.fasta', 'unused.fasta']:
+            (data_dir / name).write_text('>x\nACGT\n')
+        module = argparse.Namespace(
+            data_dir=lambda: data_dir,
+            get_alignment_query_files=lambda: [data_dir / 'a.fasta', data_dir / 'b.fasta',
+                                               data_dir / 'missing.fasta'])
+        modules = {'m': module, 'n': argparse.Namespace(data_dir=lambda: data_dir)}
+        query_files = kleborate.__main__.get_alignment_query_files(['m', 'n'], modules,
+                                                                   ['minimap2'])
+        assert query_files == [data_dir / 'a.fasta', data_dir / 'b.fasta']
+
+
+def test_amr_with_resistance_score():
+    # Running the AMR module together with a module sharing its data directory gives the same AMR
+    # results as running it alone (i.e. no repeated hits).
+    all_module_names, modules = kleborate.__main__.import_modules()
+    assembly = 'test/test_genomes/GCF_000016305.1.fna.gz'
+    amr_results = []
+    for module_names in [['klebsiella_pneumo_complex__amr'],
+                         ['klebsiella_pneumo_complex__amr',
+                          'klebsiella_pneumo_complex__resistance_score']]:
+        args = kleborate.__main__.parse_arguments(['-a', assembly, '-m', ','.join(module_names)],
+                                                  all_module_names, modules)
+        used_names, run_order, external_programs = \
+            kleborate.__main__.check_modules(args, modules, module_names, [], [])
+        full_headers, _ = kleborate.__main__.get_headers(used_names, modules)
+        results, _ = kleborate.__main__.process_assembly(assembly, modules, args, run_order, [],
+                                                         [], full_headers, external_programs)
+        amr_results.append({k: v for k, v in results.items()
+                            if k.startswith('klebsiella_pneumo_complex__amr__')})
+    assert amr_results[0] == amr_results[1]
+    assert amr_results[0]['klebsiella_pneumo_complex__amr__Flq_mutations'] == 'GyrA-83Y'
+
+
+def test_run_batch_stages():
+    # Only modules with a run_batch function have a batch stage, and assemblies with a duplicated
+    # strain name are left out of it.
+    class BatchModule(object):
+        def run_batch(self, assemblies, args):
+            return sorted(assemblies)
+
+        def set_batch_results(self, batch_results):
+            self.batch_results = batch_results
+
+    modules = {'batch': BatchModule(), 'no_batch': object()}
+    assemblies = ['a/x.fasta', 'b/x.fasta.gz', 'a/y.fasta']
+    batch_results = kleborate.__main__.run_batch_stages(assemblies, None, ['batch', 'no_batch'],
+                                                        modules)
+    assert batch_results == {'batch': ['y']}
+    assert modules['batch'].batch_results == ['y']
+
+
+def test_result_cache(monkeypatch):
+    # A second run with the same settings takes its results from the cache, without aligning.
+    all_module_names, modules = kleborate.__main__.import_modules()
+    with tempfile.TemporaryDirectory() as temp_dir:
+        args = kleborate.__main__.parse_arguments(['-a', 'test/test_main/test.fasta',
+                                                   '-m', 'klebsiella_pneumo_complex__mlst',
+                                                   '--cache_dir', temp_dir],
+                                                  all_module_names, modules)
+        module_names, run_order, external_programs = \
+            kleborate.__main__.check_modules(args, modules, ['klebsiella_pneumo_complex__mlst'],
+                                             [], [])
+        full_headers, _ = kleborate.__main__.get_headers(module_names, modules)
+        result_cache = kleborate.__main__.get_result_cache(args, run_order, modules)
+        run_settings = (args, run_order, [], [], full_headers, external_programs, result_cache)
+        first, _ = kleborate.__main__.process_assembly('test/test_main/test.fasta', modules,
+                                                       *run_settings)
+
+        def fail(*args):
+            assert False
+        monkeypatch.setattr(kleborate.__main__, 'build_minimap2_index', fail)
+        second, _ = kleborate.__main__.process_assembly('test/test_main/test.fasta', modules,
+                                                        *run_settings)
+        assert first == second
+
+
+def test_get_remaining_assemblies():
+    assemblies = ['a/x.fasta', 'b/x.fasta.gz', 'a/y.fasta', 'a/z.fasta']
+    assert kleborate.__main__.get_remaining_assemblies(assemblies, collections.Counter()) == \
+        assemblies
+    done = collections.Counter(['x', 'z'])
+    assert kleborate.__main__.get_remaining_assemblies(assemblies, done) == \
+        ['b/x.fasta.gz', 'a/y.fasta']
+
+
+def test_get_header_types():
+    _, modules = kleborate.__main__.import_modules()
+    header_types = kleborate.__main__.get_header_types(
+        ['general__contig_stats', 'klebsiella_pneumo_complex__mlst'], modules)
+    assert header_types['general__contig_stats__N50'] == 'int'
+    assert not any(h.startswith('klebsiella_pneumo_complex__mlst') for h in header_types)
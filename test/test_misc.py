@@ -18,7 +18,9 @@ details. You should have received a copy of the GNU General Public License along
 not, see <https://www.gnu.org/licenses/>.
 """
 
+import pathlib
 import pytest
+import tempfile
 
 from kleborate.shared.misc import *
 
@@ -43,6 +45,28 @@ def test_get_compression_type_4():
     assert 'cannot use zip' in str(e.value)
 
 
+def test_get_compression_type_5():
+    # The compression type is cached per file, and a file that changes is sniffed again.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        filename = pathlib.Path(temp_dir) / 'test'
+        filename.write_bytes(gzip.compress(b'ACGT'))
+        assert get_compression_type(filename) == 'gz'
+        assert get_compression_type(filename) == 'gz'
+        filename.write_text('>a\nACGT\n')
+        os.utime(filename, ns=(0, 0))
+        assert get_compression_type(filename) == 'plain'
+
+
+def test_decompress_file():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        in_file = pathlib.Path(temp_dir) / 'in.fasta.gz'
+        out_file = pathlib.Path(temp_dir) / 'out.fasta'
+        text = ''.join(f'>{i}\nACGTACGTAC\n' for i in range(1000))
+        in_file.write_bytes(gzip.compress(text.encode()))
+        decompress_file(in_file, out_file, chunk_size=100)
+        assert out_file.read_text() == text
+
+
 def test_get_open_func_1():
     assert get_open_func('test/test_misc/test.txt') == open
 
@@ -63,6 +87,16 @@ def test_reverse_complement_3():
     assert reverse_complement('ACGT123') == 'NNNACGT'
 
 
+def test_reverse_complement_4():
+    assert reverse_complement('RYSWKMBVDHN.-?') == '?-.NDHBVKMWSRY'
+    assert reverse_complement('ryswkmbvdhn') == 'ndhbvkmwsry'
+    assert reverse_complement('') == ''
+
+
+def test_reverse_complement_5():
+    assert reverse_complement('ACGT\u00e9\n') == 'NNACGT'  # non-ASCII characters also become N
+
+
 def test_load_fasta_1():
     fasta_seqs = load_fasta('test/test_misc/blank_lines.fasta')
     assert len(fasta_seqs) == 2
@@ -78,3 +112,49 @@ def test_load_fasta_2():
 def test_load_fasta_3():
     fasta_seqs = load_fasta('test/test_misc/empty.fasta')
     assert len(fasta_seqs) == 0
+
+
+def test_sequence_cache_1():
+    cache = SequenceCache()
+    seqs_1, seq_dict = cache.get('test/test_misc/lowercase.fasta')
+    seqs_2, _ = cache.get('test/test_misc/lowercase.fasta')
+    assert seqs_1 is seqs_2  # second request comes from the cache
+    assert list(seqs_1) == load_fasta('test/test_misc/lowercase.fasta')
+    assert list(seq_dict.items()) == list(seqs_1)
+
+
+def test_sequence_cache_2():
+    # A file which changes on disk is parsed again.
+    cache = SequenceCache()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fasta = pathlib.Path(tmp_dir) / 'seqs.fasta'
+        fasta.write_text('>a\nACGT\n')
+        assert cache.get(fasta)[1] == {'a': 'ACGT'}
+        fasta.write_text('>a\nACGTACGT\n')
+        assert cache.get(fasta)[1] == {'a': 'ACGTACGT'}
+
+
+def test_sequence_cache_3():
+    # The least recently used files are evicted when the cache is full.
+    cache = SequenceCache(max_bases=10)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fastas = [pathlib.Path(tmp_dir) / f'{i}.fasta' for i in range(3)]
+        for f in fastas:
+            f.write_text('>a\nACGT\n')
+        seqs_0 = cache.get(fastas[0])[0]
+        cache.get(fastas[1])
+        cache.get(fastas[0])  # now fastas[1] is the least recently used
+        cache.get(fastas[2])
+        assert len(cache.entries) == 2
+        assert cache.total_bases == 8
+        assert cache.get(fastas[0])[0] is seqs_0
+
+
+def test_sequence_cache_4():
+    # Sequences added for a file are returned without parsing it.
+    cache = SequenceCache()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fasta = pathlib.Path(tmp_dir) / 'seqs.fasta'
+        fasta.write_text('>a\nACGT\n')
+        cache.add(fasta, [('b', 'TTTT')])
+        assert cache.get(fasta)[1] == {'b': 'TTTT'}
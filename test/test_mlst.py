@@ -206,6 +206,46 @@ def test_get_best_matching_profile_4():
     assert best_hit_per_gene['ijkL'] is None
 
 
+def test_get_best_matching_profile_7():
+    # ST2 and ST3 match equally well, so the earlier profile (ST2) wins.
+    profiles = [(1, [1, 1, 1], None), (2, [2, 2, 1], None), (3, [2, 1, 2], None)]
+    gene_names = ['abcD', 'efgH', 'ijkL']
+    best_hits_per_gene = {'abcD': [Alignment('abcD_2\t100\t0\t100\t+\t'
+                                             'tig\t100\t0\t100\t100\t100\tAS:i:100\tcg:Z:100=')],
+                          'efgH': [Alignment('efgH_2\t100\t0\t100\t+\t'
+                                             'tig\t100\t0\t100\t100\t100\tAS:i:100\tcg:Z:100='),
+                                   Alignment('efgH_3\t100\t0\t100\t+\t'
+                                             'tig\t100\t0\t100\t100\t100\tAS:i:100\tcg:Z:100=')],
+                          'ijkL': [Alignment('ijkL_2\t100\t0\t100\t+\t'
+                                             'tig\t100\t0\t100\t100\t100\tAS:i:100\tcg:Z:100=')]}
+    st, alleles, extra_info = get_best_matching_profile(profiles, gene_names, best_hits_per_gene)
+    assert st == 2
+    assert alleles == [2, 2, 1]
+
+
+def test_profile_index():
+    # The index's match counts are the same as counting matches profile by profile.
+    gene_names = ['adk', 'fumC', 'gyrB', 'icd', 'mdh', 'purA', 'recA']
+    profiles = load_st_profiles('kleborate/modules/escherichia__mlst_achtman/data/profiles.tsv',
+                                gene_names, 'clonal_complex')
+    best_hits_per_gene = {g: [Alignment(f'{g}_{a}\t100\t0\t100\t+\t'
+                                        'tig\t100\t0\t100\t100\t100\tAS:i:100\tcg:Z:100=')
+                              for a in (1, 2, 4, 10)] for g in gene_names}
+    counts = ProfileIndex(profiles, gene_names).get_match_counts(best_hits_per_gene)
+    expected = [sum(a in (1, 2, 4, 10) for a in alleles) for _, alleles, _ in profiles]
+    assert counts.tolist() == expected
+    assert get_profile_index(profiles, gene_names) is get_profile_index(profiles, gene_names)
+
+
+def test_load_st_profiles_3():
+    # Profiles are only loaded once per file.
+    gene_names = ['gapA', 'infB', 'mdh', 'pgi', 'phoE', 'rpoB', 'tonB']
+    profile_file = 'kleborate/modules/klebsiella_pneumo_complex__mlst/data/profiles.tsv'
+    profiles = load_st_profiles(profile_file, gene_names, None)
+    assert profiles is load_st_profiles(profile_file, gene_names, None)
+    assert profiles[0] == (1, [4, 4, 1, 1, 7, 4, 10], None)
+
+
 def test_get_best_matching_profile_5():
     # This test has two hits for efgH, so it matches equally well to ST1 and ST2. The correct
     # answer is ST1 because that's earlier in the profile.
@@ -0,0 +1,192 @@
+"""
+This file contains tests for Kleborate. To run all tests, go the repo's root directory and run:
+  python3 -m pytest
+
+To get code coverage stats:
+  coverage run --source . -m pytest && coverage report -m
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import pathlib
+import pytest
+import tempfile
+
+from kleborate.shared.output import *
+
+
+def test_journal():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_file = pathlib.Path(temp_dir) / 'out.txt'
+        journal = OutputJournal(temp_dir)
+        assert journal.read() == (None, [])
+        journal.record([(out_file, 16, 'a'), (None, 0, 'b')])
+        journal.record([])
+        assert journal.read() == ({'out.txt': 16}, ['b'])
+        journal.remove()
+        assert journal.read() == (None, [])
+
+
+def test_resume_output_files_1():
+    # A row written after the journal's last record (i.e. possibly incomplete) is removed.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_file = pathlib.Path(temp_dir) / 'out.txt'
+        journal = OutputJournal(temp_dir)
+        out_file.write_text('strain\tST\na\tST1\n')
+        journal.record([(out_file, 16, 'a'), (None, 0, 'b')])
+        with open(out_file, 'at') as f:
+            f.write('c\tST')
+        with open(journal.path, 'at') as f:
+            f.write('out.txt\t2')  # partly written journal line
+        done = resume_output_files(temp_dir, [out_file])
+        assert done == collections.Counter(['a', 'b'])
+        assert out_file.read_text() == 'strain\tST\na\tST1\n'
+
+
+def test_resume_output_files_2():
+    # Without a journal, the output file is truncated to its last complete line.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_file = pathlib.Path(temp_dir) / 'out.txt'
+        out_file.write_text('strain\tST\na\tST1\na\tST2\nb\tS')
+        assert resume_output_files(temp_dir, [out_file]) == collections.Counter({'a': 2})
+        assert out_file.read_text() == 'strain\tST\na\tST1\na\tST2\n'
+
+
+def test_resume_output_files_3():
+    # An output file not in the journal was never completely written.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_file = pathlib.Path(temp_dir) / 'out.txt'
+        OutputJournal(temp_dir).record([(None, 0, 'b')])
+        out_file.write_text('strain\tST\na\t')
+        assert resume_output_files(temp_dir, [out_file]) == collections.Counter(['b'])
+        assert out_file.read_text() == ''
+
+
+def test_output_sink_1(capfd):
+    full_headers = ['strain', 'm__a', 'm__b']
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_1, out_2 = pathlib.Path(temp_dir) / 'out_1.txt', pathlib.Path(temp_dir) / 'out_2.txt'
+        journal = OutputJournal(temp_dir)
+        with OutputSink(full_headers, ['strain', 'm__b'], trim_headers=True,
+                        journal=journal) as sink:
+            sink.write(out_1, {'strain': 'x', 'm__a': '1', 'm__b': '[2]'})
+            sink.skip('y')
+            sink.write(out_2, {'strain': 'z', 'm__a': '3'})
+            sink.write(out_1, {'strain': 'w'})
+            assert journal.read() == (None, [])  # nothing flushed yet
+        assert out_1.read_text() == 'strain\ta\tb\nx\t1\t2\nw\t-\t-\n'
+        assert out_2.read_text() == 'strain\ta\tb\nz\t3\t-\n'
+        assert journal.read() == ({'out_1.txt': 23, 'out_2.txt': 17}, ['y'])
+        out, _ = capfd.readouterr()
+        assert out == 'x\t2\nz\t-\nw\t-\n'
+
+
+def test_output_sink_2():
+    # Rows are flushed (and journaled) every flush_rows rows, and existing files are appended.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_file = pathlib.Path(temp_dir) / 'out.txt'
+        out_file.write_text('strain\tm__a\nv\t0\n')
+        journal = OutputJournal(temp_dir)
+        with OutputSink(['strain', 'm__a'], [], journal=journal, flush_rows=2) as sink:
+            sink.write(out_file, {'strain': 'x', 'm__a': '1'})
+            sink.write(out_file, {'strain': 'y', 'm__a': '2'})
+            assert out_file.read_text() == 'strain\tm__a\nv\t0\nx\t1\ny\t2\n'
+            assert journal.read() == ({'out.txt': 24}, [])
+            sink.write(out_file, {'strain': 'z', 'm__a': '3'})
+            assert journal.read() == ({'out.txt': 24}, [])
+        assert journal.read() == ({'out.txt': 28}, [])
+
+
+def test_output_sink_3():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_file = pathlib.Path(temp_dir) / 'out.txt'
+        with pytest.raises(SystemExit) as e:
+            with OutputSink(['strain'], ['strain']) as sink:
+                sink.write(out_file, {'strain': 'x', 'm__a': '1'})
+        assert 'not covered by the output headers' in str(e.value)
+
+
+def test_output_sink_4():
+    # Output files can have their own headers (e.g. each preset's columns with --preset auto).
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_1, out_2 = pathlib.Path(temp_dir) / 'out_1.txt', pathlib.Path(temp_dir) / 'out_2.txt'
+        with OutputSink(['strain', 'm__a', 'n__b'], ['strain']) as sink:
+            sink.write(out_1, {'strain': 'x', 'm__a': '1'}, ['strain', 'm__a'])
+            sink.write(out_2, {'strain': 'y', 'n__b': '2'}, ['strain', 'n__b'])
+            with pytest.raises(SystemExit) as e:
+                sink.write(out_1, {'strain': 'z', 'n__b': '3'}, ['strain', 'm__a'])
+            assert 'not covered by the output headers' in str(e.value)
+        assert out_1.read_text() == 'strain\tm__a\nx\t1\n'
+        assert out_2.read_text() == 'strain\tn__b\ny\t2\n'
+
+
+def test_get_typed_value():
+    assert get_typed_value('12', 'int') == 12
+    assert get_typed_value('1.5', 'float') == 1.5
+    assert get_typed_value('-', 'int') is None
+    assert get_typed_value('Not Tested', 'float') is None
+    assert get_typed_value('12', 'str') == '12'
+
+
+def test_get_column_names():
+    full_headers = ['strain', 'a__ST', 'b__ST', 'b__N50']
+    assert get_column_names(full_headers, False) == full_headers
+    assert get_column_names(full_headers, True) == ['strain', 'ST', 'ST', 'N50']
+    assert get_column_names(full_headers, True, unique=True) == \
+        ['strain', 'a__ST', 'b__ST', 'N50']
+
+
+def test_output_sink_jsonl():
+    full_headers = ['strain', 'm__ST', 'm__N50']
+    with tempfile.TemporaryDirectory() as temp_dir:
+        journal = OutputJournal(temp_dir)
+        with OutputSink(full_headers, ['strain'], trim_headers=True, journal=journal,
+                        output_format='jsonl', header_types={'m__N50': 'int'}) as sink:
+            sink.write(pathlib.Path(temp_dir) / 'out.txt', {'strain': 'x', 'm__ST': 'ST23',
+                                                           'm__N50': '5000'})
+            sink.write(pathlib.Path(temp_dir) / 'out.txt', {'strain': 'y'})
+        out_file = pathlib.Path(temp_dir) / 'out.jsonl'
+        assert out_file.read_text() == '{"strain": "x", "ST": "ST23", "N50": 5000}\n' \
+                                       '{"strain": "y", "ST": "-", "N50": null}\n'
+        assert journal.read() == ({'out.jsonl': 83}, [])
+        assert resume_output_files(temp_dir, [out_file], 'jsonl') == \
+            collections.Counter(['x', 'y'])
+
+
+def test_output_sink_parquet(monkeypatch):
+    pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+    monkeypatch.setattr(ParquetWriter, 'ROW_GROUP_SIZE', 2)
+    full_headers = ['strain', 'm__ST', 'm__N50']
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with OutputSink(full_headers, [], output_format='parquet',
+                        header_types={'m__N50': 'int'}) as sink:
+            for i in range(5):
+                sink.write(pathlib.Path(temp_dir) / 'out.txt', {'strain': str(i), 'm__N50': i})
+        table = pyarrow_parquet.read_table(pathlib.Path(temp_dir) / 'out.parquet')
+        assert table.column('m__N50').to_pylist() == [0, 1, 2, 3, 4]
+        assert pyarrow_parquet.ParquetFile(pathlib.Path(temp_dir) / 'out.parquet') \
+            .metadata.num_row_groups == 3
+
+
+def test_output_sink_5():
+    # Header positions are kept per output file, so header lists which are built afresh for each
+    # row (and may reuse a freed list's id) still go to the right columns.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        out_1, out_2 = pathlib.Path(temp_dir) / 'out_1.txt', pathlib.Path(temp_dir) / 'out_2.txt'
+        with OutputSink(['strain', 'm__a', 'n__b'], ['strain']) as sink:
+            for i in range(3):
+                sink.write(out_1, {'strain': f'x{i}', 'm__a': str(i)}, list(['strain', 'm__a']))
+                sink.write(out_2, {'strain': f'y{i}', 'n__b': str(i)},
+                           list(['n__b', 'strain']))
+            assert sorted(sink.header_positions) == [str(out_1), str(out_2)]
+        assert out_1.read_text() == 'strain\tm__a\nx0\t0\nx1\t1\nx2\t2\n'
+        assert out_2.read_text() == 'n__b\tstrain\n0\ty0\n1\ty1\n2\ty2\n'
@@ -0,0 +1,48 @@
+"""
+This file contains tests for Kleborate. To run all tests, go the repo's root directory and run:
+  python3 -m pytest
+
+To get code coverage stats:
+  coverage run --source . -m pytest && coverage report -m
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+from Bio import Align
+from Bio.Align import substitution_matrices
+
+from kleborate.shared.pairwise import *
+
+
+def test_get_aligner():
+    # Each scoring profile's aligner is only made once.
+    assert get_aligner('protein') is get_aligner('protein')
+    assert get_aligner('protein') is not get_aligner('nucleotide')
+    assert get_aligner('nucleotide').mode == 'global'
+
+
+def test_get_best_alignment_1():
+    # The cached alignment is the same as the first alignment from a newly configured aligner.
+    aligner = Align.PairwiseAligner()
+    aligner.substitution_matrix = substitution_matrices.load('BLOSUM62')
+    aligner.open_gap_score = -10
+    aligner.extend_gap_score = -0.5
+    expected = aligner.align('MSDLAREITPVNIEEELK', 'MSDLAREITPVNIKEEELK')[0]
+    alignment = get_best_alignment('protein', 'MSDLAREITPVNIEEELK', 'MSDLAREITPVNIKEEELK')
+    assert alignment.score == expected.score
+    assert (alignment[0], alignment[1]) == (expected[0], expected[1])
+    assert get_best_alignment('protein', 'MSDLAREITPVNIEEELK', 'MSDLAREITPVNIKEEELK') is alignment
+
+
+def test_get_best_alignment_2():
+    alignment = get_best_alignment('nucleotide', 'ACGTACGT', 'ACGAACGT')
+    assert alignment.score == 5 * 7 - 4
@@ -0,0 +1,101 @@
+"""
+This file contains tests for Kleborate. To run all tests, go the repo's root directory and run:
+  python3 -m pytest
+
+To get code coverage stats:
+  coverage run --source . -m pytest && coverage report -m
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+
+import json
+import pathlib
+import tempfile
+import time
+
+from kleborate.shared.profiling import *
+
+
+def test_profiler_disabled():
+    profiler = Profiler()
+    with profiler.time_stage('x', 'm', 'get_results'):
+        with profiler.time_subprocess('minimap2'):
+            pass
+    assert profiler.take_records() == []
+
+
+def test_profiler_1():
+    profiler = Profiler()
+    profiler.enable()
+    with profiler.time_stage('x', 'm', 'get_results'):
+        with profiler.time_subprocess('minimap2'):
+            time.sleep(0.05)
+    records = profiler.take_records()
+    assert len(records) == 1
+    assert (records[0]['strain'], records[0]['module'], records[0]['stage']) == \
+        ('x', 'm', 'get_results')
+    assert records[0]['wall_time'] >= records[0]['subprocesses']['minimap2'] >= 0.05
+    assert profiler.take_records() == []
+
+
+def test_profiler_2():
+    # A nested stage gets its own record (with its strain from the outer stage), and its time is
+    # left out of the outer stage.
+    profiler = Profiler()
+    profiler.enable()
+    with profiler.time_stage('x', 'm', 'get_results'):
+        with profiler.time_stage(None, '-', 'align'):
+            with profiler.time_subprocess('minimap2'):
+                time.sleep(0.05)
+    inner, outer = profiler.take_records()
+    assert (inner['strain'], inner['stage']) == ('x', 'align')
+    assert inner['subprocesses']['minimap2'] >= 0.05
+    assert outer['wall_time'] < 0.05
+    assert not outer['subprocesses']
+
+
+def test_profiler_dumps():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        profiler = Profiler()
+        profiler.enable(pathlib.Path(temp_dir) / 'dumps')
+        with profiler.time_stage('x', 'm', 'get_results'):
+            sum(range(1000))
+        assert (pathlib.Path(temp_dir) / 'dumps' / 'x__m.prof').is_file()
+
+
+def test_get_dump_filename():
+    assert get_dump_filename('a b/c', 'm') == 'a_b_c__m.prof'
+
+
+def test_profile_report():
+    records = [{'strain': 'x', 'module': '-', 'stage': 'prepare', 'wall_time': 0.5,
+                'cpu_time': 0.25, 'subprocesses': {'minimap2': 0.4}},
+               {'strain': 'x', 'module': 'm', 'stage': 'get_results', 'wall_time': 1.0,
+                'cpu_time': 1.0, 'subprocesses': {}}]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        with ProfileReport(temp_dir, 'tsv') as report:
+            report.write(records)
+        lines = (pathlib.Path(temp_dir) / 'kleborate_profile.tsv').read_text().splitlines()
+        assert lines[0].split('\t') == ProfileReport.TSV_HEADERS
+        assert lines[1] == 'x\t-\tprepare\t0.500000\t0.250000\t0.400000\tminimap2=0.400000'
+        assert lines[2] == 'x\tm\tget_results\t1.000000\t1.000000\t0.000000\t-'
+        assert report.totals[('m', 'get_results')] == [1, 1.0, 1.0, 0.0]
+
+        with ProfileReport(temp_dir, 'jsonl') as report:
+            report.write(records)
+        lines = (pathlib.Path(temp_dir) / 'kleborate_profile.jsonl').read_text().splitlines()
+        assert len(lines) == 1
+        row = json.loads(lines[0])
+        assert row['strain'] == 'x'
+        assert row['stage_wall_time'] == 1.5
+        assert row['stages'][0]['subprocesses'] == {'minimap2': 0.4}
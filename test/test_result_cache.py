@@ -0,0 +1,177 @@
+"""
+This file contains tests for Kleborate. To run all tests, go the repo's root directory and run:
+  python3 -m pytest
+
+To get code coverage stats:
+  coverage run --source . -m pytest && coverage report -m
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import pathlib
+import tempfile
+
+import kleborate.shared.result_cache
+from kleborate.shared.result_cache import *
+
+
+class FakeModule(object):
+    __file__ = __file__
+
+    @staticmethod
+    def add_cli_options(parser):
+        group = parser.add_argument_group('fake module')
+        group.add_argument('--fake_min_identity', type=float, default=90.0)
+        return group
+
+    @staticmethod
+    def prerequisite_modules():
+        return []
+
+
+class FakeDependentModule(FakeModule):
+    @staticmethod
+    def add_cli_options(parser):
+        return None
+
+    @staticmethod
+    def prerequisite_modules():
+        return ['fake']
+
+
+def get_signatures(min_identity, aligner='minimap2'):
+    modules = {'fake': FakeModule, 'dependent': FakeDependentModule}
+    args = argparse.Namespace(fake_min_identity=min_identity, aligner=aligner)
+    return get_module_signatures(['fake', 'dependent'], modules, args, '3.0.0')
+
+
+def test_get_module_signatures():
+    assert get_signatures(90.0) == get_signatures(90.0)
+    assert get_signatures(90.0)['fake'] != get_signatures(80.0)['fake']
+    assert get_signatures(90.0)['dependent'] != get_signatures(80.0)['dependent']
+    assert get_signatures(90.0)['fake'] != get_signatures(90.0, aligner='mappy')['fake']
+
+
+def test_get_module_signatures_threads():
+    # Options which only affect speed (e.g. Kaptive's threads) don't change the signature.
+    class ThreadedModule(FakeModule):
+        @staticmethod
+        def add_cli_options(parser):
+            group = parser.add_argument_group('threaded module')
+            group.add_argument('-t', '--threads', type=int, default=8)
+            return group
+
+    signatures = [get_module_signatures(['threaded'], {'threaded': ThreadedModule},
+                                        argparse.Namespace(threads=t, aligner='minimap2'), '3.0.0')
+                  for t in [1, 8]]
+    assert signatures[0] == signatures[1]
+
+
+def test_get_module_signatures_shared_code(monkeypatch):
+    # Changes to Kleborate's shared code (e.g. alignment) change every module's signature.
+    before = get_signatures(90.0)
+    real_get_directory_digest = kleborate.shared.result_cache.get_directory_digest
+
+    def get_changed_digest(directory, pattern):
+        digest = real_get_directory_digest(directory, pattern)
+        return digest + 'changed' if pathlib.Path(directory).name == 'shared' else digest
+    monkeypatch.setattr(kleborate.shared.result_cache, 'get_directory_digest', get_changed_digest)
+    after = get_signatures(90.0)
+    assert before['fake'] != after['fake']
+    assert before['dependent'] != after['dependent']
+
+
+def test_get_module_option_dests():
+    assert get_module_option_dests(FakeModule) == ['fake_min_identity']
+    assert get_module_option_dests(FakeDependentModule) == []
+
+
+def test_get_file_hash():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        a, b = pathlib.Path(temp_dir) / 'a', pathlib.Path(temp_dir) / 'b'
+        a.write_text('ACGT')
+        b.write_text('ACGT')
+        assert get_file_hash(a) == get_file_hash(b)
+        b.write_text('ACGA')
+        assert get_file_hash(a) != get_file_hash(b)
+
+
+def test_result_cache_get_put():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = ResultCache(temp_dir, 1000000, {'fake': 'x'})
+        assert cache.get('key') is None
+        cache.put('key', {'ST': 'ST23', 'score': 1})
+        assert cache.get('key') == {'ST': 'ST23', 'score': 1}
+        assert ResultCache(temp_dir, 1000000, {}).get('key') == {'ST': 'ST23', 'score': 1}
+
+
+def test_result_cache_keys():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = ResultCache(temp_dir, 1000000, {'a': 'x', 'b': 'y'})
+        keys = cache.get_keys('test/test_main/test.fasta')
+        assert sorted(keys) == ['a', 'b']
+        assert keys['a'] != keys['b']
+        assert cache.get_keys('test/test_main/test.fasta.gz')['a'] != keys['a']
+
+
+def test_result_cache_eviction():
+    # Beyond the maximum size, the least recently used results are evicted.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = ResultCache(temp_dir, 400, {})
+        cache.put('a', {'x': 'a' * 100})
+        cache.put('b', {'x': 'b' * 100})
+        assert cache.get('a') is not None  # now b is the least recently used
+        cache.put('c', {'x': 'c' * 100})
+        cache.put('d', {'x': 'd' * 100})
+        assert cache.get('b') is None
+        assert cache.get('d') is not None
+
+
+def test_result_cache_total_size():
+    # The total size is kept up to date when results are replaced or evicted, and across
+    # connections.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = ResultCache(temp_dir, 400, {})
+
+        def get_sizes():
+            connection = cache.connect()
+            total = connection.execute("SELECT value FROM metadata WHERE name = 'total_size'"
+                                       ).fetchone()[0]
+            return total, connection.execute('SELECT SUM(size) FROM results').fetchone()[0]
+        cache.put('a', {'x': 'a' * 100})
+        cache.put('a', {'x': 'a' * 50})
+        total, table_sum = get_sizes()
+        assert total == table_sum
+        for key in 'bcd':
+            cache.put(key, {'x': key * 100})
+        total, table_sum = get_sizes()
+        assert total == table_sum <= 400
+        cache = ResultCache(temp_dir, 400, {})
+        assert get_sizes()[0] == total
+
+
+def test_result_cache_flush():
+    # Lookups don't write to the database until flushed.
+    with tempfile.TemporaryDirectory() as temp_dir:
+        cache = ResultCache(temp_dir, 1000000, {})
+        cache.put('a', {'x': 'a'})
+
+        def get_last_used():
+            return cache.connect().execute("SELECT last_used FROM results WHERE key = 'a'"
+                                           ).fetchone()[0]
+        put_time = get_last_used()
+        assert cache.get('a') == {'x': 'a'}
+        assert get_last_used() == put_time
+        cache.flush()
+        assert get_last_used() > put_time
+        assert cache.pending_uses == {}
@@ -0,0 +1,72 @@
+"""
+This file contains tests for Kleborate. To run all tests, go the repo's root directory and run:
+  python3 -m pytest
+
+To get code coverage stats:
+  coverage run --source . -m pytest && coverage report -m
+
+Copyright 2026 the Kleborate contributors
+https://github.com/klebgenomics/KleborateModular/
+
+This file is part of Kleborate. Kleborate is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. Kleborate is distributed in
+the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with Kleborate. If
+not, see <https://www.gnu.org/licenses/>.
+"""
+
+import random
+import warnings
+
+import pytest
+from Bio.Seq import Seq
+
+from kleborate.shared.translation import *
+
+
+def biopython_translate(nucl_seq, to_stop=False, cds=False):
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')  # partial codon warnings
+        return str(Seq(nucl_seq).translate(table='Bacterial', to_stop=to_stop, cds=cds))
+
+
+def test_translate_1():
+    assert translate('ATGAAATTTTAA') == 'MKF*'
+    assert translate('ATGAAATTTTAA', to_stop=True) == 'MKF'
+    assert translate('GTGAAATTTTAA', cds=True) == 'MKF'  # alternative start codon
+    assert translate('atgaaa') == 'MK'
+    assert translate('') == ''
+
+
+def test_translate_2():
+    # Incomplete coding sequences raise the same error as Biopython when cds=True.
+    for nucl_seq in ['AAAAAATAA', 'ATGAAATA', 'ATGAAATTT', 'ATGTAAAAATAA', '']:
+        with pytest.raises(TranslationError):
+            translate(nucl_seq, cds=True)
+
+
+def test_translate_3():
+    # Ambiguous bases are handled like Biopython does.
+    for nucl_seq in ['ATGNNNAAA', 'ATGTARAAA', 'ATGYTNTAA']:
+        assert translate(nucl_seq) == biopython_translate(nucl_seq)
+        assert translate(nucl_seq, to_stop=True) == biopython_translate(nucl_seq, to_stop=True)
+
+
+def test_translate_4():
+    # Random sequences give the same result as Biopython.
+    random.seed(0)
+    for _ in range(500):
+        length = random.randint(0, 60)
+        nucl_seq = random.choice(['ATG', 'GTG', 'TTG', '']) + \
+            ''.join(random.choice('ACGT') for _ in range(length)) + random.choice(['TAA', 'TGA', ''])
+        assert translate(nucl_seq) == biopython_translate(nucl_seq)
+        assert translate(nucl_seq, to_stop=True) == biopython_translate(nucl_seq, to_stop=True)
+        try:
+            expected = biopython_translate(nucl_seq, cds=True)
+        except TranslationError:
+            with pytest.raises(TranslationError):
+                translate(nucl_seq, cds=True)
+        else:
+            assert translate(nucl_seq, cds=True) == expected